@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Jenis pool untuk pekerjaan CPU (decode, deteksi, embedding):
+# "thread" (OpenCV/ONNX melepas GIL) atau "process" (cascade & model dimuat per proses)
+EXECUTOR_KIND = os.environ.get("EXECUTOR_KIND", "thread")
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", min(os.cpu_count() or 1, 4)))
+# Batas pekerjaan yang sedang berjalan + antre; di atas ini request ditolak (429)
+EXECUTOR_MAX_PENDING = int(os.environ.get("EXECUTOR_MAX_PENDING", EXECUTOR_WORKERS * 4))
+
+
+class ExecutorSaturated(Exception):
+    """Dilempar saat antrean executor penuh"""
+
+
+# Initializer proses worker: muat cascade dan embedder sebelum request pertama
+def _init_worker():
+    from app.models.embedders import get_embedder
+    import app.models.face_recognition  # noqa: F401 (memuat Haar cascade)
+
+    get_embedder()
+
+
+class InferenceExecutor:
+    """Menjalankan fungsi CPU-bound di luar event loop dengan kedalaman antrean terbatas"""
+
+    def __init__(self, kind=EXECUTOR_KIND, workers=EXECUTOR_WORKERS, max_pending=EXECUTOR_MAX_PENDING):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self._pool = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference",
+            )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def run(self, fn, *args):
+        """Menjalankan fn(*args) di pool; melempar ExecutorSaturated jika antrean penuh"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated()
+
+        self.start()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+# Executor bersama untuk semua endpoint
+inference_executor = InferenceExecutor()
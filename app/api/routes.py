@@ -1,28 +1,52 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends, Header
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Header, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
-import cv2
-import numpy as np
 import time
 import asyncio
+import contextlib
+import json
+import math
 import jwt
+import sqlite3
 from typing import List, Optional
 import io
 from datetime import datetime, timedelta
 
-from app.models.face_recognition import detect_faces, get_embedding, find_match
+from app.models.face_recognition import (
+    extract_face_embeddings, detect_first_face_timed, get_embeddings, FaceRoiTracker
+)
+from app.models.gallery import GalleryCache
+from app.models.gallery_store import SharedGallery, GALLERY_SHARED, load_gallery
+from app.models.tracking import IdentityTracker
+from app.models.quality import QualityStats, QUALITY_MESSAGES
+from app.models.ann_index import create_index
+from app.models.embedders import get_embedder
+from app.api.executor import inference_executor, ExecutorSaturated
+from app.api.batcher import MicroBatcher
+from app.api.stream import StreamSession, stream_metrics
+from app.database.attendance_writer import attendance_writer
 from app.database.db import (
-    add_user, add_face_embedding, get_all_embeddings, 
-    record_attendance, get_user_by_id, get_attendance_history, 
-    check_user_exists_by_email, delete_user, get_all_users,
-    get_user_embeddings, delete_embedding, get_user_by_class
+    add_user, add_face_embeddings, add_user_with_embeddings,
+    get_user_by_id, get_attendance_history, get_attendance_stats,
+    check_user_exists_by_email, delete_user, get_all_users, get_users_page,
+    get_user_embeddings, delete_embedding, get_user_by_class, find_user_by_login
 )
 
 router = APIRouter()
 
-# Cache untuk menyimpan embedding sementara agar tidak perlu query database berulang kali
-embedding_cache = {}
-last_cache_update = 0
-CACHE_TIMEOUT = 60  # seconds
+# Cache galeri embedding: dimuat sekali, lalu diperbarui per baris saat
+# enrollment/penghapusan sehingga tidak perlu query database berulang kali.
+# Dengan beberapa worker, galeri dibagi lewat file memory-mapped (lihat gallery_store)
+gallery_cache = SharedGallery() if GALLERY_SHARED else GalleryCache()
+# Kotak wajah terakhir per sesi klien untuk deteksi ROI (DETECTION_MODE=fast)
+face_roi_tracker = FaceRoiTracker()
+# Identitas terakhir per sesi kiosk agar wajah yang sama tidak di-embed setiap frame
+identity_tracker = IdentityTracker()
+# Penghitung gerbang kualitas per alasan penolakan
+quality_stats = QualityStats()
+
+# Indeks pencarian di atas snapshot galeri (GALLERY_INDEX=exact|ivf)
+gallery_index = create_index()
+_gallery_load_lock = asyncio.Lock()
 
 # Admin auth settings
 ADMIN_PASSWORD = "kelasking#1234"
@@ -73,16 +97,156 @@ async def get_current_admin(authorization: str = Header(None)):
     
     return payload
 
-async def get_cached_embeddings():
-    global embedding_cache, last_cache_update
+# Respons 429 saat executor penuh agar klien mencoba lagi
+def server_busy():
+    return HTTPException(
+        status_code=429,
+        detail="Server sedang sibuk, silakan coba lagi",
+        headers={"Retry-After": "1"}
+    )
+
+# Kotak wajah dari klien dalam format "x,y,w,h" (koordinat piksel gambar yang diunggah)
+def parse_client_box(box):
+    if not box:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in box.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Format box harus x,y,w,h")
+    # float() menerima "nan" dan "inf", yang lolos perbandingan lalu gagal saat dipotong
+    if not all(math.isfinite(v) for v in (x, y, w, h)):
+        raise HTTPException(status_code=400, detail="Format box harus x,y,w,h")
+    if w <= 0 or h <= 0:
+        raise HTTPException(status_code=400, detail="Ukuran box tidak valid")
+    return x, y, w, h
+
+# Menjalankan pekerjaan CPU (decode/deteksi/embedding) di executor
+async def run_inference(fn, *args):
+    try:
+        return await inference_executor.run(fn, *args)
+    except ExecutorSaturated:
+        raise server_busy()
+
+# Embedding satu batch crop dalam satu panggilan, lalu cocokkan semuanya
+# dengan satu perkalian matriks terhadap snapshot galeri. Sinkronisasi indeks
+# IVF/centroid dengan snapshot (O(N)) ikut berjalan di thread executor.
+def _embed_and_match(face_imgs, gallery):
+    embeddings = get_embeddings(face_imgs)
+    return gallery_index.for_snapshot(gallery).match_batch(embeddings)
+
+async def _embed_and_match_batch(face_imgs):
+    gallery = await get_cached_embeddings()
+    return await inference_executor.run(_embed_and_match, face_imgs, gallery)
+
+recognition_batcher = MicroBatcher(_embed_and_match_batch)
+
+# Mengenali satu crop wajah lewat micro-batcher; hasil (user_id, jarak) atau None
+async def recognize_batched(face_img):
+    try:
+        return await recognition_batcher.submit(face_img)
+    except ExecutorSaturated:
+        raise server_busy()
+
+# Pipeline enrollment bersama untuk semua endpoint upload foto: foto dibagi ke
+# sebanyak mungkin worker executor dan diproses paralel. Batas EXECUTOR_MAX_PENDING
+# berlaku per tugas, jadi enrollment yang bersamaan tetap bisa mendapat 429.
+async def extract_photo_embeddings(photos):
+    contents = await asyncio.gather(*(photo.read() for photo in photos))
+    if not contents:
+        return []
+    
+    jobs = min(len(contents), inference_executor.workers)
+    chunks = [contents[i::jobs] for i in range(jobs)]
+    results = await asyncio.gather(
+        *(run_inference(extract_face_embeddings, chunk) for chunk in chunks)
+    )
+    return [embedding for chunk in results for embedding in chunk]
+
+# Enrollment untuk user yang sudah ada: semua embedding disimpan dalam satu transaksi
+# lalu galeri diperbarui sekali. Hasil: jumlah foto yang berhasil.
+async def enroll_photos(user_id, photos):
+    embeddings = await extract_photo_embeddings(photos)
+    if not embeddings:
+        return 0
     
-    # Perbarui cache jika sudah kadaluarsa
-    current_time = time.time()
-    if not embedding_cache or (current_time - last_cache_update) > CACHE_TIMEOUT:
-        embedding_cache = await get_all_embeddings()
-        last_cache_update = current_time
+    embedding_ids = await add_face_embeddings(user_id, embeddings, get_embedder().descriptor_version)
+    # Galeri bersama menunggu file lock dan menyalin memmap: jalankan di luar event loop
+    await asyncio.to_thread(gallery_cache.add_many, embedding_ids, user_id, embeddings)
+    return len(embedding_ids)
+
+# Pendaftaran user baru: embedding dihitung dulu, baru user dan embedding-nya disimpan
+# dalam satu transaksi, sehingga kegagalan (tanpa wajah, 429) tidak meninggalkan user kosong.
+# Hasil: (user_id, jumlah foto); user_id None jika tidak ada wajah terdeteksi.
+async def register_with_photos(name, email, photos):
+    embeddings = await extract_photo_embeddings(photos)
+    if not embeddings:
+        return None, 0
     
-    return embedding_cache
+    try:
+        user_id, embedding_ids = await add_user_with_embeddings(
+            name, email, embeddings, get_embedder().descriptor_version
+        )
+    except sqlite3.IntegrityError:
+        # Email yang sama didaftarkan bersamaan oleh request lain
+        raise HTTPException(status_code=400, detail="Email sudah terdaftar")
+    await asyncio.to_thread(gallery_cache.add_many, embedding_ids, user_id, embeddings)
+    return user_id, len(embedding_ids)
+
+# Pesan sapaan check-in; check-in yang di-debounce (cooldown) tidak mencatat kehadiran baru
+def attendance_message(name, attendance_recorded):
+    if attendance_recorded:
+        return f"Halo, {name}! Kehadiran tercatat."
+    return f"Halo, {name}! Kehadiran sudah tercatat sebelumnya."
+
+# Respons untuk frame yang ditolak gerbang kualitas (tanpa embedding)
+def quality_rejected(timing, status="failed"):
+    reason = timing["quality"]
+    return {"status": status, "reason": reason, "message": QUALITY_MESSAGES[reason], "timing": timing}
+
+# Decode, deteksi (di executor), lalu embedding dan pencocokan lewat micro-batcher.
+# Dengan track, identitas frame sebelumnya dipakai ulang selama wajahnya stabil.
+# Hasil: (lokasi wajah, Match atau None, timing); lokasi None jika tidak ada wajah
+async def recognize_frame(contents, roi=None, client_box=None, cropped=False, track=None):
+    start_time = time.perf_counter()
+    face_img, face_location, timing = await run_inference(
+        detect_first_face_timed, contents, roi, client_box, cropped
+    )
+    # Crop dari klien tidak membawa posisi wajah (kotaknya selalu seluruh gambar), sehingga
+    # IoU tidak bisa membedakan orang yang bergantian di depan kamera: track tidak dipakai
+    if cropped and track is not None:
+        track.reset()
+        track = None
+    
+    match_result = None
+    if "quality" in timing:
+        quality_stats.record(timing["quality"])
+    
+    if face_img is None:
+        if track is not None:
+            track.reset()
+    # Crop yang ditolak gerbang kualitas (timing["quality"]) tidak di-embed;
+    # klien cukup mengirim frame berikutnya
+    elif not timing.get("quality"):
+        match_start = time.perf_counter()
+        match_result = track.reuse(face_location, face_img) if track is not None else None
+        timing["tracked"] = match_result is not None
+        if match_result is None:
+            # Embedding dan pencocokan digabung dengan frame kiosk lain dalam satu batch
+            match_result = await recognize_batched(face_img)
+            if track is not None:
+                track.update(face_location, face_img, match_result)
+        timing["match_ms"] = (time.perf_counter() - match_start) * 1000.0
+    timing["total_ms"] = (time.perf_counter() - start_time) * 1000.0
+    return face_location, match_result, timing
+
+async def get_cached_embeddings():
+    # Muat galeri dari database hanya sekali; setelah itu cukup ambil snapshot
+    if not gallery_cache.loaded:
+        async with _gallery_load_lock:
+            if not gallery_cache.loaded:
+                await load_gallery(gallery_cache, get_embedder())
+    
+    return gallery_cache.snapshot()
 
 @router.post("/register")
 async def register_user(
@@ -101,82 +265,52 @@ async def register_user(
     if len(photos) == 0:
         raise HTTPException(status_code=400, detail="Minimal satu foto wajah diperlukan")
     
-    # Tambahkan user ke database
-    user_id = await add_user(name, email)
-    
-    embeddings = []
+    # Proses semua foto secara paralel, lalu simpan user beserta wajahnya sekaligus
+    user_id, processed_photos = await register_with_photos(name, email, photos)
     
-    # Proses setiap foto
-    for photo in photos:
-        contents = await photo.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Deteksi wajah
-        faces, _ = detect_faces(img)
-        
-        if not faces:
-            continue
-        
-        # Ambil wajah pertama
-        face_img = faces[0]
-        
-        # Ekstrak embedding
-        embedding = get_embedding(face_img)
-        
-        if embedding is not None:
-            # Simpan embedding ke database
-            await add_face_embedding(user_id, embedding)
-            embeddings.append(embedding)
-    
-    if not embeddings:
+    if user_id is None:
         raise HTTPException(status_code=400, detail="Tidak ada wajah terdeteksi di foto yang diunggah")
     
-    # Reset cache karena database berubah
-    global last_cache_update
-    last_cache_update = 0
-    
     return {"status": "success", "user_id": user_id, "message": f"User {name} berhasil terdaftar"}
 
 @router.post("/recognize")
 async def recognize_face(
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    session_id: Optional[str] = Form(None),
+    box: Optional[str] = Form(None),
+    cropped: bool = Form(False)
 ):
     # Baca gambar dari request
     contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
-    # Deteksi wajah
-    faces, face_locations = detect_faces(img)
+    # Frame dari sesi yang sama cukup dicari di sekitar kotak wajah sebelumnya.
+    # Klien boleh mengirim kotak wajah ("x,y,w,h") atau crop wajah saja (cropped=true)
+    # agar deteksi di server dilewati
+    client_box = parse_client_box(box)
+    track = identity_tracker.get(session_id)
+    face_location, match_result, timing = await recognize_frame(
+        contents, face_roi_tracker.get(session_id), client_box, cropped, track
+    )
+    if not cropped:
+        face_roi_tracker.update(session_id, face_location)
     
-    if not faces:
+    if face_location is None:
         raise HTTPException(status_code=400, detail="Tidak ada wajah terdeteksi")
-    
-    # Ambil wajah pertama
-    face_img = faces[0]
-    
-    # Ekstrak embedding
-    embedding = get_embedding(face_img)
-    
-    if embedding is None:
-        raise HTTPException(status_code=400, detail="Gagal mengekstrak fitur wajah")
-    
-    # Dapatkan embedding dari cache/database
-    stored_embeddings = await get_cached_embeddings()
-    
-    # Temukan kecocokan
-    match_result = find_match(embedding, stored_embeddings)
+    if timing.get("quality"):
+        return quality_rejected(timing)
     
     if match_result is None:
-        return {"status": "failed", "message": "Wajah tidak dikenali"}
+        return {"status": "failed", "message": "Wajah tidak dikenali", "timing": timing}
     
-    user_id, confidence = match_result
+    user_id, confidence = match_result.user_id, match_result.distance
     
-    # Catat kehadiran di background untuk respons yang lebih cepat
-    if background_tasks:
-        background_tasks.add_task(record_attendance, user_id)
+    # Catat kehadiran lewat antrean write-behind (ditulis per batch);
+    # check-in berulang dalam jendela cooldown diabaikan tanpa akses database
+    attendance_recorded = attendance_writer.submit(user_id)
+    # Setelah check-in tercatat, frame berikutnya diverifikasi ulang dengan embedding
+    # agar orang berikutnya di sesi yang sama tidak mewarisi identitas ini
+    if attendance_recorded and track is not None:
+        track.reset()
     
     # Dapatkan data user
     user = await get_user_by_id(user_id)
@@ -189,7 +323,115 @@ async def recognize_face(
         "user_id": user_id,
         "name": user["name"],
         "confidence": 1.0 - confidence,  # Konversi jarak ke kepercayaan
-        "message": f"Halo, {user['name']}! Kehadiran tercatat."
+        "margin": match_result.margin,  # Selisih jarak ke user kedua (matcher centroid)
+        "timing": timing,
+        "attendance_recorded": attendance_recorded,
+        "message": attendance_message(user["name"], attendance_recorded)
+    }
+
+@router.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket):
+    """
+    Pengenalan wajah kontinu untuk kiosk: klien mengirim frame JPEG biner dan server
+    membalas satu pesan JSON per frame yang diproses. Frame yang tiba saat frame
+    sebelumnya masih diproses saling menimpa, sehingga hanya frame terbaru yang
+    dikerjakan. Pesan teks {"box": "x,y,w,h"} memberi kotak wajah dari browser untuk
+    frame biner berikutnya; {"cropped": true} menandai frame berikutnya sebagai crop wajah.
+    """
+    await websocket.accept()
+    session = StreamSession(identity_tracker.create())
+    stream_metrics.open()
+    receiver = asyncio.create_task(_receive_frames(websocket, session))
+    try:
+        while True:
+            frame = await session.frames.get()
+            if frame is None:
+                break
+            sequence, contents, cropped, box = frame
+            result = await _recognize_stream_frame(session, contents, cropped, box)
+            session.processed += 1
+            if session.frames.closed:
+                break
+            result.update(frame=sequence, dropped=session.frames.dropped)
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Tunggu task penerima benar-benar selesai agar tidak ada task yatim yang
+        # masih membaca dari koneksi yang sudah ditutup
+        receiver.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await receiver
+        stream_metrics.close(session)
+
+# Membaca pesan dari klien terus-menerus dan hanya menyimpan frame terbaru
+async def _receive_frames(websocket, session):
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                session.frames.put(message["bytes"], session.cropped, session.box)
+                session.box = None
+            elif message.get("text"):
+                try:
+                    options = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if isinstance(options, dict):
+                    session.cropped = bool(options.get("cropped", session.cropped))
+                    session.box = _stream_box(options.get("box"))
+    finally:
+        session.frames.close()
+
+# Kotak wajah dari pesan teks stream; kotak tidak valid diabaikan (server mendeteksi sendiri)
+def _stream_box(box):
+    try:
+        return parse_client_box(box) if isinstance(box, str) else None
+    except HTTPException:
+        return None
+
+# Satu frame stream: ROI dan user terakhir diambil dari state koneksi,
+# cropped dan box adalah nilai yang berlaku saat frame ini diterima
+async def _recognize_stream_frame(session, contents, cropped, box=None):
+    try:
+        face_location, match_result, timing = await recognize_frame(
+            contents, None if cropped else session.last_box, box, cropped, session.track
+        )
+    except HTTPException as e:
+        # Executor penuh: frame ini dilewati, klien cukup mengirim frame berikutnya
+        return {"status": "busy", "message": e.detail}
+    if not cropped:
+        session.last_box = face_location
+    
+    if face_location is None:
+        return {"status": "no_face", "message": "Tidak ada wajah terdeteksi", "timing": timing}
+    if timing.get("quality"):
+        return quality_rejected(timing, status="low_quality")
+    if match_result is None:
+        return {"status": "failed", "message": "Wajah tidak dikenali", "timing": timing}
+    
+    # User yang sama dengan frame sebelumnya tidak perlu dibaca ulang dari database
+    user = session.last_user
+    if user is None or user["id"] != match_result.user_id:
+        user = await get_user_by_id(match_result.user_id)
+        if not user:
+            return {"status": "failed", "message": f"User dengan ID {match_result.user_id} tidak ditemukan"}
+        session.last_user = user
+    
+    attendance_recorded = attendance_writer.submit(match_result.user_id)
+    if attendance_recorded and session.track is not None:
+        session.track.reset()
+    return {
+        "status": "success",
+        "user_id": match_result.user_id,
+        "name": user["name"],
+        "confidence": 1.0 - match_result.distance,
+        "margin": match_result.margin,
+        "timing": timing,
+        "attendance_recorded": attendance_recorded,
+        "message": attendance_message(user["name"], attendance_recorded)
     }
 
 @router.get("/attendance/history")
@@ -205,8 +447,6 @@ async def user_login(data: dict):
     name = data.get("name")
     kelas = data.get("kelas")
     
-    print(f"Permintaan login untuk: name='{name}', kelas='{kelas}'")
-    
     if not name or not kelas:
         return JSONResponse(
             status_code=400,
@@ -217,53 +457,17 @@ async def user_login(data: dict):
     name = name.strip()
     kelas = kelas.strip()
     
-    # Fungsi untuk melakukan normalisasi lebih lanjut (menghapus spasi berlebih di tengah)
-    def normalize_string(s):
-        # Ganti semua spasi berlebih dengan satu spasi
-        return ' '.join(s.split())
-    
-    # Normalisasi kelas untuk pencocokan yang lebih fleksibel
-    normalized_kelas = normalize_string(kelas)
-    print(f"Kelas setelah normalisasi: '{normalized_kelas}'")
-    
     # Coba cari user berdasarkan kelas langsung
     user = await get_user_by_class(kelas)
-    print(f"Mencari user dengan kelas exact: '{kelas}'")
     
-    # Jika tidak ditemukan, coba dengan normalized kelas
+    # Jika tidak ditemukan, coba dengan kelas yang spasinya dirapatkan
     if not user:
-        user = await get_user_by_class(normalized_kelas)
-        print(f"Mencoba dengan normalized_kelas: '{normalized_kelas}'")
+        user = await get_user_by_class(' '.join(kelas.split()))
     
-    # Jika masih tidak ditemukan, cek semua user
+    # Jika masih tidak ditemukan, cari lewat kunci login ternormalisasi (satu lookup indeks,
+    # tidak case-sensitive, nama boleh berupa prefix)
     if not user:
-        users = await get_all_users()
-        print(f"User tidak ditemukan langsung, mencari di {len(users)} users...")
-        
-        for u in users:
-            db_class = u.get("class", "").lower().strip()
-            db_name = u.get("name", "").lower().strip()
-            
-            input_name = name.lower().strip()
-            input_class = kelas.lower().strip()
-            normalized_input_class = normalized_kelas.lower()
-            
-            print(f"Membandingkan: DB class='{db_class}' vs input='{input_class}'/''{normalized_input_class}'")
-            print(f"Membandingkan: DB name='{db_name}' vs input name='{input_name}'")
-            
-            # Cek apakah kelas cocok
-            if (db_class == input_class or 
-                db_class == normalized_input_class or
-                normalize_string(db_class) == normalized_input_class):
-                
-                # Cek apakah nama cocok
-                if (db_name == input_name or
-                    db_name.startswith(input_name) or
-                    input_name.startswith(db_name)):
-                    
-                    print(f"User ditemukan: id={u['id']}, name={u['name']}, class={db_class}")
-                    user = u
-                    break
+        user = await find_user_by_login(name, kelas)
     
     if not user:
         print(f"Tidak ada user yang cocok untuk name='{name}', kelas='{kelas}'")
@@ -313,51 +517,16 @@ async def register_user_upload(
             content={"status": "error", "message": "Email sudah terdaftar"}
         )
     
-    # Tambahkan user ke database
-    user_id = await add_user(name, email)
-    
-    # Variabel untuk melacak foto yang berhasil diproses
-    processed_photos = 0
+    # Proses semua foto secara paralel, lalu simpan user beserta wajahnya sekaligus
+    user_id, processed_photos = await register_with_photos(name, email, photos)
     
-    # Proses setiap foto yang diunggah
-    for photo in photos:
-        # Baca foto yang diupload
-        contents = await photo.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Deteksi wajah
-        faces, _ = detect_faces(img)
-        
-        if not faces:
-            continue
-        
-        # Ambil wajah pertama dari foto
-        face_img = faces[0]
-        
-        # Ekstrak embedding
-        embedding = get_embedding(face_img)
-        
-        if embedding is None:
-            continue
-        
-        # Simpan embedding ke database
-        await add_face_embedding(user_id, embedding)
-        processed_photos += 1
-    
-    # Jika tidak ada foto yang berhasil diproses, return error
-    if processed_photos == 0:
-        # Hapus user yang baru dibuat
-        await delete_user(user_id)
+    # Jika tidak ada foto yang berhasil diproses, user tidak dibuat
+    if user_id is None:
         return JSONResponse(
             status_code=400,
             content={"status": "error", "message": "Tidak ada wajah terdeteksi di foto yang diunggah"}
         )
     
-    # Reset cache karena database berubah
-    global last_cache_update
-    last_cache_update = 0
-    
     return {
         "status": "success", 
         "user_id": user_id, 
@@ -388,10 +557,26 @@ async def admin_login(data: dict):
         "expires_in": JWT_EXPIRATION * 60  # dalam detik
     }
 
+# Batas ukuran satu halaman daftar user admin
+MAX_USERS_PAGE_SIZE = 500
+
 @router.get("/admin/users")
-async def get_users(admin=Depends(get_current_admin)):
-    users = await get_all_users()
-    return {"status": "success", "data": users}
+async def get_users(
+    after: Optional[int] = None,
+    limit: Optional[int] = None,
+    admin=Depends(get_current_admin)
+):
+    # Tanpa limit: semua user (kompatibel dengan klien lama)
+    if limit is None:
+        users = await get_all_users()
+        return {"status": "success", "data": users, "next_after": None}
+    
+    limit = max(1, min(limit, MAX_USERS_PAGE_SIZE))
+    users = await get_users_page(after=after, limit=limit)
+    
+    # Cursor halaman berikutnya: id terakhir di halaman ini
+    next_after = users[-1]["id"] if len(users) == limit else None
+    return {"status": "success", "data": users, "next_after": next_after}
 
 @router.get("/admin/users/{user_id}/embeddings")
 async def get_user_face_embeddings(user_id: int, admin=Depends(get_current_admin)):
@@ -403,9 +588,8 @@ async def delete_face_embedding(embedding_id: int, admin=Depends(get_current_adm
     try:
         await delete_embedding(embedding_id)
         
-        # Reset cache
-        global last_cache_update
-        last_cache_update = 0
+        # Perbarui galeri di memori
+        await asyncio.to_thread(gallery_cache.remove_embedding, embedding_id)
         
         return {"status": "success", "message": "Foto berhasil dihapus"}
     except Exception as e:
@@ -419,9 +603,8 @@ async def delete_user_data(user_id: int, admin=Depends(get_current_admin)):
     try:
         await delete_user(user_id)
         
-        # Reset cache
-        global last_cache_update
-        last_cache_update = 0
+        # Perbarui galeri di memori
+        await asyncio.to_thread(gallery_cache.remove_user, user_id)
         
         return {"status": "success", "message": "Pengguna berhasil dihapus"}
     except Exception as e:
@@ -454,34 +637,8 @@ async def upload_user_photos(
             content={"status": "error", "message": f"User dengan ID {user_id} tidak ditemukan"}
         )
     
-    # Variabel untuk melacak foto yang berhasil diproses
-    processed_photos = 0
-    
-    # Proses setiap foto yang diunggah
-    for photo in photos:
-        # Baca foto yang diupload
-        contents = await photo.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Deteksi wajah
-        faces, _ = detect_faces(img)
-        
-        if not faces:
-            continue
-        
-        # Ambil wajah pertama dari foto
-        face_img = faces[0]
-        
-        # Ekstrak embedding
-        embedding = get_embedding(face_img)
-        
-        if embedding is None:
-            continue
-        
-        # Simpan embedding ke database
-        await add_face_embedding(user_id, embedding)
-        processed_photos += 1
+    # Proses semua foto yang diunggah secara paralel di executor
+    processed_photos = await enroll_photos(user_id, photos)
     
     # Jika tidak ada foto yang berhasil diproses, return error
     if processed_photos == 0:
@@ -490,10 +647,6 @@ async def upload_user_photos(
             content={"status": "error", "message": "Tidak ada wajah terdeteksi di foto yang diunggah"}
         )
     
-    # Reset cache karena database berubah
-    global last_cache_update
-    last_cache_update = 0
-    
     return {
         "status": "success", 
         "processed_photos": processed_photos,
@@ -579,34 +732,8 @@ async def upload_user_photos_after_login(
             content={"status": "error", "message": f"User dengan ID {user_id} tidak ditemukan"}
         )
     
-    # Variabel untuk melacak foto yang berhasil diproses
-    processed_photos = 0
-    
-    # Proses setiap foto yang diunggah
-    for photo in photos:
-        # Baca foto yang diupload
-        contents = await photo.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Deteksi wajah
-        faces, _ = detect_faces(img)
-        
-        if not faces:
-            continue
-        
-        # Ambil wajah pertama dari foto
-        face_img = faces[0]
-        
-        # Ekstrak embedding
-        embedding = get_embedding(face_img)
-        
-        if embedding is None:
-            continue
-        
-        # Simpan embedding ke database
-        await add_face_embedding(user_id, embedding)
-        processed_photos += 1
+    # Proses semua foto yang diunggah secara paralel di executor
+    processed_photos = await enroll_photos(user_id, photos)
     
     # Jika tidak ada foto yang berhasil diproses, return error
     if processed_photos == 0:
@@ -615,10 +742,6 @@ async def upload_user_photos_after_login(
             content={"status": "error", "message": "Tidak ada wajah terdeteksi di foto yang diunggah"}
         )
     
-    # Reset cache karena database berubah
-    global last_cache_update
-    last_cache_update = 0
-    
     return {
         "status": "success", 
         "processed_photos": processed_photos,
@@ -628,45 +751,39 @@ async def upload_user_photos_after_login(
 @router.post("/face-login")
 async def face_login(
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    session_id: Optional[str] = Form(None),
+    box: Optional[str] = Form(None),
+    cropped: bool = Form(False)
 ):
     """
     Endpoint untuk login menggunakan pengenalan wajah
     """
     # Baca gambar dari request
     contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
-    # Deteksi wajah
-    faces, face_locations = detect_faces(img)
+    # Frame dari sesi yang sama cukup dicari di sekitar kotak wajah sebelumnya.
+    # Klien boleh mengirim kotak wajah ("x,y,w,h") atau crop wajah saja (cropped=true)
+    # agar deteksi di server dilewati
+    client_box = parse_client_box(box)
+    face_location, match_result, timing = await recognize_frame(
+        contents, face_roi_tracker.get(session_id), client_box, cropped
+    )
+    if not cropped:
+        face_roi_tracker.update(session_id, face_location)
     
-    if not faces:
+    if face_location is None:
         raise HTTPException(status_code=400, detail="Tidak ada wajah terdeteksi")
-    
-    # Ambil wajah pertama
-    face_img = faces[0]
-    
-    # Ekstrak embedding
-    embedding = get_embedding(face_img)
-    
-    if embedding is None:
-        raise HTTPException(status_code=400, detail="Gagal mengekstrak fitur wajah")
-    
-    # Dapatkan embedding dari cache/database
-    stored_embeddings = await get_cached_embeddings()
-    
-    # Temukan kecocokan
-    match_result = find_match(embedding, stored_embeddings)
+    if timing.get("quality"):
+        return quality_rejected(timing)
     
     if match_result is None:
-        return {"status": "failed", "message": "Wajah tidak dikenali"}
+        return {"status": "failed", "message": "Wajah tidak dikenali", "timing": timing}
     
-    user_id, confidence = match_result
+    user_id, confidence = match_result.user_id, match_result.distance
     
-    # Catat kehadiran di background untuk respons yang lebih cepat
-    if background_tasks:
-        background_tasks.add_task(record_attendance, user_id)
+    # Catat kehadiran lewat antrean write-behind (ditulis per batch);
+    # check-in berulang dalam jendela cooldown diabaikan tanpa akses database
+    attendance_recorded = attendance_writer.submit(user_id)
     
     # Dapatkan data user
     user = await get_user_by_id(user_id)
@@ -688,55 +805,59 @@ async def face_login(
         "email": user["email"],
         "userType": "user",
         "confidence": 1.0 - confidence,  # Konversi jarak ke kepercayaan
+        "margin": match_result.margin,
+        "timing": timing,
         "message": f"Halo, {user['name']}! Login berhasil."
     }
 
+@router.get("/admin/metrics")
+async def get_admin_metrics(admin=Depends(get_current_admin)):
+    """
+    Endpoint untuk metrik runtime (executor inferensi dan micro-batching)
+    """
+    return {
+        "status": "success",
+        "data": {
+            "executor": inference_executor.stats(),
+            "recognition_batcher": recognition_batcher.stats(),
+            "attendance_writer": attendance_writer.stats(),
+            "recognition_stream": stream_metrics.stats(),
+            "identity_tracker": identity_tracker.stats(),
+            "quality_gate": quality_stats.stats(),
+            "gallery": {
+                "embeddings": len(gallery_cache.snapshot()),
+                "version": gallery_cache.version,
+                "index": gallery_index.stats()
+            }
+        }
+    }
+
 @router.get("/admin/stats")
 async def get_admin_stats(admin=Depends(get_current_admin)):
     """
     Endpoint untuk mendapatkan statistik untuk admin dashboard
     """
     try:
-        # Mendapatkan semua user
-        users = await get_all_users()
-        total_users = len(users)
-        
-        # Mendapatkan riwayat kehadiran (unlimited)
-        attendance_history = await get_attendance_history(limit=1000)
-        
-        # Statistik total kehadiran
-        total_attendance = len(attendance_history)
-        
-        # Statistik kehadiran per hari selama 7 hari terakhir
-        attendance_by_day = {}
+        # Statistik 7 hari terakhir dihitung di SQL dari rollup harian
         today = datetime.now().date()
+        since_day = (today - timedelta(days=6)).strftime('%Y-%m-%d')
+        counts = await get_attendance_stats(since_day)
         
-        # Inisialisasi data untuk 7 hari terakhir
+        # Inisialisasi data untuk 7 hari terakhir (hari tanpa kehadiran = 0)
+        attendance_by_day = {}
         for i in range(7):
             day = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-            attendance_by_day[day] = 0
-        
-        # Hitung kehadiran per hari
-        for record in attendance_history:
-            # Konversi timestamp string ke datetime object
-            try:
-                record_date = datetime.fromisoformat(record['timestamp'].replace('Z', '+00:00')).date().strftime('%Y-%m-%d')
-                # Cek apakah dalam 7 hari terakhir
-                if record_date in attendance_by_day:
-                    attendance_by_day[record_date] += 1
-            except (ValueError, KeyError):
-                # Skip jika format tanggal tidak valid
-                continue
+            attendance_by_day[day] = counts["attendance_by_day"].get(day, 0)
         
-        # Statistik user dengan foto wajah
-        users_with_face = sum(1 for user in users if user.get('face_count', 0) > 0)
+        total_users = counts["total_users"]
+        users_with_face = counts["users_with_face"]
         
         # Susun data statistik
         stats = {
             "total_users": total_users,
             "users_with_face": users_with_face,
             "users_without_face": total_users - users_with_face,
-            "total_attendance": total_attendance,
+            "total_attendance": counts["total_attendance"],
             "attendance_by_day": attendance_by_day,
             "last_updated": datetime.now().isoformat()
         }
@@ -0,0 +1,87 @@
+import asyncio
+
+
+class LatestFrame:
+    """
+    Slot tunggal untuk frame dari satu koneksi WebSocket. Frame baru menimpa frame
+    yang belum sempat diproses, sehingga server yang tertinggal selalu melanjutkan
+    dari frame terbaru (frame basi dibuang, bukan diantrekan).
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame, cropped=False, box=None):
+        if self._frame is not None:
+            self.dropped += 1
+        self.received += 1
+        # Mode crop dan kotak wajah klien ikut disimpan bersama frame
+        # (berlaku saat frame diterima, bukan saat diproses)
+        self._frame = (self.received, frame, cropped, box)
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def get(self):
+        """(nomor frame, bytes, cropped, box) berikutnya, atau None setelah koneksi ditutup"""
+        while self._frame is None:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class StreamSession:
+    """State per koneksi kiosk: kotak wajah terakhir (ROI), track identitas dan user terakhir"""
+
+    def __init__(self, track=None):
+        self.frames = LatestFrame()
+        self.track = track
+        self.last_box = None
+        self.last_user = None
+        # Mode untuk frame yang akan diterima berikutnya (diubah lewat pesan teks)
+        self.cropped = False
+        # Kotak wajah klien (x, y, w, h) hanya untuk frame biner berikutnya
+        self.box = None
+        self.processed = 0
+
+
+class StreamMetrics:
+    """Metrik gabungan semua koneksi /ws/recognize"""
+
+    def __init__(self):
+        self.active = 0
+        self.connections = 0
+        self.frames = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def open(self):
+        self.active += 1
+        self.connections += 1
+
+    def close(self, session):
+        self.active -= 1
+        self.frames += session.frames.received
+        self.processed += session.processed
+        self.dropped += session.frames.dropped
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "connections": self.connections,
+            "frames": self.frames,
+            "processed": self.processed,
+            "dropped": self.dropped,
+        }
+
+
+stream_metrics = StreamMetrics()
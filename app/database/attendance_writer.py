@@ -0,0 +1,180 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from app.database.db import record_attendance_batch
+
+# Buffer kehadiran di-flush setiap interval ini atau saat jumlah baris tercapai
+ATTENDANCE_FLUSH_INTERVAL_MS = int(os.environ.get("ATTENDANCE_FLUSH_INTERVAL_MS", 500))
+ATTENDANCE_FLUSH_MAX_ROWS = int(os.environ.get("ATTENDANCE_FLUSH_MAX_ROWS", 100))
+# Check-in berulang dari user yang sama dalam jendela ini diabaikan (0 = nonaktif)
+ATTENDANCE_COOLDOWN_SECONDS = int(os.environ.get("ATTENDANCE_COOLDOWN_SECONDS", 300))
+# Saat database gagal ditulis: batch dibuang setelah sekian flush gagal berturut-turut,
+# dan buffer tidak boleh melebihi sekian baris (baris tertua dibuang lebih dulu)
+ATTENDANCE_MAX_RETRIES = int(os.environ.get("ATTENDANCE_MAX_RETRIES", 20))
+ATTENDANCE_MAX_BUFFER = int(os.environ.get("ATTENDANCE_MAX_BUFFER", 10000))
+
+
+class AttendanceWriter:
+    """
+    Antrean write-behind untuk tabel attendance: check-in ditampung di memori
+    lalu ditulis dengan executemany dalam satu transaksi per flush.
+
+    Check-in berulang dalam jendela cooldown diabaikan tanpa menyentuh database;
+    kolom session_key (unik per user) menjadi pengaman jika beberapa worker
+    mencatat user yang sama.
+    """
+
+    def __init__(self, interval_ms=ATTENDANCE_FLUSH_INTERVAL_MS, max_rows=ATTENDANCE_FLUSH_MAX_ROWS,
+                 cooldown_seconds=ATTENDANCE_COOLDOWN_SECONDS, max_retries=ATTENDANCE_MAX_RETRIES,
+                 max_buffer=ATTENDANCE_MAX_BUFFER):
+        self.interval = interval_ms / 1000.0
+        self.max_rows = max_rows
+        self.cooldown = cooldown_seconds
+        self.max_retries = max_retries
+        self.max_buffer = max_buffer
+        self._retries = 0
+        self._buffer = []
+        self._last_seen = {}
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._stopping = False
+
+        # Metrik
+        self.debounced = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Menghentikan loop flush lalu menulis semua sisa buffer"""
+        if self._task is not None:
+            # Loop tidak di-cancel: flush yang sedang menulis dibiarkan selesai
+            # (cancel di tengah flush akan membuang baris yang sudah keluar dari buffer)
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            print(f"{len(self._buffer)} data kehadiran tidak tertulis saat shutdown")
+
+    def submit(self, user_id):
+        """
+        Menambahkan satu check-in ke buffer (timestamp UTC seperti CURRENT_TIMESTAMP).
+        Mengembalikan False jika user sudah check-in dalam jendela cooldown.
+        """
+        now = time.time()
+        session_key = None
+        if self.cooldown > 0:
+            last_seen = self._last_seen.get(user_id)
+            if last_seen is not None and now - last_seen < self.cooldown:
+                self.debounced += 1
+                return False
+            self._last_seen[user_id] = now
+            session_key = int(now // self.cooldown)
+
+        timestamp = datetime.utcfromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        self._buffer.append((user_id, timestamp, session_key))
+        if len(self._buffer) >= self.max_rows and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _prune_last_seen(self):
+        # Buang user yang jendela cooldown-nya sudah lewat agar map tidak terus tumbuh
+        cutoff = time.time() - self.cooldown
+        self._last_seen = {
+            user_id: last_seen
+            for user_id, last_seen in self._last_seen.items()
+            if last_seen >= cutoff
+        }
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if len(self._last_seen) > self.max_rows:
+                self._prune_last_seen()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+
+            rows, self._buffer = self._buffer, []
+            start_time = time.perf_counter()
+            try:
+                await record_attendance_batch(rows)
+            except asyncio.CancelledError:
+                # Task dibatalkan dari luar: baris dikembalikan agar tidak hilang
+                self._buffer = rows + self._buffer
+                raise
+            except Exception as e:
+                self.failed_flushes += 1
+                self._retries += 1
+                print(f"Gagal menulis {len(rows)} data kehadiran: {e}")
+                if self._retries >= self.max_retries:
+                    self._retries = 0
+                    self._drop(rows, "batas percobaan tercapai")
+                    return
+                # Kembalikan ke depan buffer agar dicoba lagi pada flush berikutnya
+                self._buffer = rows + self._buffer
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    self._drop(self._buffer[:overflow], "buffer penuh")
+                    self._buffer = self._buffer[overflow:]
+                return
+
+            self._retries = 0
+            elapsed_ms = (time.perf_counter() - start_time) * 1000.0
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.total_flush_ms += elapsed_ms
+
+    def _drop(self, rows, reason):
+        # User yang check-in-nya dibuang boleh check-in lagi tanpa menunggu cooldown
+        for user_id, _, _ in rows:
+            self._last_seen.pop(user_id, None)
+        self.dropped_rows += len(rows)
+        print(f"Membuang {len(rows)} data kehadiran ({reason})")
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._buffer),
+            "debounced": self.debounced,
+            "cooldown_seconds": self.cooldown,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+            "avg_rows_per_flush": self.flushed_rows / self.flushes if self.flushes else 0.0,
+        }
+
+
+# Writer bersama untuk semua endpoint
+attendance_writer = AttendanceWriter()
@@ -0,0 +1,111 @@
+"""
+Benchmark query database pada tabel attendance sintetis (default 1 juta baris),
+sebelum dan sesudah migrasi indeks.
+
+    python -m app.database.benchmark --rows 1000000 --users 2000
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import app.database.db as db
+
+
+# Mengisi database sintetis dengan sqlite3 sinkron (paling cepat untuk bulk insert)
+def populate(path, rows, users, embeddings_per_user):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users (id, name, email) VALUES (?, ?, ?)",
+        ((i, f"User {i}", f"Kelas {i}") for i in range(1, users + 1))
+    )
+    conn.executemany(
+        "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
+        ((i, b"\0" * 16) for i in range(1, users + 1) for _ in range(embeddings_per_user))
+    )
+
+    start = datetime(2024, 1, 1)
+    rng = random.Random(0)
+
+    def attendance_rows():
+        for _ in range(rows):
+            timestamp = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            yield rng.randrange(1, users + 1), timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.executemany("INSERT INTO attendance (user_id, timestamp) VALUES (?, ?)", attendance_rows())
+    conn.commit()
+    conn.close()
+
+
+async def _time(label, fn, repeat):
+    await fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000.0
+    return label, elapsed_ms
+
+
+async def run_queries(users, repeat):
+    user_id = users // 2
+
+    async def user_attendance_range():
+        async with db.connect() as conn:
+            cursor = await conn.execute(
+                "SELECT COUNT(*) FROM attendance WHERE user_id = ? AND timestamp >= ?",
+                (user_id, "2024-06-01")
+            )
+            await cursor.fetchone()
+
+    async def user_by_class():
+        await db.get_user_by_class(f"Kelas {user_id}")
+
+    return [
+        await _time("get_attendance_history(50)", lambda: db.get_attendance_history(50), repeat),
+        await _time("get_user_embeddings(user)", lambda: db.get_user_embeddings(user_id), repeat),
+        await _time("attendance per user since date", user_attendance_range, repeat),
+        await _time("get_user_by_class(kelas)", user_by_class, repeat),
+    ]
+
+
+async def main(rows, users, embeddings_per_user, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_PATH = Path(tmp) / "benchmark.db"
+        await db.init_pool()
+
+        # Skema dasar tanpa migrasi (kondisi sebelum indeks ditambahkan)
+        async with db.connect() as conn:
+            await db.create_tables(conn)
+            await conn.commit()
+
+        start = time.perf_counter()
+        populate(str(db.DATABASE_PATH), rows, users, embeddings_per_user)
+        print(f"Populated {rows} attendance rows in {time.perf_counter() - start:.1f}s")
+
+        before = await run_queries(users, repeat)
+
+        start = time.perf_counter()
+        async with db.connect() as conn:
+            applied = await db.run_migrations(conn)
+        print(f"Migrations {applied} applied in {time.perf_counter() - start:.1f}s")
+
+        after = await run_queries(users, repeat)
+        await db.close_pool()
+
+    print(f"\n{'query':<35}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for (label, before_ms), (_, after_ms) in zip(before, after):
+        print(f"{label:<35}{before_ms:>14.3f}{after_ms:>14.3f}{before_ms / after_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark indeks SQLite face attendance")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--embeddings-per-user", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.users, args.embeddings_per_user, args.repeat))
@@ -0,0 +1,217 @@
+"""
+Impor massal user beserta foto wajahnya tanpa lewat HTTP (mis. awal tahun ajaran).
+
+Sumber berupa folder atau manifest CSV:
+
+    folder/<kelas>/<nama>/*.jpg   setiap folder yang berisi foto adalah satu user;
+                                  nama = nama folder, email/kelas = path relatif folder
+                                  (mis. "XII TKJ A/Budi"). Kolom email unik, jadi folder
+                                  kelas saja akan menggabungkan semua siswa satu kelas
+                                  menjadi satu user; pakai manifest untuk nilai kelas lain
+    manifest.csv                  kolom name,email,photo (path relatif terhadap CSV);
+                                  beberapa baris dengan email sama = satu user
+
+Foto diproses paralel oleh pool multiprocessing, lalu user dan embedding ditulis per
+batch dalam satu transaksi. Setiap user yang sudah di-commit dicatat di file
+checkpoint sehingga impor yang terhenti bisa dilanjutkan dengan perintah yang sama;
+user tanpa wajah terdeteksi dicoba lagi pada impor berikutnya (setelah fotonya
+diperbaiki). Di akhir, snapshot galeri bersama (dan indeks IVF jika dipakai) dibangun
+ulang. Server yang berjalan dengan galeri bersama (GALLERY_SHARED=1, otomatis untuk
+lebih dari satu worker) langsung memakai snapshot tersebut; server satu worker memuat
+galerinya sekali saat start sehingga perlu di-restart setelah impor.
+
+    python -m app.database.bulk_import foto/ [--workers 4] [--batch-size 500]
+    python -m app.database.bulk_import manifest.csv --checkpoint impor.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import app.database.db as db
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# Fungsi untuk menelusuri folder secara bertahap: (kunci, nama, email, daftar foto) per user
+def iter_directory(root):
+    root = Path(root)
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        photos = sorted(
+            str(Path(directory) / name) for name in files if name.lower().endswith(PHOTO_EXTENSIONS)
+        )
+        if not photos or Path(directory) == root:
+            continue
+        # Path relatif dipakai sebagai email/kelas (unik per user) sekaligus kunci checkpoint
+        email = Path(directory).relative_to(root).as_posix()
+        yield email, Path(directory).name, email, photos
+
+
+# Fungsi untuk membaca manifest CSV (name,email,photo) dan mengelompokkan foto per email
+def iter_manifest(path):
+    path = Path(path)
+    users = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            email = (row.get("email") or row.get("kelas") or "").strip()
+            photo = (row.get("photo") or row.get("path") or "").strip()
+            if not email or not photo:
+                continue
+            name = (row.get("name") or row.get("nama") or "").strip() or email
+            user = users.setdefault(email, (name, []))
+            user[1].append(str(path.parent / photo))
+    for email, (name, photos) in users.items():
+        yield email, name, email, photos
+
+
+def iter_source(source):
+    return iter_directory(source) if Path(source).is_dir() else iter_manifest(source)
+
+
+class Checkpoint:
+    """Daftar user yang sudah di-commit, user tanpa wajah terdeteksi dan total statistik impor"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.done = set()
+        self.no_face = set()
+        self.stats = {"users": 0, "photos": 0, "embeddings": 0, "no_face": 0}
+        if self.path.exists():
+            with open(self.path) as f:
+                data = json.load(f)
+            self.done = set(data["done"])
+            self.no_face = set(data.get("no_face", []))
+            self.stats.update(data["stats"])
+
+    def save(self):
+        self.stats["no_face"] = len(self.no_face)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(self.done), "no_face": sorted(self.no_face), "stats": self.stats}, f)
+        os.replace(tmp_path, self.path)
+
+
+# Initializer worker: muat detektor dan embedder sekali per proses
+def _init_worker():
+    from app.models.embedders import get_embedder
+    from app.models.detectors import get_detector
+
+    get_detector()
+    get_embedder()
+
+
+# Dijalankan di worker: baca semua foto satu user lalu ekstrak embedding-nya
+def _process_user(task):
+    from app.models.face_recognition import extract_face_embeddings
+
+    key, name, email, photos = task
+    contents = []
+    for photo in photos:
+        try:
+            with open(photo, "rb") as f:
+                contents.append(f.read())
+        except OSError:
+            continue
+    return key, name, email, len(photos), extract_face_embeddings(contents)
+
+
+async def _write_batch(batch, checkpoint, descriptor):
+    users = [(name, email, embeddings) for _, name, email, _, embeddings in batch if embeddings]
+    if users:
+        await db.add_users_with_embeddings(users, descriptor)
+
+    # Hanya user yang di-commit yang dilewati saat impor dilanjutkan; user tanpa wajah
+    # diproses ulang agar fotonya bisa diperbaiki lalu diimpor dengan perintah yang sama
+    for key, _, _, photos, embeddings in batch:
+        if not embeddings:
+            checkpoint.no_face.add(key)
+            continue
+        checkpoint.done.add(key)
+        checkpoint.no_face.discard(key)
+        checkpoint.stats["users"] += 1
+        checkpoint.stats["photos"] += photos
+        checkpoint.stats["embeddings"] += len(embeddings)
+    checkpoint.save()
+
+
+# Bangun ulang snapshot galeri bersama (dan indeks IVF) agar server langsung siap.
+# Hanya SharedGallery yang dibagi lewat file; GalleryCache server satu worker tidak
+# ikut diperbarui sampai server di-restart.
+async def _prepare_gallery(embedder):
+    from app.models.ann_index import GALLERY_INDEX, IVFIndex
+    from app.models.gallery_store import SharedGallery, load_gallery
+
+    gallery = SharedGallery()
+    await load_gallery(gallery, embedder)
+    snapshot = gallery.snapshot()
+
+    if GALLERY_INDEX == "ivf" and len(snapshot) >= IVFIndex().min_train_size:
+        index = IVFIndex()
+        await asyncio.to_thread(index.train, snapshot.matrix)
+        await asyncio.to_thread(index.sync, snapshot)
+        index.save()
+    return len(snapshot)
+
+
+async def bulk_import(source, checkpoint_path=None, workers=None, batch_size=500):
+    from app.models.descriptor import migrate_stored_embeddings
+    from app.models.embedders import get_embedder
+
+    checkpoint = Checkpoint(checkpoint_path or f"{Path(source).resolve()}.import.json")
+    embedder = get_embedder()
+
+    await db.init_pool()
+    try:
+        await db.init_db()
+        # Sama seperti startup server: embedding lama dikonversi dulu agar ikut masuk galeri
+        if embedder.name == "hog":
+            await migrate_stored_embeddings()
+
+        tasks = (task for task in iter_source(source) if task[0] not in checkpoint.done)
+        context = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        photos = 0
+        batch = []
+        with context.Pool(workers or os.cpu_count(), initializer=_init_worker) as pool:
+            for result in pool.imap_unordered(_process_user, tasks, chunksize=4):
+                batch.append(result)
+                photos += result[3]
+                if len(batch) >= batch_size:
+                    await _write_batch(batch, checkpoint, embedder.descriptor_version)
+                    batch = []
+                    elapsed = time.perf_counter() - start
+                    print(f"{checkpoint.stats['users']} user, {checkpoint.stats['photos']} foto "
+                          f"({photos / elapsed:.1f} foto/detik)")
+            if batch:
+                await _write_batch(batch, checkpoint, embedder.descriptor_version)
+        elapsed = time.perf_counter() - start
+
+        gallery_size = await _prepare_gallery(embedder)
+    finally:
+        await db.close_pool()
+
+    return checkpoint.stats, photos, elapsed, gallery_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Impor massal user dan foto wajah")
+    parser.add_argument("source", help="Folder foto atau manifest CSV (name,email,photo)")
+    parser.add_argument("--checkpoint", help="File checkpoint (default: <source>.import.json)")
+    parser.add_argument("--workers", type=int, default=0, help="Jumlah proses (default: jumlah CPU)")
+    parser.add_argument("--batch-size", type=int, default=500, help="User per transaksi")
+    args = parser.parse_args()
+
+    stats, photos, elapsed, gallery_size = asyncio.run(
+        bulk_import(args.source, args.checkpoint, args.workers or None, args.batch_size)
+    )
+    rate = photos / elapsed if elapsed > 0 else 0.0
+    print(f"Selesai: {photos} foto diproses dalam {elapsed:.1f} detik ({rate:.1f} foto/detik)")
+    print(f"Total: {stats['users']} user, {stats['embeddings']} embedding, "
+          f"{stats['no_face']} user tanpa wajah terdeteksi")
+    print(f"Galeri siap: {gallery_size} embedding")
+    print("Server satu worker tanpa GALLERY_SHARED=1 perlu di-restart agar user baru dikenali")
@@ -1,100 +1,340 @@
 import aiosqlite
+import asyncio
 import json
 import os
 import numpy as np
+import sqlite3
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+from app.database.embedding_format import (
+    DESCRIPTOR_UNKNOWN, decode_embedding, decode_matrix, embedding_info, encode_embedding
+)
+from app.database.migrations import run_migrations
+
 # Pastikan direktori database ada
 DATABASE_DIR = Path(__file__).parent
 DATABASE_PATH = DATABASE_DIR / "face_attendance.db"
 
+# Pemisah kelas dan nama di kolom users.login_key
+LOGIN_KEY_SEPARATOR = "\x1f"
+# Karakter terbesar, untuk batas atas range scan prefix pada indeks login_key
+_LOGIN_KEY_MAX_CHAR = "\U0010ffff"
+# Jumlah maksimum prefix nama input yang dicocokkan (batas parameter query)
+_LOGIN_MAX_PREFIXES = 200
+
+# Jumlah koneksi yang dibuka sekali dan dipakai ulang oleh semua request
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 4))
+# Jumlah prepared statement yang di-cache per koneksi oleh sqlite3
+DB_CACHED_STATEMENTS = 256
+
+# Pragma untuk setiap koneksi pool: WAL agar pembaca tidak diblokir penulis,
+# synchronous NORMAL (aman dengan WAL), cache 16 MB dan mmap 256 MB
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class ConnectionPool:
+    """Pool koneksi aiosqlite berumur panjang (dibuat saat startup, ditutup saat shutdown)"""
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._connections = []
+        self._available = None
+
+    async def open(self):
+        self._available = asyncio.Queue()
+        for _ in range(self.size):
+            db = await aiosqlite.connect(self.path, cached_statements=DB_CACHED_STATEMENTS)
+            for pragma in SQLITE_PRAGMAS:
+                await db.execute(pragma)
+            db.row_factory = aiosqlite.Row
+            self._connections.append(db)
+            self._available.put_nowait(db)
+
+    async def close(self):
+        for db in self._connections:
+            await db.close()
+        self._connections = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        db = await self._available.get()
+        try:
+            yield db
+        except BaseException:
+            # Jangan kembalikan koneksi dengan transaksi yang setengah jalan
+            await db.rollback()
+            raise
+        finally:
+            self._available.put_nowait(db)
+
+
+_pool = None
+
+# Membuka pool koneksi (dipanggil dari startup_event)
+async def init_pool():
+    global _pool
+    if _pool is None:
+        pool = ConnectionPool(DATABASE_PATH)
+        await pool.open()
+        _pool = pool
+
+# Menutup semua koneksi pool (dipanggil dari shutdown_event)
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+# Mengambil koneksi dari pool; tanpa pool (mis. skrip CLI) buka koneksi sekali pakai
+@asynccontextmanager
+async def connect():
+    if _pool is None:
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            yield db
+    else:
+        async with _pool.acquire() as db:
+            yield db
+
 # Inisialisasi database
 async def init_db():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        await db.execute('''
-        CREATE TABLE IF NOT EXISTS face_embeddings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            embedding BLOB NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        await db.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
+    async with connect() as db:
+        await create_tables(db)
         await db.commit()
+        
+        # Terapkan migrasi skema yang belum dijalankan (indeks, kolom baru, dst.)
+        return await run_migrations(db)
 
-# Fungsi untuk menambahkan user baru
-async def add_user(name, email):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+# Skema dasar (versi 0); perubahan berikutnya ditulis sebagai migrasi
+async def create_tables(db):
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS face_embeddings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        embedding BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+# Normalisasi teks login: huruf kecil (casefold) dan spasi berlebih dirapatkan
+def normalize_login_text(s):
+    return ' '.join(s.split()).casefold()
+
+# Kunci login ternormalisasi: kelas lalu nama, agar prefix nama dalam satu kelas
+# bisa dicari dengan range scan pada indeks
+def make_login_key(name, kelas):
+    return normalize_login_text(kelas) + LOGIN_KEY_SEPARATOR + normalize_login_text(name)
+
+# Insert satu user di koneksi/transaksi yang sedang berjalan; mengembalikan id baru.
+# Email yang sudah terdaftar melempar sqlite3.IntegrityError.
+async def _insert_user(db, name, email):
+    try:
+        cursor = await db.execute(
+            "INSERT INTO users (name, email, login_key) VALUES (?, ?, ?)",
+            (name, email, make_login_key(name, email))
+        )
+    except sqlite3.IntegrityError as e:
+        if "login_key" not in str(e):
+            raise
+        # Kelas+nama sama setelah normalisasi: simpan tanpa kunci login
+        # (user tetap bisa login lewat pencocokan kelas persis)
+        print(f"Kunci login '{make_login_key(name, email)}' sudah dipakai user lain; "
+              f"'{name}' ({email}) disimpan tanpa kunci login")
         cursor = await db.execute(
             "INSERT INTO users (name, email) VALUES (?, ?)",
             (name, email)
         )
+    return cursor.lastrowid
+
+# Fungsi untuk menambahkan user baru
+async def add_user(name, email):
+    async with connect() as db:
+        user_id = await _insert_user(db, name, email)
         await db.commit()
-        return cursor.lastrowid
+        return user_id
+
+# Fungsi untuk mendaftarkan user baru beserta embedding wajahnya dalam satu transaksi,
+# sehingga tidak pernah ada user tanpa wajah; hasil (user_id, daftar id embedding)
+async def add_user_with_embeddings(name, email, embeddings, descriptor=DESCRIPTOR_UNKNOWN):
+    rows = [encode_embedding(embedding, descriptor=descriptor) for embedding in embeddings]
+    
+    # Jika gagal di tengah jalan, connect() membuang transaksi (rollback oleh pool)
+    async with connect() as db:
+        user_id = await _insert_user(db, name, email)
+        embedding_ids = []
+        for embedding_bytes in rows:
+            cursor = await db.execute(
+                "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
+                (user_id, embedding_bytes)
+            )
+            embedding_ids.append(cursor.lastrowid)
+        await db.commit()
+    return user_id, embedding_ids
 
 # Fungsi untuk menambahkan embedding wajah
-async def add_face_embedding(user_id, embedding):
-    # Konversi embedding numpy ke bytes untuk storage
-    embedding_bytes = np.array(embedding).tobytes()
+async def add_face_embedding(user_id, embedding, descriptor=DESCRIPTOR_UNKNOWN):
+    # Konversi embedding numpy ke BLOB berheader (lihat embedding_format)
+    embedding_bytes = encode_embedding(embedding, descriptor=descriptor)
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
+    async with connect() as db:
+        cursor = await db.execute(
             "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
             (user_id, embedding_bytes)
         )
         await db.commit()
+        return cursor.lastrowid
+
+# Fungsi untuk menambahkan beberapa embedding milik satu user dalam satu transaksi
+async def add_face_embeddings(user_id, embeddings, descriptor=DESCRIPTOR_UNKNOWN):
+    rows = [encode_embedding(embedding, descriptor=descriptor) for embedding in embeddings]
+    
+    embedding_ids = []
+    async with connect() as db:
+        for embedding_bytes in rows:
+            cursor = await db.execute(
+                "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
+                (user_id, embedding_bytes)
+            )
+            embedding_ids.append(cursor.lastrowid)
+        await db.commit()
+    return embedding_ids
+
+# Fungsi untuk impor massal: banyak user beserta embedding-nya dalam satu transaksi.
+# users berisi (name, email, embeddings); email yang sudah terdaftar memakai user lama
+# dan embedding yang sudah tersimpan persis sama (impor ulang) tidak ditambahkan lagi.
+async def add_users_with_embeddings(users, descriptor=DESCRIPTOR_UNKNOWN):
+    user_ids = []
+    async with connect() as db:
+        for name, email, embeddings in users:
+            blobs = [encode_embedding(embedding, descriptor=descriptor) for embedding in embeddings]
+            cursor = await db.execute("SELECT id FROM users WHERE email = ?", (email,))
+            row = await cursor.fetchone()
+            if row is not None:
+                user_id = row[0]
+                cursor = await db.execute(
+                    "SELECT embedding FROM face_embeddings WHERE user_id = ?", (user_id,)
+                )
+                existing = {bytes(blob) for blob, in await cursor.fetchall()}
+                blobs = [blob for blob in blobs if blob not in existing]
+            else:
+                user_id = await _insert_user(db, name, email)
+            
+            await db.executemany(
+                "INSERT INTO face_embeddings (user_id, embedding) VALUES (?, ?)",
+                [(user_id, blob) for blob in blobs]
+            )
+            user_ids.append(user_id)
+        await db.commit()
+    return user_ids
+
+# Fungsi untuk menimpa embedding yang sudah ada (migrasi descriptor)
+async def update_embeddings(updates, descriptor=DESCRIPTOR_UNKNOWN):
+    async with connect() as db:
+        await db.executemany(
+            "UPDATE face_embeddings SET embedding = ? WHERE id = ?",
+            [(encode_embedding(embedding, descriptor=descriptor), embedding_id)
+             for embedding_id, embedding in updates]
+        )
+        await db.commit()
 
-# Fungsi untuk mendapatkan semua embedding untuk perbandingan
+# Fungsi untuk mendapatkan semua embedding (per baris, boleh berbeda dimensi)
 async def get_all_embeddings():
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        rows = await db.execute(
-            "SELECT user_id, embedding FROM face_embeddings"
+    async with connect() as db:
+        cursor = await db.execute(
+            "SELECT id, user_id, embedding FROM face_embeddings"
         )
-        results = await rows.fetchall()
         
         embeddings = []
-        for row in results:
-            # Konversi bytes kembali ke array numpy
-            embedding = np.frombuffer(row['embedding'], dtype=np.float32)
+        for embedding_id, user_id, blob in await cursor.fetchall():
+            info = embedding_info(blob)
             embeddings.append({
-                'user_id': row['user_id'],
-                'embedding': embedding
+                'id': embedding_id,
+                'user_id': user_id,
+                'embedding': decode_embedding(blob),
+                'descriptor': info[1] if info else DESCRIPTOR_UNKNOWN
             })
         
         return embeddings
 
+# Fungsi untuk memuat galeri: semua embedding berdimensi dim langsung ke satu matriks
+# float32 ternormalisasi, tanpa objek Python per baris
+async def get_embedding_matrix(dim):
+    async with connect() as db:
+        cursor = await db.execute(
+            "SELECT id, user_id, embedding FROM face_embeddings ORDER BY id"
+        )
+        rows = await cursor.fetchall()
+    
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty((0, dim), dtype=np.float32), empty
+    
+    embedding_ids, user_ids, blobs = zip(*rows)
+    matrix, selected, descriptors = decode_matrix(blobs, dim=dim, normalized=True)
+    return (
+        np.asarray(embedding_ids, dtype=np.int64)[selected],
+        np.asarray(user_ids, dtype=np.int64)[selected],
+        matrix,
+        descriptors
+    )
+
+# Fungsi untuk sidik ringkas tabel face_embeddings (jumlah baris, id maksimum)
+# tanpa membaca BLOB; dipakai untuk memutuskan apakah snapshot galeri bersama masih valid
+async def get_embeddings_fingerprint():
+    async with connect() as db:
+        cursor = await db.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM face_embeddings")
+        count, max_id = await cursor.fetchone()
+        return count, max_id
+
 # Fungsi untuk mencatat kehadiran
 async def record_attendance(user_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             "INSERT INTO attendance (user_id) VALUES (?)",
             (user_id,)
         )
         await db.commit()
 
+# Fungsi untuk mencatat banyak kehadiran sekaligus dalam satu transaksi
+async def record_attendance_batch(rows):
+    """rows: list (user_id, timestamp, session_key); duplikat per sesi diabaikan"""
+    async with connect() as db:
+        await db.executemany(
+            "INSERT OR IGNORE INTO attendance (user_id, timestamp, session_key) VALUES (?, ?, ?)",
+            rows
+        )
+        await db.commit()
+
 # Fungsi untuk mendapatkan data user berdasarkan id
 async def get_user_by_id(user_id):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM users WHERE id = ?", 
@@ -104,7 +344,7 @@ async def get_user_by_id(user_id):
 
 # Fungsi untuk mendapatkan riwayat kehadiran
 async def get_attendance_history(limit=50):
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -128,9 +368,36 @@ async def get_attendance_history(limit=50):
         
         return results
 
+async def get_attendance_stats(since_day):
+    """Statistik dashboard dari COUNT dan rollup attendance_daily (tanpa memuat baris kehadiran)"""
+    async with connect() as db:
+        cursor = await db.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM users) AS total_users,
+                (SELECT COUNT(*) FROM users u
+                 WHERE EXISTS (SELECT 1 FROM face_embeddings fe WHERE fe.user_id = u.id)) AS users_with_face,
+                (SELECT COALESCE(SUM(count), 0) FROM attendance_daily) AS total_attendance
+            """
+        )
+        total_users, users_with_face, total_attendance = await cursor.fetchone()
+        
+        cursor = await db.execute(
+            "SELECT day, count FROM attendance_daily WHERE day >= ? ORDER BY day",
+            (since_day,)
+        )
+        attendance_by_day = {row[0]: row[1] for row in await cursor.fetchall()}
+        
+        return {
+            "total_users": total_users,
+            "users_with_face": users_with_face,
+            "total_attendance": total_attendance,
+            "attendance_by_day": attendance_by_day,
+        }
+
 async def check_user_exists_by_email(email):
     """Memeriksa apakah email sudah terdaftar dalam database"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         cursor = await db.execute(
             "SELECT id FROM users WHERE email = ?",
             (email,)
@@ -140,7 +407,7 @@ async def check_user_exists_by_email(email):
 
 async def delete_user(user_id):
     """Menghapus user dari database berdasarkan ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         # Hapus embedding terkait terlebih dahulu (foreign key constraint)
         await db.execute(
             "DELETE FROM face_embeddings WHERE user_id = ?",
@@ -163,8 +430,8 @@ async def delete_user(user_id):
 
 # Fungsi admin
 async def get_all_users():
-    """Mengambil semua data user untuk admin"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    """Mengambil semua data user untuk admin (dua query, bukan satu query per user)"""
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -176,39 +443,79 @@ async def get_all_users():
             ORDER BY u.created_at DESC
             """,
         )
+        users = [_user_row_to_dict(row) for row in await cursor.fetchall()]
         
-        # Konversi ke list of dicts
-        users = []
-        for row in await cursor.fetchall():
-            user_dict = dict(row)
-            # Ganti nama kolom dari email menjadi class
-            user_dict['class'] = user_dict['email']
-            del user_dict['email']
-            
-            # Dapatkan embeddings untuk user ini
+        # Ambil embedding semua user sekaligus lalu kelompokkan per user
+        embeddings_cursor = await db.execute(
+            """
+            SELECT id, user_id, created_at 
+            FROM face_embeddings
+            ORDER BY created_at DESC
+            """
+        )
+        _attach_embeddings(users, await embeddings_cursor.fetchall())
+        
+        return users
+
+async def get_users_page(after=None, limit=50):
+    """Mengambil satu halaman user (keyset pagination berdasarkan id menurun)"""
+    # Kondisi "? IS NULL OR u.id < ?" membuat SQLite memindai seluruh tabel users,
+    # jadi halaman pertama dan halaman berikutnya memakai query terpisah
+    if after is None:
+        where, params = "", (limit,)
+    else:
+        where, params = "WHERE u.id < ?", (after, limit)
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            f"""
+            SELECT u.id, u.name, u.email, u.created_at, 
+                   COUNT(fe.id) as face_count
+            FROM users u
+            LEFT JOIN face_embeddings fe ON u.id = fe.user_id
+            {where}
+            GROUP BY u.id
+            ORDER BY u.id DESC
+            LIMIT ?
+            """,
+            params
+        )
+        users = [_user_row_to_dict(row) for row in await cursor.fetchall()]
+        
+        # Embedding untuk user di halaman ini saja (memakai indeks user_id)
+        if users:
+            placeholders = ", ".join("?" for _ in users)
             embeddings_cursor = await db.execute(
-                """
-                SELECT id, created_at 
+                f"""
+                SELECT id, user_id, created_at 
                 FROM face_embeddings
-                WHERE user_id = ?
+                WHERE user_id IN ({placeholders})
                 ORDER BY created_at DESC
                 """,
-                (user_dict['id'],)
+                [user['id'] for user in users]
             )
-            
-            # Tambahkan embeddings ke user dict
-            embeddings = []
-            for emb_row in await embeddings_cursor.fetchall():
-                embeddings.append(dict(emb_row))
-            
-            user_dict['embeddings'] = embeddings
-            users.append(user_dict)
+            _attach_embeddings(users, await embeddings_cursor.fetchall())
         
         return users
 
+def _user_row_to_dict(row):
+    user_dict = dict(row)
+    # Ganti nama kolom dari email menjadi class
+    user_dict['class'] = user_dict['email']
+    del user_dict['email']
+    user_dict['embeddings'] = []
+    return user_dict
+
+def _attach_embeddings(users, embedding_rows):
+    users_by_id = {user['id']: user for user in users}
+    for emb_row in embedding_rows:
+        user = users_by_id.get(emb_row['user_id'])
+        if user is not None:
+            user['embeddings'].append({'id': emb_row['id'], 'created_at': emb_row['created_at']})
+
 async def get_user_embeddings(user_id):
     """Mengambil semua embedding dari user tertentu"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             """
@@ -230,16 +537,67 @@ async def get_user_embeddings(user_id):
 
 async def delete_embedding(embedding_id):
     """Menghapus embedding tertentu dari database"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         await db.execute(
             "DELETE FROM face_embeddings WHERE id = ?",
             (embedding_id,)
         )
         await db.commit()
 
+async def find_user_by_login(name, kelas):
+    """
+    Mencari user dengan kunci login ternormalisasi lewat indeks users.login_key:
+    cocok persis, lalu nama di database diawali input, lalu input diawali nama di database
+    """
+    key = make_login_key(name, kelas)
+    class_prefix = normalize_login_text(kelas) + LOGIN_KEY_SEPARATOR
+    
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            "SELECT * FROM users WHERE login_key = ?",
+            (key,)
+        )
+        row = await cursor.fetchone()
+        
+        # Nama di database diawali nama input (range scan prefix)
+        if row is None:
+            cursor = await db.execute(
+                """
+                SELECT * FROM users
+                WHERE login_key >= ? AND login_key < ?
+                ORDER BY login_key
+                LIMIT 1
+                """,
+                (key, key + _LOGIN_KEY_MAX_CHAR)
+            )
+            row = await cursor.fetchone()
+        
+        # Nama input diawali nama di database: setiap prefix nama input dicari persis
+        # (satu lookup indeks per kandidat), lalu dipilih prefix terpanjang
+        if row is None:
+            prefixes = [key[:end] for end in range(len(class_prefix) + 1, len(key))]
+            prefixes = prefixes[-_LOGIN_MAX_PREFIXES:]
+            if prefixes:
+                placeholders = ", ".join("?" for _ in prefixes)
+                cursor = await db.execute(
+                    f"""
+                    SELECT * FROM users
+                    WHERE login_key IN ({placeholders})
+                    ORDER BY length(login_key) DESC
+                    LIMIT 1
+                    """,
+                    prefixes
+                )
+                row = await cursor.fetchone()
+        
+        if row is None:
+            return None
+        return dict(row)
+
 async def get_user_by_class(kelas):
     """Mendapatkan user berdasarkan kelas (disimpan sebagai email)"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with connect() as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute(
             "SELECT * FROM users WHERE email = ?", 
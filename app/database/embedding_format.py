@@ -0,0 +1,178 @@
+"""
+Format penyimpanan embedding di kolom face_embeddings.embedding.
+
+Setiap BLOB diawali header 20 byte (little-endian):
+
+    magic "FEMB" | versi format (u1) | dtype (u1) | descriptor (u2) | dim (u4) | norm (f4) | scale (f4)
+
+lalu payload berisi vektor ternormalisasi (L2 = 1) dalam dtype yang dipilih:
+float32, float16 (setengah ukuran) atau int8 terkuantisasi (seperempat ukuran,
+nilai = q * scale). Norma asli disimpan di header sehingga vektor bisa
+direkonstruksi. BLOB lama tanpa header dibaca sebagai float32 mentah.
+"""
+import os
+from collections import defaultdict
+
+import numpy as np
+
+# dtype penyimpanan untuk embedding baru: float32 (default), float16 atau int8
+EMBEDDING_STORAGE_DTYPE = os.environ.get("EMBEDDING_STORAGE_DTYPE", "float32")
+
+FORMAT_MAGIC = b"FEMB"
+FORMAT_VERSION = 1
+
+# Kode descriptor yang menghasilkan embedding (untuk membedakan baris yang tidak kompatibel)
+DESCRIPTOR_UNKNOWN = 0
+DESCRIPTOR_HOG_LEGACY = 1
+DESCRIPTOR_HOG = 2
+DESCRIPTOR_HOG_PCA = 3
+DESCRIPTOR_ONNX = 16
+
+_DTYPE_CODES = {"float32": 0, "float16": 1, "int8": 2}
+_CODE_DTYPES = {code: np.dtype(name) for name, code in _DTYPE_CODES.items()}
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "u1"),
+    ("dtype", "u1"),
+    ("descriptor", "<u2"),
+    ("dim", "<u4"),
+    ("norm", "<f4"),
+    ("scale", "<f4"),
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+_NORM_EPS = 1e-12
+
+
+# Fungsi untuk mengubah satu embedding menjadi BLOB berheader
+def encode_embedding(embedding, dtype=None, descriptor=DESCRIPTOR_UNKNOWN):
+    dtype = dtype or EMBEDDING_STORAGE_DTYPE
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"dtype penyimpanan tidak dikenal: {dtype}")
+
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    unit = vector / max(norm, _NORM_EPS)
+
+    scale = 1.0
+    if dtype == "int8":
+        scale = max(float(np.abs(unit).max(initial=0.0)) / 127.0, _NORM_EPS)
+        payload = np.clip(np.rint(unit / scale), -127, 127).astype("<i1")
+    else:
+        payload = unit.astype("<f2" if dtype == "float16" else "<f4")
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (FORMAT_MAGIC, FORMAT_VERSION, _DTYPE_CODES[dtype], descriptor, vector.shape[0], norm, scale)
+    return header.tobytes() + payload.tobytes()
+
+
+def _parse_header(blob):
+    if len(blob) < HEADER_SIZE or blob[:4] != FORMAT_MAGIC:
+        return None
+    header = np.frombuffer(blob, dtype=HEADER_DTYPE, count=1)[0]
+    dtype = _CODE_DTYPES.get(int(header["dtype"]))
+    if dtype is None or len(blob) != HEADER_SIZE + int(header["dim"]) * dtype.itemsize:
+        return None
+    return header
+
+
+# Fungsi untuk membaca satu BLOB menjadi vektor float32 (normalized=True: tanpa norma asli)
+def decode_embedding(blob, normalized=False):
+    header = _parse_header(blob)
+    if header is None:
+        vector = np.frombuffer(blob, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), _NORM_EPS) if normalized else vector
+
+    dtype = _CODE_DTYPES[int(header["dtype"])]
+    vector = np.frombuffer(blob, dtype=dtype.newbyteorder("<"), offset=HEADER_SIZE).astype(np.float32)
+    if dtype == np.int8:
+        vector *= header["scale"]
+    if not normalized:
+        vector *= header["norm"]
+    return vector
+
+
+# Fungsi untuk membaca metadata BLOB: (dtype, descriptor, dim); None untuk format lama
+def embedding_info(blob):
+    header = _parse_header(blob)
+    if header is None:
+        return None
+    return _CODE_DTYPES[int(header["dtype"])].name, int(header["descriptor"]), int(header["dim"])
+
+
+def decode_matrix(blobs, dim=None, normalized=False):
+    """
+    Membaca banyak BLOB sekaligus menjadi satu matriks float32 (n, dim).
+
+    BLOB dengan panjang yang sama digabung lalu dibaca sebagai satu array
+    terstruktur, sehingga tidak ada objek Python per baris. Mengembalikan
+    (matriks, indeks baris yang dipakai, descriptor per baris); baris dengan
+    dimensi lain atau format rusak dilewati.
+    """
+    groups = defaultdict(list)
+    for index, blob in enumerate(blobs):
+        groups[len(blob)].append(index)
+
+    selected, parts, descriptors = [], [], []
+    for length, indices in groups.items():
+        joined = b"".join(blobs[i] for i in indices)
+        raw = np.frombuffer(joined, dtype=np.uint8).reshape(len(indices), length)
+        indices = np.asarray(indices)
+
+        if length >= HEADER_SIZE:
+            headers = raw[:, :HEADER_SIZE].copy().view(HEADER_DTYPE).ravel()
+            has_header = headers["magic"] == FORMAT_MAGIC
+        else:
+            headers, has_header = None, np.zeros(len(indices), dtype=bool)
+
+        # BLOB lama: float32 mentah tanpa header
+        legacy = ~has_header
+        if legacy.any() and length % 4 == 0 and (dim is None or length // 4 == dim):
+            matrix = raw[legacy].copy().view("<f4").astype(np.float32)
+            if normalized:
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), _NORM_EPS)
+            selected.append(indices[legacy])
+            parts.append(matrix)
+            descriptors.append(np.full(int(legacy.sum()), DESCRIPTOR_UNKNOWN, dtype=np.int64))
+
+        if not has_header.any():
+            continue
+
+        # Satu panjang BLOB bisa memuat beberapa kombinasi dtype/dim; proses per kombinasi
+        for code, dtype in _CODE_DTYPES.items():
+            rows = has_header & (headers["dtype"] == code)
+            if not rows.any():
+                continue
+            row_dim = (length - HEADER_SIZE) // dtype.itemsize
+            rows &= headers["dim"] == row_dim
+            if not rows.any() or (dim is not None and row_dim != dim):
+                continue
+
+            # Payload dibaca sebagai view berstride langsung di atas buffer gabungan
+            payload = np.ndarray(
+                shape=(len(indices), row_dim), dtype=dtype.newbyteorder("<"), buffer=joined,
+                offset=HEADER_SIZE, strides=(length, dtype.itemsize)
+            )
+            matrix = (payload if rows.all() else payload[rows]).astype(np.float32)
+            if dtype == np.int8:
+                matrix *= headers["scale"][rows, None]
+            if not normalized:
+                matrix *= headers["norm"][rows, None]
+
+            selected.append(indices[rows])
+            parts.append(matrix)
+            descriptors.append(headers["descriptor"][rows].astype(np.int64))
+
+    if not parts:
+        return np.empty((0, dim or 0), dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    if len({part.shape[1] for part in parts}) > 1:
+        raise ValueError("BLOB embedding memiliki dimensi berbeda; berikan argumen dim")
+
+    if len(parts) == 1:
+        return parts[0], selected[0], descriptors[0]
+
+    selected = np.concatenate(selected)
+    order = np.argsort(selected, kind="stable")
+    return np.vstack(parts)[order], selected[order], np.concatenate(descriptors)[order]
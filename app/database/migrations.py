@@ -0,0 +1,167 @@
+# Migrasi skema berversi: setiap migrasi dijalankan sekali, berurutan, saat startup.
+# Versi yang sudah diterapkan dicatat di tabel schema_version.
+
+import numpy as np
+
+
+async def _column_exists(db, table, column):
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return column in [row[1] for row in await cursor.fetchall()]
+
+
+# v1: kunci sesi (jendela cooldown) agar satu user hanya tercatat sekali per sesi
+async def _add_attendance_session_key(db):
+    if not await _column_exists(db, "attendance", "session_key"):
+        await db.execute("ALTER TABLE attendance ADD COLUMN session_key INTEGER")
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_user_session "
+        "ON attendance (user_id, session_key)"
+    )
+
+
+# v2: indeks sekunder untuk query yang sebelumnya full scan.
+# users(email) tidak perlu indeks baru: UNIQUE sudah membuat sqlite_autoindex_users_1.
+async def _add_lookup_indexes(db):
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_face_embeddings_user_id "
+        "ON face_embeddings (user_id)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attendance_timestamp "
+        "ON attendance (timestamp)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_attendance_user_timestamp "
+        "ON attendance (user_id, timestamp)"
+    )
+    await db.execute("ANALYZE")
+
+
+# v3: rollup jumlah kehadiran per hari untuk statistik dashboard (O(hari), bukan O(baris)).
+# Dipelihara oleh trigger sehingga ikut dalam transaksi penulis kehadiran, termasuk
+# INSERT OR IGNORE yang tidak jadi menulis dan penghapusan saat user dihapus.
+async def _add_attendance_daily_rollup(db):
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS attendance_daily (
+        day TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    await db.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_daily_insert
+    AFTER INSERT ON attendance
+    BEGIN
+        INSERT INTO attendance_daily (day, count) VALUES (date(NEW.timestamp), 1)
+        ON CONFLICT(day) DO UPDATE SET count = count + 1;
+    END
+    ''')
+    await db.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_daily_delete
+    AFTER DELETE ON attendance
+    BEGIN
+        UPDATE attendance_daily SET count = count - 1 WHERE day = date(OLD.timestamp);
+    END
+    ''')
+    await db.execute("DELETE FROM attendance_daily")
+    await db.execute('''
+    INSERT INTO attendance_daily (day, count)
+    SELECT date(timestamp), COUNT(*) FROM attendance GROUP BY date(timestamp)
+    ''')
+
+
+# v4: kunci login ternormalisasi (kelas + nama) dengan indeks unik untuk /api/login.
+# Jika beberapa user lama bertabrakan setelah normalisasi, hanya yang pertama diberi kunci.
+async def _add_login_key(db):
+    from app.database.db import make_login_key
+
+    if not await _column_exists(db, "users", "login_key"):
+        await db.execute("ALTER TABLE users ADD COLUMN login_key TEXT")
+
+    cursor = await db.execute("SELECT id, name, email FROM users ORDER BY id")
+    seen = set()
+    updates = []
+    for user_id, name, email in await cursor.fetchall():
+        key = make_login_key(name or "", email or "")
+        updates.append((None if key in seen else key, user_id))
+        seen.add(key)
+
+    await db.executemany("UPDATE users SET login_key = ? WHERE id = ?", updates)
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_login_key ON users (login_key)"
+    )
+
+
+# v5: BLOB embedding mentah (float32 tanpa metadata) diberi header format berversi
+# (dtype, dimensi, descriptor, norma); dtype mengikuti EMBEDDING_STORAGE_DTYPE
+async def _add_embedding_header(db):
+    from app.database.embedding_format import (
+        DESCRIPTOR_HOG_LEGACY, DESCRIPTOR_UNKNOWN, embedding_info, encode_embedding
+    )
+    from app.models.descriptor import LEGACY_HOG_DIM
+
+    cursor = await db.execute("SELECT id, embedding FROM face_embeddings")
+    updates = []
+    for embedding_id, blob in await cursor.fetchall():
+        if embedding_info(blob) is not None:
+            continue
+        vector = np.frombuffer(blob, dtype=np.float32)
+        descriptor = DESCRIPTOR_HOG_LEGACY if vector.shape[0] == LEGACY_HOG_DIM else DESCRIPTOR_UNKNOWN
+        updates.append((encode_embedding(vector, descriptor=descriptor), embedding_id))
+
+    await db.executemany("UPDATE face_embeddings SET embedding = ? WHERE id = ?", updates)
+
+
+# Daftar migrasi (versi, deskripsi, fungsi); tambahkan di akhir, jangan ubah urutan
+MIGRATIONS = [
+    (1, "attendance.session_key + unique (user_id, session_key)", _add_attendance_session_key),
+    (2, "indexes for embeddings, attendance history and per-user attendance", _add_lookup_indexes),
+    (3, "attendance_daily rollup maintained by triggers", _add_attendance_daily_rollup),
+    (4, "users.login_key normalized name+class with unique index", _add_login_key),
+    (5, "face_embeddings.embedding typed header (dtype, dim, descriptor, norm)", _add_embedding_header),
+]
+
+
+async def get_schema_version(db):
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor = await db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def run_migrations(db):
+    """Menerapkan semua migrasi yang belum dijalankan; mengembalikan daftar versi yang diterapkan"""
+    current_version = await get_schema_version(db)
+    await db.commit()
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        # Setiap migrasi berjalan dalam satu transaksi bersama pencatatan versinya.
+        # BEGIN IMMEDIATE mengambil lock tulis sejak awal; worker lain yang startup
+        # bersamaan menunggu, lalu melihat versi yang sudah diterapkan dan melewatinya.
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = await db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            if (await cursor.fetchone())[0] >= version:
+                await db.rollback()
+                continue
+            await migrate(db)
+            await db.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        applied.append(version)
+
+    return applied
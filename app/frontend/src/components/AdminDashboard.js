@@ -29,8 +29,12 @@ ChartJS.register(
   Legend
 );
 
+// Jumlah user per halaman di daftar pengguna
+const USERS_PAGE_SIZE = 100;
+
 const AdminDashboard = () => {
   const [users, setUsers] = useState([]);
+  const [nextUsersCursor, setNextUsersCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [message, setMessage] = useState({ text: '', type: '' });
   const [selectedUser, setSelectedUser] = useState(null);
@@ -177,19 +181,21 @@ const AdminDashboard = () => {
     };
   };
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (after = null) => {
     try {
       setLoading(true);
       
-      // Mengambil daftar user
+      // Mengambil daftar user per halaman (keyset pagination)
       const response = await axios.get('/api/admin/users', {
+        params: after ? { limit: USERS_PAGE_SIZE, after } : { limit: USERS_PAGE_SIZE },
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('adminToken')}`
         }
       });
 
       if (response.data.status === 'success') {
-        setUsers(response.data.data);
+        setUsers(prevUsers => after ? [...prevUsers, ...response.data.data] : response.data.data);
+        setNextUsersCursor(response.data.next_after);
       } else {
         setMessage({ text: response.data.message || 'Gagal memuat data', type: 'danger' });
       }
@@ -655,6 +661,14 @@ const AdminDashboard = () => {
                               ))}
                             </tbody>
                           </table>
+                          {nextUsersCursor && (
+                            <button
+                              className="btn btn-secondary btn-sm"
+                              onClick={() => fetchUsers(nextUsersCursor)}
+                            >
+                              Muat lebih banyak
+                            </button>
+                          )}
                         </div>
                       )}
                     </div>
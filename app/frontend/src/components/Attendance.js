@@ -5,6 +5,9 @@ import * as tf from '@tensorflow/tfjs';
 import '@tensorflow/tfjs-backend-wasm';
 import * as faceapi from '@vladmandic/face-api';
 
+// Lebar maksimum frame yang dikirim ke server (frame diperkecil di browser)
+const FRAME_MAX_WIDTH = 320;
+
 const Attendance = () => {
   const webcamRef = useRef(null);
   const [isProcessing, setIsProcessing] = useState(false);
@@ -12,6 +15,10 @@ const Attendance = () => {
   const [message, setMessage] = useState({ text: '', type: '' });
   const [isLiveChecking, setIsLiveChecking] = useState(false);
   const intervalRef = useRef(null);
+  // Koneksi WebSocket untuk mode otomatis
+  const wsRef = useRef(null);
+  // ID sesi kiosk agar server bisa mencari wajah di sekitar posisi frame sebelumnya
+  const sessionIdRef = useRef(Math.random().toString(36).slice(2));
 
   // Batasi resolusi webcam untuk kinerja lebih baik
   const videoConstraints = {
@@ -41,6 +48,12 @@ const Attendance = () => {
       if (intervalRef.current) {
         clearInterval(intervalRef.current);
       }
+      if (wsRef.current) {
+        // Lepas dulu agar onclose tidak memulai fallback POST setelah unmount
+        const ws = wsRef.current;
+        wsRef.current = null;
+        ws.close();
+      }
     };
   }, []);
 
@@ -53,17 +66,18 @@ const Attendance = () => {
     try {
       setIsProcessing(true);
       
-      // Ambil gambar dari webcam
-      const screenshot = webcamRef.current.getScreenshot();
-      if (!screenshot) {
+      const frame = await captureFrame();
+      if (!frame) {
         setMessage({ text: 'Tidak dapat mengakses kamera', type: 'danger' });
         return;
       }
-      
-      // Konversi ke blob untuk pengiriman ke server
-      const blob = dataURItoBlob(screenshot);
+
       const formData = new FormData();
-      formData.append('file', blob, 'face.jpg');
+      formData.append('session_id', sessionIdRef.current);
+      formData.append('file', frame.blob, 'face.jpg');
+      if (frame.box) {
+        formData.append('box', frame.box);
+      }
       
       // Kirim ke server untuk pengenalan
       const response = await axios.post('/api/recognize', formData, {
@@ -73,7 +87,8 @@ const Attendance = () => {
       if (response.data.status === 'success') {
         setRecognitionResult(response.data);
         setMessage({ 
-          text: `Halo, ${response.data.name}! Kehadiran anda berhasil dicatat.`, 
+          // Pesan dari server membedakan check-in baru dan check-in yang sudah tercatat
+          text: response.data.message, 
           type: 'success' 
         });
         
@@ -95,7 +110,78 @@ const Attendance = () => {
     }
   };
 
-  // Mulai pengecekan wajah otomatis dengan interval
+  // Kotak wajah dari TinyFaceDetector (koordinat video); null jika model belum siap atau tidak ada wajah
+  const detectFaceBox = async (video) => {
+    if (!faceapi.nets.tinyFaceDetector.isLoaded) {
+      return null;
+    }
+
+    const detection = await faceapi.detectSingleFace(
+      video,
+      new faceapi.TinyFaceDetectorOptions({ inputSize: 224, scoreThreshold: 0.5 })
+    );
+    return detection ? detection.box : null;
+  };
+
+  // Ambil satu frame penuh (diperkecil ke lebar FRAME_MAX_WIDTH) beserta kotak wajah dari
+  // browser dalam koordinat frame itu. Server memotong wajah dari frame (padding sama dengan
+  // detektor server) sehingga ROI dan tracking identitas per sesi tetap berjalan; tanpa
+  // kotak, server mendeteksi wajah sendiri.
+  const captureFrame = async () => {
+    const video = webcamRef.current?.video;
+    if (!video || video.readyState < 2 || !video.videoWidth) {
+      return null;
+    }
+
+    const box = await detectFaceBox(video);
+    const scale = Math.min(1, FRAME_MAX_WIDTH / video.videoWidth);
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
+    canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+
+    return {
+      blob: dataURItoBlob(canvas.toDataURL('image/jpeg', 0.9)),
+      box: box && [box.x, box.y, box.width, box.height].map((v) => Math.round(v * scale)).join(',')
+    };
+  };
+
+  // Kirim satu frame lewat WebSocket; dilewati jika frame sebelumnya belum terkirim
+  const sendStreamFrame = async () => {
+    const ws = wsRef.current;
+    if (!ws || ws.readyState !== WebSocket.OPEN || ws.bufferedAmount > 0) {
+      return;
+    }
+
+    const frame = await captureFrame();
+    if (!frame) {
+      return;
+    }
+    // Kotak wajah berlaku untuk frame biner berikutnya saja
+    if (frame.box) {
+      ws.send(JSON.stringify({ box: frame.box }));
+    }
+    ws.send(frame.blob);
+  };
+
+  // Hasil dari server untuk frame stream
+  const handleStreamResult = (data) => {
+    if (data.status === 'success') {
+      setRecognitionResult(data);
+      setMessage({
+        text: data.message,
+        type: 'success'
+      });
+      stopLiveChecking();
+    } else if (data.status === 'failed') {
+      setMessage({ text: data.message, type: 'danger' });
+    } else if (data.status === 'low_quality') {
+      // Frame ditolak sebelum embedding (buram, gelap, terlalu jauh, ...): tampilkan petunjuk
+      setMessage({ text: data.message, type: 'warning' });
+    }
+  };
+
+  // Mulai pengecekan wajah otomatis: frame dikirim lewat WebSocket /api/ws/recognize
   const startLiveChecking = () => {
     setIsLiveChecking(true);
     setMessage({ text: 'Memulai pengenalan wajah otomatis...', type: 'info' });
@@ -104,8 +190,28 @@ const Attendance = () => {
       clearInterval(intervalRef.current);
     }
     
-    // Batasi ke 5 FPS untuk menghemat CPU
-    intervalRef.current = setInterval(detectFace, 200);
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const ws = new WebSocket(`${protocol}//${window.location.host}/api/ws/recognize`);
+    ws.onmessage = (event) => handleStreamResult(JSON.parse(event.data));
+    ws.onopen = () => {
+      // Batasi ke 5 FPS untuk menghemat CPU
+      intervalRef.current = setInterval(sendStreamFrame, 200);
+    };
+    // Fallback ke POST /api/recognize jika WebSocket tidak tersedia atau terputus
+    // (server restart, proxy menutup koneksi); stopLiveChecking melepas wsRef lebih dulu
+    // sehingga penutupan yang disengaja tidak memicu fallback
+    const fallbackToPost = () => {
+      if (wsRef.current === ws) {
+        wsRef.current = null;
+        if (intervalRef.current) {
+          clearInterval(intervalRef.current);
+        }
+        intervalRef.current = setInterval(detectFace, 200);
+      }
+    };
+    ws.onerror = fallbackToPost;
+    ws.onclose = fallbackToPost;
+    wsRef.current = ws;
   };
 
   // Hentikan pengecekan otomatis
@@ -114,6 +220,11 @@ const Attendance = () => {
       clearInterval(intervalRef.current);
       intervalRef.current = null;
     }
+    if (wsRef.current) {
+      const ws = wsRef.current;
+      wsRef.current = null;
+      ws.close();
+    }
     setIsLiveChecking(false);
   };
 
@@ -7,8 +7,12 @@ import asyncio
 import uvicorn
 import os
 
-from app.api.routes import router as api_router
-from app.database.db import init_db
+from app.api.routes import router as api_router, get_cached_embeddings, gallery_index
+from app.api.executor import inference_executor
+from app.database.db import init_db, init_pool, close_pool
+from app.database.attendance_writer import attendance_writer
+from app.models.descriptor import migrate_stored_embeddings
+from app.models.embedders import get_embedder
 
 # Inisialisasi aplikasi FastAPI
 app = FastAPI(
@@ -46,21 +50,67 @@ async def root():
 # Handler untuk startup
 @app.on_event("startup")
 async def startup_event():
+    # Buka pool koneksi database (WAL, dipakai ulang oleh semua request)
+    await init_pool()
+    
     # Inisialisasi database
-    await init_db()
+    applied_migrations = await init_db()
     print("Database initialized")
+    if applied_migrations:
+        print(f"Schema migrations applied: {applied_migrations}")
+    
+    # Muat model embedding sekali (sesi ONNX dipakai ulang di semua request)
+    embedder = get_embedder()
+    print(f"Embedder loaded: {embedder.name} ({embedder.dim} dim)")
+    
+    # Konversi embedding lama (HOG 34020 float) ke descriptor ringkas
+    if embedder.name == "hog":
+        converted, skipped = await migrate_stored_embeddings()
+        if converted or skipped:
+            print(f"Embeddings migrated: {converted} converted, {skipped} skipped")
+    
+    # Muat galeri embedding sekali saat startup
+    gallery = await get_cached_embeddings()
+    print(f"Gallery loaded: {len(gallery)} embeddings")
+    
+    # Muat (atau latih) indeks ANN di luar event loop
+    await asyncio.to_thread(gallery_index.prepare, gallery)
+    print(f"Gallery index: {gallery_index.stats()}")
+    
+    # Siapkan pool untuk decode/deteksi/embedding di luar event loop
+    inference_executor.start()
+    print(f"Inference executor started: {inference_executor.kind} x{inference_executor.workers}")
+    
+    # Mulai antrean write-behind untuk kehadiran
+    attendance_writer.start()
+
+# Handler untuk shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    inference_executor.shutdown()
+    
+    # Tulis semua kehadiran yang masih di buffer sebelum pool ditutup
+    await attendance_writer.stop()
+    await close_pool()
 
 # Jalankan aplikasi jika dijalankan langsung
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     
-    # Konfigurasi workers untuk multi-threading
-    workers = min(os.cpu_count() or 1, 4)  # Maksimal 4 workers
+    # Mode reload (development) hanya mendukung satu proses; uvicorn mengabaikan workers
+    reload = os.environ.get("RELOAD", "0") == "1"
+    
+    # Konfigurasi workers (proses terpisah, maksimal 4)
+    workers = 1 if reload else int(os.environ.get("WORKERS", min(os.cpu_count() or 1, 4)))
+    
+    # Beberapa worker berbagi satu galeri memory-mapped alih-alih memuat salinan masing-masing
+    if workers > 1:
+        os.environ.setdefault("GALLERY_SHARED", "1")
     
     uvicorn.run(
         "app.main:app", 
         host="0.0.0.0", 
         port=port,
-        workers=workers,  # Menggunakan multi-threading
-        reload=True
-    ) 
\ No newline at end of file
+        workers=workers,
+        reload=reload
+    )
@@ -0,0 +1,685 @@
+"""
+Indeks pencarian di atas snapshot galeri untuk galeri besar.
+
+IVF: vektor galeri dikelompokkan dengan spherical k-means menjadi IVF_NLIST
+inverted list. Sebuah probe hanya dibandingkan dengan isi IVF_NPROBE list
+yang centroid-nya paling dekat, bukan dengan seluruh galeri.
+
+Centroid: satu prototipe ternormalisasi per user untuk tahap pertama, lalu
+CENTROID_RERANK_K user teratas di-rerank terhadap embedding masing-masing.
+
+    python -m app.models.ann_index build                 # latih dari galeri di database
+    python -m app.models.ann_index benchmark --size 50000  # recall vs latensi (data sintetis)
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.models.gallery import Match, normalize_rows
+
+# Jenis indeks: "exact" (scan penuh, default), "ivf" atau "centroid"
+GALLERY_INDEX = os.environ.get("GALLERY_INDEX", "exact")
+
+# Jumlah inverted list (0 = otomatis, sekitar 4 * sqrt(jumlah embedding))
+IVF_NLIST = int(os.environ.get("IVF_NLIST", 0))
+# Jumlah list yang diperiksa per probe (lebih besar = recall lebih tinggi, lebih lambat)
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", 16))
+# Di bawah jumlah ini galeri cukup di-scan penuh dan indeks tidak dilatih
+IVF_MIN_TRAIN_SIZE = int(os.environ.get("IVF_MIN_TRAIN_SIZE", 2048))
+IVF_TRAIN_ITERATIONS = int(os.environ.get("IVF_TRAIN_ITERATIONS", 15))
+# Jumlah maksimum baris sampel untuk k-means per list
+_TRAIN_SAMPLES_PER_LIST = 64
+# Baris per potongan saat menghitung jarak ke centroid (membatasi memori)
+_ASSIGN_CHUNK = 8192
+
+# Matcher centroid: jumlah user kandidat dari tahap pertama yang di-rerank per embedding
+CENTROID_RERANK_K = int(os.environ.get("CENTROID_RERANK_K", 5))
+# Tolak kecocokan jika selisih jarak user terbaik dan kedua di bawah nilai ini (0 = nonaktif)
+MATCH_MIN_MARGIN = float(os.environ.get("MATCH_MIN_MARGIN", 0.0))
+
+# Centroid dan pembagian embedding ke list disimpan agar startup tidak perlu
+# k-means ulang maupun menghitung ulang list setiap embedding
+ANN_INDEX_PATH = Path(os.environ.get(
+    "ANN_INDEX_PATH",
+    Path(__file__).parent / "ann_index.npz"
+))
+
+
+def auto_nlist(size):
+    return int(np.clip(4 * np.sqrt(max(size, 1)), 16, 4096))
+
+
+# Fungsi untuk mencari centroid terdekat setiap baris (dalam potongan)
+def assign_to_centroids(matrix, centroids):
+    assignments = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), _ASSIGN_CHUNK):
+        chunk = matrix[start:start + _ASSIGN_CHUNK]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+# Fungsi untuk melatih centroid dengan spherical k-means (kemiripan kosinus)
+def train_centroids(matrix, nlist, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = normalize_rows(matrix)
+    nlist = min(nlist, len(matrix))
+
+    sample_size = min(len(matrix), nlist * _TRAIN_SAMPLES_PER_LIST)
+    sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # Jumlahkan anggota setiap cluster dengan reduceat atas baris yang diurutkan
+        order = np.argsort(assignments, kind="stable")
+        occupied = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[occupied])[:-1]))
+        sums = np.zeros_like(centroids)
+        sums[occupied] = np.add.reduceat(sample[order], starts, axis=0)
+
+        # Cluster kosong diisi ulang dengan baris acak
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+# Fungsi untuk mencari selisih isi indeks terhadap snapshot galeri:
+# (id embedding yang sudah dihapus, mask baris snapshot yang belum diindeks)
+def snapshot_delta(indexed_ids, snapshot):
+    indexed_ids = np.fromiter(indexed_ids, dtype=np.int64, count=len(indexed_ids))
+    removed = indexed_ids[~np.isin(indexed_ids, snapshot.embedding_ids)]
+    added = ~np.isin(snapshot.embedding_ids, indexed_ids)
+    return removed, added
+
+
+# Snapshot yang lebih lama dari isi indeks tidak disinkronkan ulang: thread lain
+# sudah menerapkan perubahan yang lebih baru dan hasilnya tetap benar untuk dibaca
+def _is_older(snapshot, synced):
+    return synced is not None and snapshot.version < synced.version
+
+
+class _InvertedList:
+    """Satu inverted list: matriks vektor kontigu + user_id + id embedding, dengan kapasitas cadangan"""
+
+    def __init__(self, dim):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.embedding_ids = np.empty(0, dtype=np.int64)
+        self.count = 0
+
+    def append(self, vectors, user_ids, embedding_ids):
+        needed = self.count + len(vectors)
+        if needed > len(self.vectors):
+            capacity = max(16, needed * 2)
+            for name in ("vectors", "user_ids", "embedding_ids"):
+                old = getattr(self, name)
+                grown = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[:self.count] = old[:self.count]
+                setattr(self, name, grown)
+
+        self.vectors[self.count:needed] = vectors
+        self.user_ids[self.count:needed] = user_ids
+        self.embedding_ids[self.count:needed] = embedding_ids
+        self.count = needed
+
+    def remove(self, embedding_ids):
+        keep = ~np.isin(self.embedding_ids[:self.count], embedding_ids)
+        kept = int(keep.sum())
+        self.vectors[:kept] = self.vectors[:self.count][keep]
+        self.user_ids[:kept] = self.user_ids[:self.count][keep]
+        self.embedding_ids[:kept] = self.embedding_ids[:self.count][keep]
+        self.count = kept
+
+
+class ExactIndex:
+    """Tanpa indeks: setiap probe di-scan ke seluruh snapshot galeri"""
+
+    name = "exact"
+
+    def prepare(self, snapshot):
+        pass
+
+    def for_snapshot(self, snapshot):
+        return snapshot
+
+    def stats(self):
+        return {"type": self.name}
+
+
+class IVFIndex:
+    """
+    Indeks IVF di atas snapshot galeri. Perubahan galeri (enrollment, hapus
+    embedding/user, termasuk dari worker lain) diterapkan secara inkremental
+    dengan membandingkan id embedding snapshot terhadap isi indeks.
+
+    Sinkronisasi dan pencarian dipanggil dari thread executor, bukan dari
+    event loop, dan dilindungi satu lock.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, min_train_size=IVF_MIN_TRAIN_SIZE,
+                 path=ANN_INDEX_PATH):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.path = Path(path) if path else None
+        self.centroids = None
+        self.trained_size = 0
+        self._lists = []
+        self._locations = {}
+        self._stored = None
+        self._synced = None
+        self._lock = threading.Lock()
+        self.version = 0
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1] if self.trained else 0
+
+    def __len__(self):
+        return len(self._locations)
+
+    # ---- training & persistensi ----
+
+    def train(self, matrix):
+        nlist = self.nlist or auto_nlist(len(matrix))
+        self._set_centroids(train_centroids(matrix, nlist), len(matrix))
+
+    def _set_centroids(self, centroids, trained_size):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = trained_size
+        self._lists = [_InvertedList(self.dim) for _ in range(len(self.centroids))]
+        self._locations = {}
+        self._synced = None
+
+    def save(self, path=None):
+        """Menyimpan centroid beserta list setiap embedding yang sudah diindeks"""
+        path = Path(path or self.path)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        embedding_ids = np.fromiter(self._locations.keys(), dtype=np.int64, count=len(self._locations))
+        list_ids = np.fromiter(self._locations.values(), dtype=np.int64, count=len(self._locations))
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            trained_size=self.trained_size,
+            embedding_ids=embedding_ids,
+            list_ids=list_ids,
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path=None, dim=None):
+        """Memuat centroid tersimpan; False jika tidak ada atau dimensinya berbeda"""
+        path = Path(path or self.path)
+        if not path.exists():
+            return False
+        data = np.load(path)
+        if dim is not None and data["centroids"].shape[1] != dim:
+            return False
+        self._set_centroids(data["centroids"], int(data["trained_size"]))
+
+        # File lama hanya berisi centroid: list dihitung ulang saat sync
+        if "embedding_ids" in data.files:
+            order = np.argsort(data["embedding_ids"], kind="stable")
+            self._stored = (data["embedding_ids"][order], data["list_ids"][order])
+        return True
+
+    # List tersimpan untuk id embedding ini (-1 jika belum pernah diindeks)
+    def _stored_assignments(self, embedding_ids):
+        assignments = np.full(len(embedding_ids), -1, dtype=np.int64)
+        if self._stored is None or len(self._stored[0]) == 0:
+            return assignments
+        stored_ids, list_ids = self._stored
+        positions = np.minimum(np.searchsorted(stored_ids, embedding_ids), len(stored_ids) - 1)
+        found = stored_ids[positions] == embedding_ids
+        assignments[found] = list_ids[positions[found]]
+        return assignments
+
+    def prepare(self, snapshot):
+        """Dipanggil saat startup: muat centroid dari disk atau latih jika galeri cukup besar"""
+        if len(snapshot) == 0:
+            return
+        if self.load(dim=snapshot.dim):
+            assigned = self.sync(snapshot)
+        else:
+            if len(snapshot) < self.min_train_size:
+                return
+            self.train(snapshot.matrix)
+            assigned = self.sync(snapshot)
+        # Simpan ulang hanya jika ada embedding yang list-nya harus dihitung
+        if assigned and self.path:
+            self.save()
+
+    # ---- pembaruan inkremental ----
+
+    def add(self, embedding_ids, user_ids, vectors, assignments=None):
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(embedding_ids), -1))
+        embedding_ids = np.asarray(embedding_ids, dtype=np.int64)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if assignments is None:
+            assignments = assign_to_centroids(vectors, self.centroids)
+
+        for list_id in np.unique(assignments):
+            rows = assignments == list_id
+            self._lists[list_id].append(vectors[rows], user_ids[rows], embedding_ids[rows])
+        self._locations.update(zip(embedding_ids.tolist(), assignments.tolist()))
+        self.version += 1
+
+    def remove(self, embedding_ids):
+        by_list = {}
+        for embedding_id in embedding_ids:
+            list_id = self._locations.pop(int(embedding_id), None)
+            if list_id is not None:
+                by_list.setdefault(list_id, []).append(int(embedding_id))
+
+        for list_id, ids in by_list.items():
+            self._lists[list_id].remove(ids)
+        if by_list:
+            self.version += 1
+
+    def sync(self, snapshot):
+        """
+        Menyamakan isi indeks dengan snapshot galeri (hanya selisihnya).
+        Hasil: jumlah embedding yang list-nya harus dihitung (tidak tersimpan).
+        """
+        with self._lock:
+            if snapshot is self._synced or not self.trained or _is_older(snapshot, self._synced):
+                return 0
+
+            removed, added = snapshot_delta(self._locations.keys(), snapshot)
+            if len(removed):
+                self.remove(removed)
+
+            assigned = 0
+            if added.any():
+                embedding_ids = snapshot.embedding_ids[added]
+                vectors = normalize_rows(np.asarray(snapshot.matrix[added]))
+                assignments = self._stored_assignments(embedding_ids)
+                missing = assignments < 0
+                if missing.any():
+                    assignments[missing] = assign_to_centroids(vectors[missing], self.centroids)
+                    assigned = int(missing.sum())
+                self.add(embedding_ids, snapshot.user_ids[added], vectors, assignments)
+
+            self._stored = None
+            self._synced = snapshot
+            return assigned
+
+    def for_snapshot(self, snapshot):
+        """Matcher untuk snapshot ini: indeks IVF jika sudah dilatih, selain itu scan penuh"""
+        if not self.trained or snapshot.dim != self.dim:
+            return snapshot
+        self.sync(snapshot)
+        return self
+
+    # ---- pencarian (antarmuka sama dengan GalleryMatcher) ----
+
+    def search_batch(self, embeddings, k=1, nprobe=None):
+        with self._lock:
+            return self._search_batch(embeddings, k, nprobe)
+
+    def _search_batch(self, embeddings, k, nprobe):
+        probes = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        if len(self) == 0:
+            return [[] for _ in range(len(probes))]
+
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        coarse = probes @ self.centroids.T
+        probe_lists = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for probe, list_ids in zip(probes, probe_lists):
+            lists = [self._lists[i] for i in list_ids if self._lists[i].count]
+            if not lists:
+                results.append([])
+                continue
+
+            distances = np.concatenate([1.0 - lst.vectors[:lst.count] @ probe for lst in lists])
+            user_ids = np.concatenate([lst.user_ids[:lst.count] for lst in lists])
+            top = min(k, len(distances))
+            if top == 1:
+                order = [int(np.argmin(distances))]
+            else:
+                candidates = np.argpartition(distances, top - 1)[:top]
+                order = candidates[np.argsort(distances[candidates])]
+            results.append([(int(user_ids[i]), float(distances[i])) for i in order])
+
+        return results
+
+    def search(self, embedding, k=1):
+        return self.search_batch([embedding], k)[0]
+
+    def match_batch(self, embeddings, threshold=0.6):
+        results = []
+        for candidates in self.search_batch(embeddings, k=1):
+            if not candidates or candidates[0][1] > threshold:
+                results.append(None)
+            else:
+                results.append(Match(*candidates[0]))
+        return results
+
+    def match(self, embedding, threshold=0.6):
+        return self.match_batch([embedding], threshold)[0]
+
+    def stats(self):
+        sizes = [lst.count for lst in self._lists]
+        return {
+            "type": self.name,
+            "trained": self.trained,
+            "trained_size": self.trained_size,
+            "nlist": len(self._lists),
+            "nprobe": self.nprobe,
+            "size": len(self),
+            "max_list_size": max(sizes) if sizes else 0,
+        }
+
+
+class CentroidIndex:
+    """
+    Pencocokan dua tahap: probe dibandingkan dengan satu centroid per user,
+    lalu hanya user kandidat teratas yang dibandingkan dengan setiap
+    embedding-nya. Centroid user dihitung ulang hanya untuk user yang
+    embedding-nya berubah. Hasil match menyertakan margin ke user kedua.
+    """
+
+    name = "centroid"
+
+    def __init__(self, rerank_k=CENTROID_RERANK_K, min_margin=MATCH_MIN_MARGIN):
+        self.rerank_k = rerank_k
+        self.min_margin = min_margin
+        self.version = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._user_vectors = {}
+        self._locations = {}
+        self._slots = {}
+        self._centroids = None
+        self._slot_users = np.empty(0, dtype=np.int64)
+        self._count = 0
+        self._synced = None
+
+    @property
+    def dim(self):
+        return self._centroids.shape[1] if self._centroids is not None else 0
+
+    def __len__(self):
+        return len(self._locations)
+
+    def prepare(self, snapshot):
+        self.sync(snapshot)
+
+    def for_snapshot(self, snapshot):
+        self.sync(snapshot)
+        return self
+
+    # ---- pembaruan inkremental ----
+
+    def sync(self, snapshot):
+        """Menerapkan selisih snapshot lalu menghitung ulang centroid user yang berubah"""
+        with self._lock:
+            if snapshot is not self._synced and not _is_older(snapshot, self._synced):
+                self._sync(snapshot)
+
+    def _sync(self, snapshot):
+        if self._centroids is not None and len(snapshot) and snapshot.dim != self.dim:
+            self._reset()
+
+        removed, added = snapshot_delta(self._locations.keys(), snapshot)
+        changed = set()
+
+        for embedding_id in removed.tolist():
+            user_id = self._locations.pop(embedding_id)
+            ids, vectors = self._user_vectors[user_id]
+            keep = ids != embedding_id
+            self._user_vectors[user_id] = (ids[keep], vectors[keep])
+            changed.add(user_id)
+
+        if added.any():
+            embedding_ids = snapshot.embedding_ids[added]
+            user_ids = snapshot.user_ids[added]
+            vectors = np.asarray(snapshot.matrix[added])
+            order = np.argsort(user_ids, kind="stable")
+            groups, starts = np.unique(user_ids[order], return_index=True)
+            for user_id, rows in zip(groups.tolist(), np.split(order, starts[1:])):
+                ids, existing = self._user_vectors.get(
+                    user_id, (np.empty(0, dtype=np.int64), np.empty((0, vectors.shape[1]), dtype=np.float32))
+                )
+                self._user_vectors[user_id] = (
+                    np.concatenate([ids, embedding_ids[rows]]),
+                    np.vstack([existing, vectors[rows]]),
+                )
+                changed.add(user_id)
+            self._locations.update(zip(embedding_ids.tolist(), user_ids.tolist()))
+
+        for user_id in changed:
+            self._update_centroid(user_id)
+        if changed:
+            self.version += 1
+        self._synced = snapshot
+
+    def _update_centroid(self, user_id):
+        ids, vectors = self._user_vectors[user_id]
+        if len(ids) == 0:
+            del self._user_vectors[user_id]
+            self._remove_slot(user_id)
+            return
+
+        centroid = normalize_rows(vectors.mean(axis=0))
+        slot = self._slots.get(user_id)
+        if slot is None:
+            slot = self._count
+            if self._centroids is None or slot == len(self._centroids):
+                self._grow(len(centroid))
+            self._slots[user_id] = slot
+            self._slot_users[slot] = user_id
+            self._count += 1
+        self._centroids[slot] = centroid
+
+    def _grow(self, dim):
+        capacity = max(64, self._count * 2)
+        centroids = np.empty((capacity, dim), dtype=np.float32)
+        slot_users = np.empty(capacity, dtype=np.int64)
+        if self._centroids is not None:
+            centroids[:self._count] = self._centroids[:self._count]
+            slot_users[:self._count] = self._slot_users[:self._count]
+        self._centroids, self._slot_users = centroids, slot_users
+
+    def _remove_slot(self, user_id):
+        # Pindahkan slot terakhir ke slot yang kosong agar matriks tetap rapat
+        slot = self._slots.pop(user_id, None)
+        if slot is None:
+            return
+        last = self._count - 1
+        if slot != last:
+            moved_user = int(self._slot_users[last])
+            self._centroids[slot] = self._centroids[last]
+            self._slot_users[slot] = moved_user
+            self._slots[moved_user] = slot
+        self._count = last
+
+    # ---- pencarian ----
+
+    def search_batch(self, embeddings, k=1):
+        """Peringkat per user (bukan per embedding): list (user_id, jarak terdekat)"""
+        with self._lock:
+            return self._search_batch(embeddings, k)
+
+    def _search_batch(self, embeddings, k):
+        probes = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        if self._count == 0:
+            return [[] for _ in range(len(probes))]
+
+        # Tahap 1: satu perkalian matriks terhadap centroid semua user
+        scores = probes @ self._centroids[:self._count].T
+        candidates_k = min(max(self.rerank_k, k + 1), self._count)
+        if candidates_k < self._count:
+            candidate_slots = np.argpartition(-scores, candidates_k - 1, axis=1)[:, :candidates_k]
+        else:
+            candidate_slots = np.broadcast_to(np.arange(self._count), (len(probes), self._count))
+
+        # Tahap 2: jarak ke setiap embedding user kandidat, ambil yang terdekat per user
+        results = []
+        for probe, slots in zip(probes, candidate_slots):
+            ranked = []
+            for user_id in self._slot_users[slots].tolist():
+                _, vectors = self._user_vectors[user_id]
+                ranked.append((user_id, float(1.0 - np.max(vectors @ probe))))
+            ranked.sort(key=lambda item: item[1])
+            results.append(ranked[:k])
+        return results
+
+    def search(self, embedding, k=1):
+        return self.search_batch([embedding], k)[0]
+
+    def match_batch(self, embeddings, threshold=0.6):
+        results = []
+        for ranked in self.search_batch(embeddings, k=2):
+            if not ranked or ranked[0][1] > threshold:
+                results.append(None)
+                continue
+
+            user_id, distance = ranked[0]
+            margin = ranked[1][1] - distance if len(ranked) > 1 else None
+            if margin is not None and margin < self.min_margin:
+                results.append(None)
+                continue
+            results.append(Match(user_id, distance, margin))
+        return results
+
+    def match(self, embedding, threshold=0.6):
+        return self.match_batch([embedding], threshold)[0]
+
+    def stats(self):
+        return {
+            "type": self.name,
+            "users": self._count,
+            "embeddings": len(self),
+            "avg_embeddings_per_user": len(self) / self._count if self._count else 0.0,
+            "rerank_k": self.rerank_k,
+            "min_margin": self.min_margin,
+        }
+
+
+INDEXES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+    "centroid": CentroidIndex,
+}
+
+
+# Indeks galeri sesuai konfigurasi (satu per proses)
+def create_index(kind=GALLERY_INDEX):
+    if kind not in INDEXES:
+        raise ValueError(f"GALLERY_INDEX tidak dikenal: {kind}")
+    return INDEXES[kind]()
+
+
+# Fungsi untuk melatih indeks dari galeri di database lalu menyimpannya
+async def build_from_database():
+    from app.database.db import close_pool, init_pool, get_embedding_matrix
+    from app.models.embedders import get_embedder
+
+    await init_pool()
+    try:
+        embedding_ids, user_ids, matrix, _ = await get_embedding_matrix(get_embedder().dim)
+    finally:
+        await close_pool()
+
+    if len(matrix) == 0:
+        raise RuntimeError("Galeri kosong, tidak ada yang bisa dilatih")
+
+    index = IVFIndex()
+    index.train(matrix)
+    index.add(embedding_ids, user_ids, matrix)
+    index.save()
+    return len(index.centroids), len(matrix)
+
+
+# Galeri sintetis: beberapa embedding ber-noise di sekitar satu titik per user
+def synthetic_gallery(size, dim, per_user=5, noise=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    users = max(1, size // per_user)
+    centers = normalize_rows(rng.standard_normal((users, dim)).astype(np.float32))
+    user_ids = np.repeat(np.arange(users), per_user)[:size]
+    matrix = centers[user_ids] + noise * rng.standard_normal((len(user_ids), dim)).astype(np.float32) / np.sqrt(dim)
+    return centers, normalize_rows(matrix), user_ids
+
+
+def benchmark(size, dim, queries, nprobes, nlist=0, noise=0.5):
+    from app.models.gallery import GalleryMatcher
+
+    centers, matrix, user_ids = synthetic_gallery(size, dim, noise=noise)
+    exact = GalleryMatcher(matrix, user_ids, np.arange(len(matrix)))
+
+    rng = np.random.default_rng(1)
+    query_users = rng.integers(0, len(centers), queries)
+    probes = normalize_rows(
+        centers[query_users] + noise * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    )
+
+    start = time.perf_counter()
+    index = IVFIndex(nlist=nlist, path=None)
+    index.train(matrix)
+    index.sync(exact)
+    print(f"IVF trained: {len(index.centroids)} lists on {size} x {dim} in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    truth = [exact.search(probe)[0] for probe in probes]
+    exact_ms = (time.perf_counter() - start) / queries * 1000.0
+
+    print(f"\n{'matcher':<18}{'recall@1':>10}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<18}{1.0:>10.3f}{exact_ms:>12.3f}{1.0:>9.1f}x")
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        found = [index.search_batch([probe], nprobe=nprobe)[0] for probe in probes]
+        ivf_ms = (time.perf_counter() - start) / queries * 1000.0
+        recall = np.mean([
+            bool(result) and result[0][0] == expected[0]
+            for result, expected in zip(found, truth)
+        ])
+        print(f"{'ivf nprobe=' + str(nprobe):<18}{recall:>10.3f}{ivf_ms:>12.3f}{exact_ms / ivf_ms:>9.1f}x")
+
+    centroid = CentroidIndex()
+    centroid.sync(exact)
+    start = time.perf_counter()
+    found = [centroid.search(probe)[0] for probe in probes]
+    centroid_ms = (time.perf_counter() - start) / queries * 1000.0
+    recall = np.mean([result[0] == expected[0] for result, expected in zip(found, truth)])
+    print(f"{'centroid k=' + str(centroid.rerank_k):<18}{recall:>10.3f}{centroid_ms:>12.3f}{exact_ms / centroid_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indeks ANN galeri wajah")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="Latih centroid IVF dari galeri di database")
+    bench_parser = subparsers.add_parser("benchmark", help="Recall dan latensi IVF/centroid vs scan penuh")
+    bench_parser.add_argument("--size", type=int, default=50000)
+    bench_parser.add_argument("--dim", type=int, default=256)
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--nlist", type=int, default=0)
+    bench_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    bench_parser.add_argument("--noise", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        nlist, count = asyncio.run(build_from_database())
+        print(f"Indeks IVF {nlist} list dilatih dari {count} embedding -> {ANN_INDEX_PATH}")
+    else:
+        benchmark(args.size, args.dim, args.queries, args.nprobe, args.nlist, args.noise)
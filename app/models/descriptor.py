@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.database.embedding_format import DESCRIPTOR_HOG, DESCRIPTOR_HOG_PCA
+
+# Konfigurasi HOG yang disesuaikan dengan crop wajah (satu window = satu crop).
+# Default: crop 128x128, blok 16x16 tidak overlap, sel 8x8, 9 bin -> 2304 dimensi
+DESCRIPTOR_CROP_SIZE = int(os.environ.get("DESCRIPTOR_CROP_SIZE", 128))
+HOG_BLOCK_SIZE = int(os.environ.get("HOG_BLOCK_SIZE", 16))
+HOG_BLOCK_STRIDE = int(os.environ.get("HOG_BLOCK_STRIDE", 16))
+HOG_CELL_SIZE = int(os.environ.get("HOG_CELL_SIZE", 8))
+HOG_NBINS = int(os.environ.get("HOG_NBINS", 9))
+
+# Proyeksi PCA/whitening opsional yang dipelajari dari galeri
+PROJECTION_PATH = Path(os.environ.get(
+    "DESCRIPTOR_PROJECTION_PATH",
+    Path(__file__).parent / "descriptor_projection.npz"
+))
+
+# Descriptor lama: cv2.HOGDescriptor() default (window 64x128) pada crop 128x128,
+# menghasilkan 9 window x 7x15 blok x 36 = 34020 float
+LEGACY_HOG_DIM = 34020
+_LEGACY_WINDOWS = 9
+_LEGACY_BLOCKS_X = 7
+_LEGACY_BLOCKS_Y = 15
+_LEGACY_BLOCK_DIM = 36
+
+
+# Fungsi untuk membuat HOGDescriptor yang window-nya sama dengan crop wajah
+def create_hog():
+    size = (DESCRIPTOR_CROP_SIZE, DESCRIPTOR_CROP_SIZE)
+    return cv2.HOGDescriptor(
+        size,
+        (HOG_BLOCK_SIZE, HOG_BLOCK_SIZE),
+        (HOG_BLOCK_STRIDE, HOG_BLOCK_STRIDE),
+        (HOG_CELL_SIZE, HOG_CELL_SIZE),
+        HOG_NBINS,
+        1,      # derivAperture
+        -1,     # winSigma (default)
+        0,      # histogramNormType L2Hys
+        0.2,    # L2HysThreshold
+        True,   # gammaCorrection (sama dengan descriptor lama)
+    )
+
+
+# Jumlah dimensi HOG mentah untuk konfigurasi saat ini
+def hog_dim():
+    blocks = (DESCRIPTOR_CROP_SIZE - HOG_BLOCK_SIZE) // HOG_BLOCK_STRIDE + 1
+    cells_per_block = (HOG_BLOCK_SIZE // HOG_CELL_SIZE) ** 2
+    return blocks * blocks * cells_per_block * HOG_NBINS
+
+
+class Projection:
+    """Proyeksi linear (PCA, opsional whitening) dari HOG mentah ke dimensi kecil"""
+
+    def __init__(self, mean, components, scale=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, matrix, n_components, whiten=False):
+        """Mempelajari PCA dari matriks (N, D) embedding galeri"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        mean = matrix.mean(axis=0)
+        centered = matrix - mean
+
+        # SVD ekonomis; jumlah komponen dibatasi oleh rank data
+        _, singular_values, vt = np.linalg.svd(centered, full_matrices=False)
+        n_components = min(n_components, vt.shape[0])
+        components = vt[:n_components]
+
+        scale = None
+        if whiten:
+            std = singular_values[:n_components] / np.sqrt(max(len(matrix) - 1, 1))
+            scale = 1.0 / np.maximum(std, 1e-6)
+
+        return cls(mean, components, scale)
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @property
+    def output_dim(self):
+        return self.components.shape[0]
+
+    def apply(self, vectors):
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        if self.scale is not None:
+            projected = projected * self.scale
+        return projected.astype(np.float32)
+
+    def save(self, path=None):
+        path = path or PROJECTION_PATH
+        arrays = {"mean": self.mean, "components": self.components}
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or PROJECTION_PATH
+        if not Path(path).exists():
+            return None
+        data = np.load(path)
+        return cls(data["mean"], data["components"], data["scale"] if "scale" in data else None)
+
+
+_projection = None
+_projection_loaded = False
+
+
+# Proyeksi aktif (None jika belum pernah di-fit)
+def get_projection():
+    global _projection, _projection_loaded
+    if not _projection_loaded:
+        _projection = Projection.load()
+        _projection_loaded = True
+    return _projection
+
+
+# Dimensi embedding akhir yang disimpan di database
+def output_dim():
+    projection = get_projection()
+    return projection.output_dim if projection is not None else hog_dim()
+
+
+# Fungsi untuk mengonversi HOG lama (34020 float) ke HOG ringkas tanpa foto asli.
+# Setiap window lama berisi blok di grid stride-8 crop 128x128, sehingga grid
+# 15x15 blok penuh bisa direkonstruksi lalu di-subsample sesuai stride baru.
+def legacy_to_compact(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector.shape[0] != LEGACY_HOG_DIM:
+        return None
+
+    # Hanya bisa dikonversi jika geometri blok sama dengan descriptor lama
+    if (DESCRIPTOR_CROP_SIZE != 128 or HOG_BLOCK_SIZE != 16 or HOG_CELL_SIZE != 8
+            or HOG_NBINS != 9 or HOG_BLOCK_STRIDE % 8 != 0):
+        return None
+
+    windows = vector.reshape(_LEGACY_WINDOWS, _LEGACY_BLOCKS_X, _LEGACY_BLOCKS_Y, _LEGACY_BLOCK_DIM)
+    full_grid = np.empty((_LEGACY_BLOCKS_Y, _LEGACY_BLOCKS_Y, _LEGACY_BLOCK_DIM), dtype=np.float32)
+    for x in range(_LEGACY_BLOCKS_Y):
+        window = min(x, _LEGACY_WINDOWS - 1)
+        full_grid[x] = windows[window, x - window]
+
+    step = HOG_BLOCK_STRIDE // 8
+    return full_grid[::step, ::step].ravel()
+
+
+# Fungsi untuk mengonversi embedding tersimpan ke format descriptor saat ini
+def convert_stored_embedding(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector.shape[0] == output_dim():
+        return vector
+
+    if vector.shape[0] == LEGACY_HOG_DIM:
+        vector = legacy_to_compact(vector)
+        if vector is None:
+            return None
+
+    projection = get_projection()
+    if projection is not None and vector.shape[0] == projection.input_dim:
+        return projection.apply(vector)
+
+    return vector if vector.shape[0] == output_dim() else None
+
+
+# Migrasi semua baris face_embeddings ke descriptor saat ini
+async def migrate_stored_embeddings():
+    from app.database.db import get_all_embeddings, update_embeddings
+    from app.models.gallery_store import invalidate_shared_gallery
+
+    updates = []
+    skipped = 0
+    for item in await get_all_embeddings():
+        if item['embedding'].shape[0] == output_dim():
+            continue
+        converted = convert_stored_embedding(item['embedding'])
+        if converted is None:
+            skipped += 1
+            continue
+        updates.append((item['id'], converted))
+
+    if updates:
+        await update_embeddings(
+            updates, descriptor=DESCRIPTOR_HOG_PCA if get_projection() is not None else DESCRIPTOR_HOG
+        )
+        invalidate_shared_gallery()
+
+    return len(updates), skipped
+
+
+# Fit PCA dari galeri lalu tulis ulang semua embedding ke dimensi baru
+async def fit_gallery_projection(n_components, whiten=False):
+    global _projection, _projection_loaded
+    from app.database.db import get_all_embeddings, update_embeddings
+    from app.models.gallery_store import invalidate_shared_gallery
+
+    if get_projection() is not None:
+        raise RuntimeError("Proyeksi sudah ada; hapus file proyeksi dan daftarkan ulang wajah untuk fit ulang")
+
+    rows = [item for item in await get_all_embeddings() if item['embedding'].shape[0] == hog_dim()]
+    if len(rows) < 2:
+        raise RuntimeError("Minimal dua embedding HOG diperlukan untuk fit PCA")
+
+    matrix = np.stack([item['embedding'] for item in rows])
+    projection = Projection.fit(matrix, n_components, whiten=whiten)
+    projection.save()
+    _projection, _projection_loaded = projection, True
+
+    projected = projection.apply(matrix)
+    await update_embeddings(
+        [(item['id'], vector) for item, vector in zip(rows, projected)], descriptor=DESCRIPTOR_HOG_PCA
+    )
+    invalidate_shared_gallery()
+    return projection.output_dim, len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Utilitas descriptor embedding wajah")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Konversi embedding lama ke descriptor ringkas")
+    fit_parser = subparsers.add_parser("fit-pca", help="Pelajari PCA dari galeri dan proyeksikan semua embedding")
+    fit_parser.add_argument("--dim", type=int, default=256)
+    fit_parser.add_argument("--whiten", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        converted, skipped = asyncio.run(migrate_stored_embeddings())
+        print(f"{converted} embedding dikonversi, {skipped} dilewati (perlu daftar ulang)")
+    else:
+        dim, count = asyncio.run(fit_gallery_projection(args.dim, args.whiten))
+        print(f"PCA {dim} dimensi dipelajari dari {count} embedding")
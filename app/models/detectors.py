@@ -0,0 +1,259 @@
+"""
+Backend detektor wajah yang bisa dipilih per deployment (DETECTOR_BACKEND).
+
+    haar  - cascade Haar frontal face bawaan OpenCV (default)
+    lbp   - cascade LBP, lebih cepat dan sedikit kurang akurat
+    onnx  - detektor ringan berbasis ONNX lewat cv2.FaceDetectorYN (mis. YuNet)
+
+Detektor dibuat saat pertama kali dipakai dan dipakai ulang dalam satu proses
+(setiap worker atau proses executor memiliki instance sendiri).
+
+    python -m app.models.detectors benchmark --images foto/ [--labels kotak.csv]
+"""
+import argparse
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Backend detektor: "haar" (default), "lbp" atau "onnx"
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "haar")
+
+HAAR_CASCADE_PATH = Path(os.environ.get(
+    "HAAR_CASCADE_PATH",
+    Path(cv2.data.haarcascades) / "haarcascade_frontalface_default.xml"
+))
+# Cascade LBP tidak ikut paket opencv-python; unduh lbpcascade_frontalface_improved.xml
+# dari repositori OpenCV (data/lbpcascades) ke path ini
+LBP_CASCADE_PATH = Path(os.environ.get(
+    "LBP_CASCADE_PATH",
+    Path(__file__).parent / "lbpcascade_frontalface_improved.xml"
+))
+# Model ONNX untuk cv2.FaceDetectorYN, mis. face_detection_yunet_2023mar.onnx
+FACE_DETECTOR_ONNX_PATH = Path(os.environ.get(
+    "FACE_DETECTOR_ONNX_PATH",
+    Path(__file__).parent / "face_detection_yunet.onnx"
+))
+FACE_DETECTOR_SCORE_THRESHOLD = float(os.environ.get("FACE_DETECTOR_SCORE_THRESHOLD", 0.8))
+
+
+class CascadeDetector:
+    """
+    Detektor cascade OpenCV (Haar atau LBP); input BGR, dideteksi pada grayscale.
+    cv2.CascadeClassifier tidak thread-safe, jadi setiap thread executor memuat
+    cascade-nya sendiri saat pertama kali mendeteksi.
+    """
+
+    name = "haar"
+    # Ukuran window cascade; minSize lebih kecil tidak berguna
+    window = 24
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH):
+        if not Path(cascade_path).exists():
+            raise RuntimeError(f"File cascade tidak ditemukan: {cascade_path}")
+        self.cascade_path = str(cascade_path)
+        self._local = threading.local()
+        # Muat sekali di thread pembuat untuk memvalidasi file cascade
+        self._load()
+
+    def _load(self):
+        cascade = cv2.CascadeClassifier(self.cascade_path)
+        if cascade.empty():
+            raise RuntimeError(f"Cascade tidak bisa dimuat: {self.cascade_path}")
+        self._local.cascade = cascade
+        return cascade
+
+    @property
+    def cascade(self):
+        """Cascade milik thread pemanggil"""
+        cascade = getattr(self._local, "cascade", None)
+        return cascade if cascade is not None else self._load()
+
+    def detect(self, img, min_size=30, max_size=None):
+        """Mengembalikan list kotak (x, y, w, h) pada koordinat img"""
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        min_size = max(min_size, self.window)
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size) if max_size else (0, 0)
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+
+class LBPDetector(CascadeDetector):
+    name = "lbp"
+
+    def __init__(self, cascade_path=LBP_CASCADE_PATH):
+        super().__init__(cascade_path)
+
+
+class ONNXDetector:
+    """Detektor CNN ringan (YuNet) lewat cv2.FaceDetectorYN; ukuran input mengikuti frame"""
+
+    name = "onnx"
+    window = 10
+
+    def __init__(self, model_path=FACE_DETECTOR_ONNX_PATH, score_threshold=FACE_DETECTOR_SCORE_THRESHOLD):
+        if not Path(model_path).exists():
+            raise RuntimeError(f"Model detektor ONNX tidak ditemukan: {model_path}")
+        self.detector = cv2.FaceDetectorYN.create(str(model_path), "", (320, 320), score_threshold)
+        self._input_size = (320, 320)
+        # Ukuran input disimpan di detektor, jadi panggilan dari thread executor diserialkan
+        self._lock = threading.Lock()
+
+    def detect(self, img, min_size=30, max_size=None):
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        height, width = img.shape[:2]
+        with self._lock:
+            if (width, height) != self._input_size:
+                self.detector.setInputSize((width, height))
+                self._input_size = (width, height)
+            _, faces = self.detector.detect(img)
+        boxes = []
+        for face in faces if faces is not None else []:
+            x, y, w, h = (int(round(v)) for v in face[:4])
+            x, y = max(0, x), max(0, y)
+            w, h = min(w, width - x), min(h, height - y)
+            if min(w, h) < min_size or (max_size and max(w, h) > max_size):
+                continue
+            boxes.append((x, y, w, h))
+        return boxes
+
+
+DETECTORS = {
+    "haar": CascadeDetector,
+    "lbp": LBPDetector,
+    "onnx": ONNXDetector,
+}
+
+_detectors = {}
+# Thread executor bisa memanggil get_detector bersamaan saat request pertama
+_detectors_lock = threading.RLock()
+
+
+# Detektor untuk proses ini (dibuat sekali saat pertama dipakai, Haar sebagai fallback).
+# Backend cascade memuat classifier per thread, ONNX menserialkan panggilan dengan lock.
+def get_detector(backend=None):
+    backend = backend or DETECTOR_BACKEND
+    detector = _detectors.get(backend)
+    if detector is not None:
+        return detector
+
+    with _detectors_lock:
+        if backend not in _detectors:
+            try:
+                _detectors[backend] = DETECTORS[backend]()
+            except Exception as e:
+                if backend == "haar":
+                    raise
+                print(f"Gagal memuat detektor '{backend}', kembali ke Haar: {e}")
+                _detectors[backend] = get_detector("haar")
+        return _detectors[backend]
+
+
+# Fungsi untuk membaca kotak wajah acuan dari CSV: nama_file,x1,y1,x2,y2 (boleh beberapa baris per file)
+def load_labels(path):
+    labels = {}
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            labels.setdefault(row[0], []).append(tuple(int(v) for v in row[1:5]))
+    return labels
+
+
+def _iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+# Fungsi untuk memperkecil gambar yang lebih lebar dari max_width; kotak label
+# gambar tersebut diskalakan dengan faktor yang sama agar IoU tetap bermakna
+def downscale_images(images, labels, max_width):
+    resized = []
+    labels = dict(labels) if labels is not None else None
+    for name, img in images:
+        if img.shape[1] > max_width:
+            scale = max_width / img.shape[1]
+            img = cv2.resize(img, None, fx=scale, fy=scale)
+            if labels is not None and name in labels:
+                labels[name] = [tuple(int(round(v * scale)) for v in box) for box in labels[name]]
+        resized.append((name, img))
+    return resized, labels
+
+
+# Recall deteksi: tanpa label, gambar dengan minimal satu deteksi; dengan label,
+# kotak acuan (x1, y1, x2, y2) yang tertutup deteksi dengan IoU >= 0.5
+def detection_recall(detections, labels=None):
+    if labels is None:
+        return float(np.mean([bool(boxes) for boxes in detections.values()]))
+    hits = total = 0
+    for name, truth_boxes in labels.items():
+        found = [(x, y, x + w, y + h) for x, y, w, h in detections.get(name, [])]
+        total += len(truth_boxes)
+        hits += sum(any(_iou(t, f) >= 0.5 for f in found) for t in truth_boxes)
+    return hits / total if total else 0.0
+
+
+def benchmark(image_dir, backends, labels_path=None, repeat=3, max_width=0):
+    """
+    Frame/detik, wajah/detik dan recall setiap backend pada satu folder gambar.
+    Tanpa label, setiap gambar dianggap berisi satu wajah (recall = gambar dengan
+    minimal satu deteksi); dengan label, wajah acuan dihitung terdeteksi jika IoU >= 0.5.
+    """
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".bmp"))
+    images = [(p.name, cv2.imread(str(p))) for p in paths]
+    images = [(name, img) for name, img in images if img is not None]
+    if not images:
+        raise RuntimeError(f"Tidak ada gambar di {image_dir}")
+    labels = load_labels(labels_path) if labels_path else None
+
+    # Samakan resolusi dengan yang dipakai server (opsional)
+    if max_width:
+        images, labels = downscale_images(images, labels, max_width)
+
+    print(f"{len(images)} gambar dari {image_dir}\n")
+    print(f"{'backend':<8}{'frames/s':>10}{'faces/s':>10}{'ms/frame':>10}{'recall':>9}")
+    for backend in backends:
+        try:
+            detector = DETECTORS[backend]()
+        except Exception as e:
+            print(f"{backend:<8} dilewati: {e}")
+            continue
+
+        detections = {name: detector.detect(img) for name, img in images}  # warm-up + hasil
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, img in images:
+                detector.detect(img)
+        elapsed = (time.perf_counter() - start) / repeat
+
+        faces = sum(len(boxes) for boxes in detections.values())
+        recall = detection_recall(detections, labels)
+
+        print(f"{backend:<8}{len(images) / elapsed:>10.1f}{faces / elapsed:>10.1f}"
+              f"{elapsed / len(images) * 1000:>10.2f}{recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark backend detektor wajah")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench_parser = subparsers.add_parser("benchmark", help="faces/s dan recall pada folder gambar lokal")
+    bench_parser.add_argument("--images", required=True)
+    bench_parser.add_argument("--labels", help="CSV nama_file,x1,y1,x2,y2")
+    bench_parser.add_argument("--backends", nargs="+", default=list(DETECTORS))
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.add_argument("--max-width", type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.images, args.backends, args.labels, args.repeat, args.max_width)
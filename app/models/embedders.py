@@ -0,0 +1,150 @@
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.database.embedding_format import DESCRIPTOR_HOG, DESCRIPTOR_HOG_PCA, DESCRIPTOR_ONNX
+from app.models.descriptor import DESCRIPTOR_CROP_SIZE, create_hog, get_projection, output_dim
+
+# Backend embedding: "hog" (default, tanpa model) atau "onnx" (mis. MobileFaceNet)
+EMBEDDER_BACKEND = os.environ.get("EMBEDDER_BACKEND", "hog")
+
+# Konfigurasi ONNX Runtime
+ONNX_MODEL_PATH = Path(os.environ.get(
+    "ONNX_MODEL_PATH",
+    Path(__file__).parent / "mobilefacenet.onnx"
+))
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))  # 0 = default ORT
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", 0))
+ONNX_GRAPH_OPTIMIZATION = os.environ.get("ONNX_GRAPH_OPTIMIZATION", "all")
+ONNX_INPUT_SIZE = int(os.environ.get("ONNX_INPUT_SIZE", 112))
+ONNX_INPUT_MEAN = float(os.environ.get("ONNX_INPUT_MEAN", 127.5))
+ONNX_INPUT_STD = float(os.environ.get("ONNX_INPUT_STD", 128.0))
+
+
+class HOGEmbedder:
+    """Embedding HOG (+ proyeksi PCA opsional), tanpa model eksternal"""
+
+    name = "hog"
+
+    def __init__(self):
+        # HOGDescriptor dibuat sekali dan dipakai ulang di semua panggilan
+        self.hog = create_hog()
+
+    @property
+    def dim(self):
+        return output_dim()
+
+    @property
+    def descriptor_version(self):
+        # Kode descriptor yang dicatat di header BLOB embedding
+        return DESCRIPTOR_HOG_PCA if get_projection() is not None else DESCRIPTOR_HOG
+
+    def embed(self, face_img):
+        face_img = cv2.resize(face_img, (DESCRIPTOR_CROP_SIZE, DESCRIPTOR_CROP_SIZE))
+        h = self.hog.compute(face_img).flatten()
+
+        projection = get_projection()
+        if projection is not None:
+            h = projection.apply(h)
+
+        return h
+
+    def embed_batch(self, face_imgs):
+        if len(face_imgs) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack([self.embed(face_img) for face_img in face_imgs])
+
+
+class ONNXEmbedder:
+    """Embedding dari model ONNX; sesi dimuat sekali, batch dijalankan dalam satu session.run"""
+
+    name = "onnx"
+    descriptor_version = DESCRIPTOR_ONNX
+
+    def __init__(self, model_path=ONNX_MODEL_PATH):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if ONNX_INTRA_OP_THREADS > 0:
+            options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        if ONNX_INTER_OP_THREADS > 0:
+            options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[ONNX_GRAPH_OPTIMIZATION]
+
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Model dengan dimensi batch tetap (mis. 1) dijalankan per crop
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+        # Jalankan sekali untuk mengetahui dimensi output (dan warm-up)
+        dummy = np.zeros((1, 3, ONNX_INPUT_SIZE, ONNX_INPUT_SIZE), dtype=np.float32)
+        self._dim = self.session.run(None, {self.input_name: dummy})[0].reshape(1, -1).shape[1]
+
+    @property
+    def dim(self):
+        return self._dim
+
+    def preprocess(self, face_imgs):
+        """Crop BGR -> batch NCHW float32 RGB ternormalisasi"""
+        batch = np.empty((len(face_imgs), 3, ONNX_INPUT_SIZE, ONNX_INPUT_SIZE), dtype=np.float32)
+        for i, face_img in enumerate(face_imgs):
+            face_img = cv2.resize(face_img, (ONNX_INPUT_SIZE, ONNX_INPUT_SIZE))
+            if face_img.ndim == 2:
+                face_img = cv2.cvtColor(face_img, cv2.COLOR_GRAY2RGB)
+            else:
+                face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+            batch[i] = face_img.transpose(2, 0, 1)
+        batch -= ONNX_INPUT_MEAN
+        batch /= ONNX_INPUT_STD
+        return batch
+
+    def embed(self, face_img):
+        return self.embed_batch([face_img])[0]
+
+    def embed_batch(self, face_imgs):
+        if len(face_imgs) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        batch = self.preprocess(face_imgs)
+        if self.fixed_batch == 1 and len(batch) > 1:
+            outputs = [self.session.run(None, {self.input_name: batch[i:i + 1]})[0] for i in range(len(batch))]
+            output = np.concatenate(outputs)
+        else:
+            output = self.session.run(None, {self.input_name: batch})[0]
+
+        return output.reshape(len(face_imgs), -1).astype(np.float32)
+
+
+EMBEDDERS = {
+    "hog": HOGEmbedder,
+    "onnx": ONNXEmbedder,
+}
+
+_embedder = None
+
+
+# Embedder aktif untuk proses ini (dibuat sekali, HOG sebagai fallback)
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        try:
+            _embedder = EMBEDDERS[EMBEDDER_BACKEND]()
+        except Exception as e:
+            if EMBEDDER_BACKEND == "hog":
+                raise
+            print(f"Gagal memuat embedder '{EMBEDDER_BACKEND}', kembali ke HOG: {e}")
+            _embedder = HOGEmbedder()
+    return _embedder
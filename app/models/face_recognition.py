@@ -2,27 +2,38 @@ import cv2
 import numpy as np
 import os
 import time
+from collections import OrderedDict
 from pathlib import Path
 
+from app.models.gallery import GalleryMatcher
+from app.models.embedders import get_embedder
+from app.models.detectors import get_detector
+from app.models.quality import QUALITY_GATE, assess_face
+
 # Memastikan kita menggunakan CPU
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
-# Path untuk model Haar Cascade
-CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+# Mode deteksi: "full" (seluruh frame resolusi asli) atau "fast" (frame diperkecil,
+# ukuran wajah dibatasi jarak kiosk, dan hanya ROI di sekitar wajah sebelumnya)
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "full")
+# Lebar maksimum frame yang diberikan ke detektor pada mode fast
+DETECTION_MAX_WIDTH = int(os.environ.get("DETECTION_MAX_WIDTH", 320))
+# Batas ukuran wajah relatif terhadap sisi terpendek frame (dari jarak kiosk yang diharapkan)
+DETECTION_MIN_FACE_FRACTION = float(os.environ.get("DETECTION_MIN_FACE_FRACTION", 0.15))
+DETECTION_MAX_FACE_FRACTION = float(os.environ.get("DETECTION_MAX_FACE_FRACTION", 0.9))
+# ROI = kotak wajah sebelumnya diperluas sebesar margin ini (relatif ukuran kotak)
+DETECTION_ROI_MARGIN = float(os.environ.get("DETECTION_ROI_MARGIN", 0.5))
+DETECTION_ROI_TTL_SECONDS = float(os.environ.get("DETECTION_ROI_TTL_SECONDS", 2.0))
+DETECTION_ROI_MAX_SESSIONS = 1024
+# Kotak wajah dari klien (face-api di browser) diperluas sebesar ini per sisi agar
+# crop-nya mendekati kotak detektor server yang dipakai saat pendaftaran
+CLIENT_BOX_PADDING = float(os.environ.get("CLIENT_BOX_PADDING", 0.1))
+# Jika 1, kotak klien hanya dipakai sebagai ROI dan wajah tetap dikonfirmasi detektor server
+CLIENT_BOX_VERIFY = os.environ.get("CLIENT_BOX_VERIFY", "0") == "1"
 
-# Fungsi untuk mendeteksi wajah dengan Haar Cascade (cepat pada CPU)
+# Fungsi untuk mendeteksi wajah dengan detektor aktif (DETECTOR_BACKEND, default Haar)
 def detect_faces(img):
-    # Konversi ke grayscale untuk deteksi wajah yang lebih cepat
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Deteksi wajah
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.1,
-        minNeighbors=5,
-        minSize=(30, 30)
-    )
+    faces = get_detector().detect(img, min_size=30)
     
     face_images = []
     face_locations = []
@@ -37,8 +48,58 @@ def detect_faces(img):
     
     return face_images, face_locations
 
-# Fungsi alternatif untuk get_embedding tanpa DeepFace
-def get_embedding(face_img):
+# Fungsi untuk memotong wajah dari frame resolusi asli (x1, y1, x2, y2)
+def _crop_faces(img, boxes):
+    face_images = []
+    for (x1, y1, x2, y2) in boxes:
+        face_images.append(cv2.resize(img[y1:y2, x1:x2], (160, 160)))
+    return face_images
+
+# Fungsi untuk menjalankan detektor pada satu area dengan skala frame yang diperkecil,
+# lalu memetakan kotak hasil kembali ke koordinat frame asli
+def _detect_in_region(img, region, scale, frame_short_side):
+    x1, y1, x2, y2 = region
+    area = img[y1:y2, x1:x2]
+    if scale < 1.0:
+        area = cv2.resize(area, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    min_face = int(frame_short_side * DETECTION_MIN_FACE_FRACTION * scale)
+    max_face = max(min_face, int(frame_short_side * DETECTION_MAX_FACE_FRACTION * scale))
+    faces = get_detector().detect(area, min_size=min_face, max_size=max_face)
+
+    boxes = []
+    for (x, y, w, h) in faces:
+        boxes.append((
+            x1 + int(x / scale), y1 + int(y / scale),
+            x1 + int((x + w) / scale), y1 + int((y + h) / scale)
+        ))
+    return boxes
+
+# Fungsi untuk memperluas kotak wajah sebelumnya menjadi ROI pencarian
+def expand_roi(box, frame_shape, margin=DETECTION_ROI_MARGIN):
+    x1, y1, x2, y2 = box
+    pad_x = int((x2 - x1) * margin)
+    pad_y = int((y2 - y1) * margin)
+    height, width = frame_shape[:2]
+    return (max(0, x1 - pad_x), max(0, y1 - pad_y), min(width, x2 + pad_x), min(height, y2 + pad_y))
+
+# Deteksi mode fast: cari di ROI dulu (jika ada), lalu seluruh frame yang diperkecil.
+# Mengembalikan (crop wajah, lokasi, apakah ROI dipakai)
+def detect_faces_fast(img, roi=None):
+    height, width = img.shape[:2]
+    short_side = min(height, width)
+    scale = min(1.0, DETECTION_MAX_WIDTH / width)
+
+    if roi is not None:
+        boxes = _detect_in_region(img, expand_roi(roi, img.shape), scale, short_side)
+        if boxes:
+            return _crop_faces(img, boxes), boxes, True
+
+    boxes = _detect_in_region(img, (0, 0, width, height), scale, short_side)
+    return _crop_faces(img, boxes), boxes, False
+
+# Fungsi untuk menyiapkan crop wajah sebelum diberikan ke embedder
+def _prepare_face(face_img):
     # Pastikan gambar berformat yang benar
     if face_img.dtype != np.uint8:
         face_img = np.uint8(face_img)
@@ -47,36 +108,155 @@ def get_embedding(face_img):
     if len(face_img.shape) > 2 and face_img.shape[2] > 3:
         face_img = cv2.cvtColor(face_img, cv2.COLOR_BGRA2BGR)
     
-    # Resize menjadi ukuran standar
-    face_img = cv2.resize(face_img, (128, 128))
+    return face_img
+
+# Fungsi untuk mengekstrak embedding satu wajah dengan embedder aktif (HOG/ONNX)
+def get_embedding(face_img):
+    return get_embedder().embed(_prepare_face(face_img))
+
+# Fungsi untuk mengekstrak embedding banyak wajah sekaligus (satu batch inferensi)
+def get_embeddings(face_imgs):
+    return get_embedder().embed_batch([_prepare_face(face_img) for face_img in face_imgs])
+
+# Fungsi untuk men-decode bytes gambar (JPEG/PNG) menjadi array BGR
+def decode_image(contents):
+    nparr = np.frombuffer(contents, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+# Decode dan deteksi: mengembalikan crop wajah pertama dan lokasinya.
+# Fungsi tingkat modul agar bisa dijalankan di thread maupun process pool.
+def detect_first_face(contents):
+    img = decode_image(contents)
+    if img is None:
+        return None, None
+    
+    faces, face_locations = detect_faces(img)
+    if not faces:
+        return None, None
     
-    # Aplikasikan HOG
-    hog = cv2.HOGDescriptor()
-    h = hog.compute(face_img)
-    return h.flatten()
+    return faces[0], face_locations[0]
+
+# Seperti detect_first_face, dengan mode deteksi terkonfigurasi, ROI opsional dari
+# frame sebelumnya pada sesi yang sama, dan waktu decode/deteksi untuk respons
+def detect_first_face_timed(contents, roi=None, client_box=None, cropped=False):
+    start = time.perf_counter()
+    img = decode_image(contents)
+    decoded = time.perf_counter()
+
+    timings = {"mode": DETECTION_MODE, "roi": False, "decode_ms": (decoded - start) * 1000.0}
+    if img is None:
+        timings["detect_ms"] = 0.0
+        return None, None, timings
+
+    if cropped:
+        # Klien sudah mengirim crop wajah: deteksi dilewati
+        timings["mode"] = "client_crop"
+        height, width = img.shape[:2]
+        faces, face_locations = [cv2.resize(img, (160, 160))], [(0, 0, width, height)]
+    elif client_box is not None:
+        timings["mode"] = "client_box"
+        faces, face_locations = face_from_client_box(img, client_box)
+    elif DETECTION_MODE == "fast":
+        faces, face_locations, timings["roi"] = detect_faces_fast(img, roi)
+    else:
+        faces, face_locations = detect_faces(img)
+
+    if not faces:
+        timings["detect_ms"] = (time.perf_counter() - decoded) * 1000.0
+        return None, None, timings
+
+    face, location = faces[0], tuple(int(v) for v in face_locations[0])
+    if QUALITY_GATE:
+        # Alasan penolakan (atau None). Crop dari klien tidak membawa ukuran wajah asli,
+        # dan cek terpotong hanya berlaku untuk kotak detektor server
+        detector_box = not cropped and client_box is None
+        timings["quality"] = assess_face(
+            face, None if cropped else location, img.shape if detector_box else None
+        )
+    timings["detect_ms"] = (time.perf_counter() - decoded) * 1000.0
+    return face, location, timings
+
+# Fungsi untuk memotong wajah dari kotak (x, y, w, h) hasil deteksi di browser.
+# Dengan CLIENT_BOX_VERIFY, detektor server hanya dijalankan di sekitar kotak itu.
+def face_from_client_box(img, box):
+    x, y, w, h = box
+    height, width = img.shape[:2]
+    pad_x, pad_y = int(w * CLIENT_BOX_PADDING), int(h * CLIENT_BOX_PADDING)
+    region = (
+        max(0, int(x) - pad_x), max(0, int(y) - pad_y),
+        min(width, int(x + w) + pad_x), min(height, int(y + h) + pad_y)
+    )
+    if region[2] - region[0] < 2 or region[3] - region[1] < 2:
+        return [], []
+
+    if CLIENT_BOX_VERIFY:
+        roi = expand_roi(region, img.shape)
+        boxes = _detect_in_region(img, roi, min(1.0, DETECTION_MAX_WIDTH / width), min(height, width))
+        return _crop_faces(img, boxes), boxes
+
+    return _crop_faces(img, [region]), [region]
+
+class FaceRoiTracker:
+    """
+    Kotak wajah terakhir per sesi klien (mis. satu kiosk), dipakai sebagai ROI
+    untuk frame berikutnya. Kedaluwarsa setelah DETECTION_ROI_TTL_SECONDS dan
+    dibatasi DETECTION_ROI_MAX_SESSIONS sesi (yang paling lama dibuang).
+    """
+
+    def __init__(self, ttl=DETECTION_ROI_TTL_SECONDS, max_sessions=DETECTION_ROI_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._boxes = OrderedDict()
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        entry = self._boxes.get(session_id)
+        if entry is None:
+            return None
+        box, seen_at = entry
+        if time.monotonic() - seen_at > self.ttl:
+            del self._boxes[session_id]
+            return None
+        return box
+
+    def update(self, session_id, box):
+        if not session_id:
+            return
+        if box is None:
+            self._boxes.pop(session_id, None)
+            return
+        self._boxes[session_id] = (box, time.monotonic())
+        self._boxes.move_to_end(session_id)
+        while len(self._boxes) > self.max_sessions:
+            self._boxes.popitem(last=False)
+
+# Pipeline lengkap untuk satu gambar: decode, deteksi, embedding wajah pertama
+def extract_face_embedding(contents):
+    face_img, face_location = detect_first_face(contents)
+    if face_img is None:
+        return None, None
+    
+    return get_embedding(face_img), face_location
+
+# Fungsi untuk mengekstrak embedding dari beberapa foto sekaligus (satu tugas executor);
+# foto tanpa wajah dilewati, embedding dihitung dalam satu batch
+def extract_face_embeddings(contents_list):
+    faces = [face for face, _ in map(detect_first_face, contents_list) if face is not None]
+    if not faces:
+        return []
+    return list(get_embeddings(faces))
 
 # Fungsi untuk mencari kecocokan wajah dari database embedding
 def find_match(embedding, stored_embeddings, threshold=0.6):
     if embedding is None or len(stored_embeddings) == 0:
         return None
     
-    best_match = None
-    min_distance = float('inf')
+    # Gunakan matcher tervektorisasi; list dict lama dikonversi sekali
+    if not isinstance(stored_embeddings, GalleryMatcher):
+        stored_embeddings = GalleryMatcher.from_embeddings(stored_embeddings)
     
-    for item in stored_embeddings:
-        stored_embedding = item['embedding']
-        # Hitung jarak kosinus (lebih kecil = lebih mirip)
-        distance = cosine_distance(embedding, stored_embedding)
-        
-        if distance < min_distance:
-            min_distance = distance
-            best_match = item['user_id']
-    
-    # Kembalikan None jika jarak di atas threshold
-    if min_distance > threshold:
-        return None
-        
-    return best_match, min_distance
+    return stored_embeddings.match(embedding, threshold)
 
 # Fungsi untuk menghitung jarak kosinus
 def cosine_distance(embedding1, embedding2):
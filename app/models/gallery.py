@@ -0,0 +1,278 @@
+import threading
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Epsilon untuk menghindari pembagian dengan nol saat normalisasi
+_NORM_EPS = 1e-12
+
+
+# Fungsi untuk menormalisasi satu vektor atau setiap baris matriks (L2)
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, _NORM_EPS)
+
+
+class Match(NamedTuple):
+    """Hasil pencocokan: user terbaik, jarak kosinusnya, dan selisih jarak ke user kedua (jika diketahui)"""
+    user_id: int
+    distance: float
+    margin: Optional[float] = None
+
+
+class GalleryMatcher:
+    """
+    Galeri embedding wajah yang disimpan sebagai satu matriks float32 kontigu
+    yang sudah dinormalisasi, ditambah array user_id paralel. Pencocokan satu
+    probe cukup dengan satu perkalian matriks-vektor.
+    """
+
+    def __init__(self, matrix, user_ids, embedding_ids=None, version=0):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        if embedding_ids is None:
+            embedding_ids = np.full(len(self.user_ids), -1, dtype=np.int64)
+        self.embedding_ids = np.asarray(embedding_ids, dtype=np.int64)
+        self.version = version
+
+    @classmethod
+    def from_embeddings(cls, stored_embeddings):
+        """Membangun galeri dari list dict {'id', 'user_id', 'embedding'} hasil database"""
+        if len(stored_embeddings) == 0:
+            return cls(np.empty((0, 0), dtype=np.float32), [])
+
+        matrix = np.stack([
+            np.asarray(item['embedding'], dtype=np.float32)
+            for item in stored_embeddings
+        ])
+        user_ids = [item['user_id'] for item in stored_embeddings]
+        embedding_ids = [item.get('id', -1) for item in stored_embeddings]
+        return cls(normalize_rows(matrix), user_ids, embedding_ids)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def distances(self, embedding):
+        """Jarak kosinus probe ke setiap baris galeri"""
+        probe = normalize_rows(embedding)
+        return 1.0 - self.matrix @ probe
+
+    def search(self, embedding, k=1):
+        """Mengembalikan k baris terdekat sebagai list (user_id, jarak)"""
+        if len(self) == 0:
+            return []
+
+        distances = self.distances(embedding)
+        k = min(k, len(distances))
+
+        if k == 1:
+            order = [int(np.argmin(distances))]
+        else:
+            # argpartition O(n), lalu urutkan hanya k kandidat
+            candidates = np.argpartition(distances, k - 1)[:k]
+            order = candidates[np.argsort(distances[candidates])]
+
+        return [(int(self.user_ids[i]), float(distances[i])) for i in order]
+
+    def search_batch(self, embeddings, k=1):
+        """search() untuk banyak probe sekaligus dengan satu perkalian matriks"""
+        if len(self) == 0:
+            return [[] for _ in range(len(embeddings))]
+
+        probes = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        distances = 1.0 - probes @ self.matrix.T
+        k = min(k, distances.shape[1])
+
+        if k == 1:
+            order = np.argmin(distances, axis=1)[:, None]
+        else:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+            order = np.take_along_axis(candidates, np.argsort(candidate_distances, axis=1), axis=1)
+
+        return [
+            [(int(self.user_ids[i]), float(row[i])) for i in row_order]
+            for row, row_order in zip(distances, order)
+        ]
+
+    def match_batch(self, embeddings, threshold=0.6):
+        """match() untuk banyak probe; elemen None jika tidak ada yang cocok"""
+        results = []
+        for candidates in self.search_batch(embeddings, k=1):
+            if not candidates or candidates[0][1] > threshold:
+                results.append(None)
+            else:
+                results.append(Match(*candidates[0]))
+        return results
+
+    def match(self, embedding, threshold=0.6):
+        """Mengembalikan (user_id, jarak) terbaik atau None jika di atas threshold"""
+        results = self.search(embedding, k=1)
+        if not results:
+            return None
+
+        user_id, distance = results[0]
+        if distance > threshold:
+            return None
+
+        return Match(user_id, distance)
+
+
+class GalleryCache:
+    """
+    Cache galeri yang diperbarui secara inkremental (insert/delete per baris)
+    alih-alih memuat ulang seluruh tabel face_embeddings.
+
+    Pembaca selalu mendapat snapshot GalleryMatcher yang konsisten: baris baru
+    ditulis setelah batas snapshot lama, dan penghapusan membuat buffer baru,
+    sehingga snapshot yang sedang dipakai tidak pernah berubah.
+    """
+
+    def __init__(self, initial_capacity=64):
+        self._lock = threading.Lock()
+        self._initial_capacity = initial_capacity
+        self._matrix = None
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._embedding_ids = np.empty(0, dtype=np.int64)
+        self._count = 0
+        self._pending = []
+        self.loaded = False
+        self.version = 0
+        self._snapshot = GalleryMatcher(np.empty((0, 0), dtype=np.float32), [])
+
+    def snapshot(self):
+        """Snapshot galeri saat ini (aman dibaca tanpa lock)"""
+        return self._snapshot
+
+    def attach(self, fingerprint):
+        """Galeri per proses tidak punya snapshot bersama untuk dipakai ulang"""
+        return False
+
+    def load(self, stored_embeddings, fingerprint=None):
+        """Memuat isi awal galeri dari list dict {'id', 'user_id', 'embedding'}"""
+        stored_embeddings = list(stored_embeddings)
+        if not stored_embeddings:
+            return self.load_matrix([], [], None, fingerprint)
+        return self.load_matrix(
+            [item.get('id', -1) for item in stored_embeddings],
+            [item['user_id'] for item in stored_embeddings],
+            np.stack([np.asarray(item['embedding'], dtype=np.float32).ravel() for item in stored_embeddings]),
+            fingerprint
+        )
+
+    def load_matrix(self, embedding_ids, user_ids, matrix, fingerprint=None):
+        """Memuat isi awal galeri dari satu matriks, lalu memutar ulang perubahan yang tiba selama loading"""
+        with self._lock:
+            self._count = 0
+            self._matrix = None
+            if matrix is not None and len(matrix) > 0:
+                self._allocate(max(self._initial_capacity, len(matrix) * 2), matrix.shape[1])
+                self._count = len(matrix)
+                self._matrix[:self._count] = normalize_rows(matrix)
+                self._user_ids[:self._count] = user_ids
+                self._embedding_ids[:self._count] = embedding_ids
+
+            pending, self._pending = self._pending, []
+            for op in pending:
+                op()
+
+            self.loaded = True
+            self._publish()
+        return True
+
+    def add(self, embedding_id, user_id, embedding):
+        """Menambahkan satu embedding baru ke galeri"""
+        self.add_many([embedding_id], user_id, [embedding])
+
+    def add_many(self, embedding_ids, user_id, embeddings):
+        """Menambahkan beberapa embedding milik satu user dengan satu snapshot baru"""
+        rows = list(zip(embedding_ids, embeddings))
+        with self._lock:
+            if not self.loaded:
+                self._pending.extend(
+                    lambda embedding_id=embedding_id, embedding=embedding: self._append(embedding_id, user_id, embedding)
+                    for embedding_id, embedding in rows
+                )
+                return
+            for embedding_id, embedding in rows:
+                self._append(embedding_id, user_id, embedding)
+            self._publish()
+
+    def remove_embedding(self, embedding_id):
+        """Menghapus satu embedding berdasarkan id baris face_embeddings"""
+        self._remove(lambda: self._embedding_ids[:self._count] != embedding_id)
+
+    def remove_user(self, user_id):
+        """Menghapus semua embedding milik user"""
+        self._remove(lambda: self._user_ids[:self._count] != user_id)
+
+    def _remove(self, keep_mask):
+        with self._lock:
+            if not self.loaded:
+                self._pending.append(lambda: self._compact(keep_mask()))
+                return
+            self._compact(keep_mask())
+            self._publish()
+
+    def _append(self, embedding_id, user_id, embedding):
+        # Lewati id yang sudah ada (bisa terjadi saat replay setelah load)
+        if embedding_id != -1 and np.any(self._embedding_ids[:self._count] == embedding_id):
+            return
+
+        row = normalize_rows(np.asarray(embedding, dtype=np.float32).ravel())
+        if self._matrix is None or self._matrix.shape[1] != row.shape[0]:
+            if self._count > 0:
+                raise ValueError(
+                    f"Dimensi embedding {row.shape[0]} tidak cocok dengan galeri ({self._matrix.shape[1]})"
+                )
+            self._allocate(self._initial_capacity, row.shape[0])
+
+        if self._count == len(self._matrix):
+            self._allocate(len(self._matrix) * 2, row.shape[0])
+
+        self._matrix[self._count] = row
+        self._user_ids[self._count] = user_id
+        self._embedding_ids[self._count] = embedding_id
+        self._count += 1
+
+    def _allocate(self, capacity, dim):
+        # Buffer baru; snapshot lama tetap menunjuk ke buffer sebelumnya
+        matrix = np.empty((capacity, dim), dtype=np.float32)
+        user_ids = np.empty(capacity, dtype=np.int64)
+        embedding_ids = np.empty(capacity, dtype=np.int64)
+        if self._matrix is not None and self._count > 0:
+            matrix[:self._count] = self._matrix[:self._count]
+            user_ids[:self._count] = self._user_ids[:self._count]
+            embedding_ids[:self._count] = self._embedding_ids[:self._count]
+        self._matrix, self._user_ids, self._embedding_ids = matrix, user_ids, embedding_ids
+
+    def _compact(self, keep):
+        if self._matrix is None or keep.all():
+            return
+        matrix = self._matrix[:self._count][keep]
+        user_ids = self._user_ids[:self._count][keep]
+        embedding_ids = self._embedding_ids[:self._count][keep]
+        self._count = len(user_ids)
+        self._matrix = None
+        self._allocate(max(self._initial_capacity, self._count * 2), matrix.shape[1])
+        self._matrix[:self._count] = matrix
+        self._user_ids[:self._count] = user_ids
+        self._embedding_ids[:self._count] = embedding_ids
+
+    def _publish(self):
+        self.version += 1
+        if self._matrix is None:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        else:
+            matrix = self._matrix[:self._count]
+        self._snapshot = GalleryMatcher(
+            matrix,
+            self._user_ids[:self._count],
+            self._embedding_ids[:self._count],
+            version=self.version,
+        )
@@ -0,0 +1,360 @@
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.models.gallery import GalleryMatcher, normalize_rows
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa file lock, cukup untuk satu worker
+    fcntl = None
+
+# Direktori snapshot galeri yang dibagi oleh semua worker uvicorn
+GALLERY_SNAPSHOT_DIR = Path(os.environ.get(
+    "GALLERY_SNAPSHOT_DIR",
+    Path(__file__).parent.parent / "database" / "gallery"
+))
+
+# Aktifkan galeri bersama (otomatis saat app.main dijalankan dengan lebih dari satu worker)
+GALLERY_SHARED = os.environ.get("GALLERY_SHARED", "0") == "1"
+
+_CURRENT_FILE = "CURRENT"
+_LOCK_FILE = "LOCK"
+_MIN_CAPACITY = 64
+
+
+class SharedGallery:
+    """
+    Galeri yang dipublikasikan sebagai file memory-mapped berversi sehingga semua
+    worker memetakan data yang sama (zero-copy) tanpa memegang salinan sendiri.
+
+    Tata letak: file data per "file generation" (matriks float32 + user_id + id
+    embedding, dengan kapasitas cadangan) dan file CURRENT (JSON) berisi
+    generation, jumlah baris aktif dan fingerprint database. Penambahan ditulis
+    di belakang baris aktif lalu CURRENT diganti secara atomik; penghapusan
+    menulis file data baru. Pembaca hanya melakukan os.stat per request untuk
+    mendeteksi generation baru.
+
+    Penulis (add/remove/load) memegang file lock eksklusif dan menyalin/flush
+    memmap, jadi dari event loop dipanggil lewat asyncio.to_thread. snapshot()
+    tidak pernah menunggu lock: selama penulis lain memegangnya, generation yang
+    sedang dipetakan tetap dipakai.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or GALLERY_SNAPSHOT_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.loaded = False
+        self.version = 0
+        self._current_stat = None
+        self._mapped_file_gen = None
+        self._mapped = None
+        self._seen_generation = None
+        self._snapshot = GalleryMatcher(np.empty((0, 0), dtype=np.float32), [])
+
+    # ---- pembaca ----
+
+    def snapshot(self):
+        """Snapshot terbaru; memetakan ulang jika worker lain menerbitkan generation baru"""
+        self._refresh()
+        return self._snapshot
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self._path(_CURRENT_FILE))
+        except FileNotFoundError:
+            return
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._current_stat:
+            return
+
+        # Lock bersama: penulis (lock eksklusif) tidak bisa menghapus file generation
+        # lama selama CURRENT dibaca dan file datanya dipetakan. Setelah di-mmap,
+        # file tetap valid walaupun kemudian di-unlink. Jika penulis sedang memegang
+        # lock, snapshot lama tetap dipakai dan pemetaan dicoba lagi pada request berikutnya.
+        with self._locked(shared=True, blocking=False) as acquired:
+            if not acquired:
+                return
+            meta = self._read_meta()
+            if meta is None:
+                return
+            self._attach_meta(meta)
+        self._current_stat = key
+
+    def _attach_meta(self, meta):
+        if meta["file"] != self._mapped_file_gen:
+            self._mapped = self._map_files(meta, mode="r")
+            self._mapped_file_gen = meta["file"]
+
+        matrix, user_ids, embedding_ids = self._mapped
+        count = meta["count"]
+        self._snapshot = GalleryMatcher(
+            matrix[:count] if matrix is not None else np.empty((0, 0), dtype=np.float32),
+            user_ids[:count] if user_ids is not None else [],
+            embedding_ids[:count] if embedding_ids is not None else None,
+            version=meta["generation"],
+        )
+        self.version = meta["generation"]
+
+    # ---- inisialisasi ----
+
+    def attach(self, fingerprint):
+        """Memakai snapshot yang sudah ada jika fingerprint database-nya sama (tanpa membaca BLOB)"""
+        with self._locked():
+            meta = self._read_meta()
+            self._seen_generation = meta["generation"] if meta else None
+            if meta is None or meta.get("fingerprint") != list(fingerprint):
+                return False
+            self._attach_meta(meta)
+            self.loaded = True
+            return True
+
+    def load(self, stored_embeddings, fingerprint=None):
+        """Membangun ulang snapshot bersama dari list dict {'id', 'user_id', 'embedding'}"""
+        items = list(stored_embeddings)
+        matrix = np.stack([
+            np.asarray(item['embedding'], dtype=np.float32).ravel() for item in items
+        ]) if items else None
+        return self.load_matrix(
+            [item.get('id', -1) for item in items],
+            [item['user_id'] for item in items],
+            matrix,
+            fingerprint
+        )
+
+    def load_matrix(self, embedding_ids, user_ids, matrix, fingerprint=None):
+        """
+        Membangun ulang snapshot bersama dari isi database. Mengembalikan False
+        (tanpa menulis) jika worker lain menerbitkan perubahan sejak attach(),
+        karena baris yang dibaca mungkin sudah tertinggal; pemanggil mengulang.
+        """
+        with self._locked():
+            meta = self._read_meta()
+            if (meta["generation"] if meta else None) != self._seen_generation:
+                return False
+            if matrix is not None and len(matrix) > 0:
+                matrix = normalize_rows(matrix)
+            else:
+                matrix = None
+            self._publish_new_file(
+                meta, matrix,
+                np.asarray(user_ids, dtype=np.int64),
+                np.asarray(embedding_ids, dtype=np.int64),
+                fingerprint
+            )
+        self.loaded = True
+        self._refresh()
+        return True
+
+    # ---- penulis ----
+
+    def add(self, embedding_id, user_id, embedding):
+        self.add_many([embedding_id], user_id, [embedding])
+
+    def add_many(self, embedding_ids, user_id, embeddings):
+        """Menambahkan embedding milik satu user dengan satu penulisan CURRENT"""
+        if not len(embedding_ids):
+            return
+        rows = normalize_rows(np.stack([np.asarray(e, dtype=np.float32).ravel() for e in embeddings]))
+        embedding_ids = np.asarray(embedding_ids, dtype=np.int64)
+        with self._locked():
+            meta = self._read_meta()
+            fingerprint = self._bump_fingerprint(meta, int(embedding_ids.max()), len(embedding_ids))
+            if meta is None or meta["dim"] == 0:
+                self._publish_new_file(meta, rows, np.full(len(rows), user_id), embedding_ids, fingerprint)
+            else:
+                if meta["dim"] != rows.shape[1]:
+                    raise ValueError(
+                        f"Dimensi embedding {rows.shape[1]} tidak cocok dengan galeri ({meta['dim']})"
+                    )
+                matrix, user_ids, existing_ids = self._map_files(meta, mode="r+")
+                count = meta["count"]
+                new = ~np.isin(embedding_ids, existing_ids[:count])
+                if not new.any():
+                    return
+                rows, embedding_ids = rows[new], embedding_ids[new]
+                fingerprint = self._bump_fingerprint(meta, int(embedding_ids.max()), len(embedding_ids))
+                end = count + len(rows)
+                if end > meta["capacity"]:
+                    self._publish_new_file(
+                        meta,
+                        np.vstack([matrix[:count], rows]),
+                        np.append(user_ids[:count], np.full(len(rows), user_id)),
+                        np.append(existing_ids[:count], embedding_ids),
+                        fingerprint,
+                    )
+                else:
+                    # Tulis di belakang baris aktif; pembaca lama tidak melihatnya
+                    matrix[count:end] = rows
+                    user_ids[count:end] = user_id
+                    existing_ids[count:end] = embedding_ids
+                    for array in (matrix, user_ids, existing_ids):
+                        array.flush()
+                    meta = dict(meta, count=end, generation=meta["generation"] + 1, fingerprint=fingerprint)
+                    self._write_meta(meta)
+        self._refresh()
+
+    def remove_embedding(self, embedding_id):
+        self._remove(lambda user_ids, embedding_ids: embedding_ids != embedding_id)
+
+    def remove_user(self, user_id):
+        self._remove(lambda user_ids, embedding_ids: user_ids != user_id)
+
+    def _remove(self, keep_mask):
+        with self._locked():
+            meta = self._read_meta()
+            if meta is None or meta["count"] == 0:
+                return
+            matrix, user_ids, embedding_ids = self._map_files(meta, mode="r")
+            count = meta["count"]
+            keep = keep_mask(user_ids[:count], embedding_ids[:count])
+            if keep.all():
+                return
+            removed = int(count - keep.sum())
+            self._publish_new_file(
+                meta,
+                np.asarray(matrix[:count][keep]),
+                np.asarray(user_ids[:count][keep]),
+                np.asarray(embedding_ids[:count][keep]),
+                self._bump_fingerprint(meta, None, -removed),
+            )
+        self._refresh()
+
+    # ---- file ----
+
+    def _path(self, name):
+        return self.directory / name
+
+    @contextmanager
+    def _locked(self, shared=False, blocking=True):
+        """File lock antar worker; dengan blocking=False menghasilkan False jika lock sedang dipegang"""
+        if fcntl is None:
+            yield True
+            return
+        with open(self._path(_LOCK_FILE), "a+") as lock_file:
+            operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(lock_file, operation if blocking else operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        try:
+            with open(self._path(_CURRENT_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, meta):
+        tmp_path = self._path(_CURRENT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(_CURRENT_FILE))
+
+    def _data_paths(self, file_gen):
+        return (
+            self._path(f"matrix-{file_gen}.f32"),
+            self._path(f"user_ids-{file_gen}.i64"),
+            self._path(f"embedding_ids-{file_gen}.i64"),
+        )
+
+    def _map_files(self, meta, mode):
+        if meta["capacity"] == 0 or meta["dim"] == 0:
+            return None, None, None
+        matrix_path, user_ids_path, embedding_ids_path = self._data_paths(meta["file"])
+        return (
+            np.memmap(matrix_path, dtype=np.float32, mode=mode, shape=(meta["capacity"], meta["dim"])),
+            np.memmap(user_ids_path, dtype=np.int64, mode=mode, shape=(meta["capacity"],)),
+            np.memmap(embedding_ids_path, dtype=np.int64, mode=mode, shape=(meta["capacity"],)),
+        )
+
+    def _publish_new_file(self, meta, matrix, user_ids, embedding_ids, fingerprint):
+        count = len(user_ids)
+        dim = matrix.shape[1] if matrix is not None and count else 0
+        capacity = max(_MIN_CAPACITY, count * 2) if dim else 0
+        file_gen = (meta["file"] + 1) if meta else 1
+        generation = (meta["generation"] + 1) if meta else 1
+
+        if dim:
+            paths = self._data_paths(file_gen)
+            arrays = (
+                np.memmap(paths[0], dtype=np.float32, mode="w+", shape=(capacity, dim)),
+                np.memmap(paths[1], dtype=np.int64, mode="w+", shape=(capacity,)),
+                np.memmap(paths[2], dtype=np.int64, mode="w+", shape=(capacity,)),
+            )
+            for target, source in zip(arrays, (matrix, user_ids, embedding_ids)):
+                target[:count] = source
+                target.flush()
+
+        # File data lama dihapus sampai file_gen - 2 (generation sebelumnya tetap disimpan
+        # untuk pembaca yang sedang memetakannya; di Linux file yang sudah di-unlink tetap
+        # valid selama di-mmap). Batas yang sudah dihapus dicatat agar tidak di-stat ulang.
+        deleted_through = meta.get("deleted_through", 0) if meta else 0
+        self._write_meta({
+            "generation": generation,
+            "file": file_gen,
+            "count": count,
+            "capacity": capacity,
+            "dim": dim,
+            "fingerprint": list(fingerprint) if fingerprint is not None else None,
+            "deleted_through": max(deleted_through, file_gen - 2),
+        })
+
+        for old_gen in range(deleted_through + 1, file_gen - 1):
+            for path in self._data_paths(old_gen):
+                path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _bump_fingerprint(meta, embedding_id, delta):
+        # Fingerprint: (jumlah baris, id maksimum, dimensi) tabel face_embeddings
+        if not meta or not meta.get("fingerprint"):
+            return None
+        count, max_id, dim = meta["fingerprint"]
+        if embedding_id is not None:
+            max_id = max(max_id or 0, embedding_id)
+        return [count + delta, max_id, dim]
+
+
+def invalidate_shared_gallery(directory=None):
+    """
+    Membuang penanda snapshot bersama setelah isi embedding ditulis ulang di luar
+    server (migrasi descriptor, fit PCA) sehingga startup berikutnya membangun ulang
+    """
+    current = Path(directory or GALLERY_SNAPSHOT_DIR) / _CURRENT_FILE
+    if current.exists():
+        current.unlink()
+
+
+async def load_gallery(gallery, embedder):
+    """
+    Mengisi galeri (GalleryCache atau SharedGallery) dari database: memakai snapshot
+    bersama yang sudah ada jika fingerprint-nya sama, jika tidak membaca semua
+    embedding yang kompatibel dengan embedder ke satu matriks
+    """
+    from app.database.db import get_embedding_matrix, get_embeddings_fingerprint
+    from app.database.embedding_format import DESCRIPTOR_UNKNOWN
+
+    dim = embedder.dim
+    while True:
+        fingerprint = (*await get_embeddings_fingerprint(), dim)
+        # Worker lain mungkin sudah menerbitkan snapshot untuk isi database yang sama.
+        # attach/load_matrix menunggu file lock dan menulis file, jadi dijalankan di thread
+        if await asyncio.to_thread(gallery.attach, fingerprint):
+            return
+        # Lewati embedding dengan dimensi atau descriptor lain yang belum dimigrasi
+        embedding_ids, user_ids, matrix, descriptors = await get_embedding_matrix(dim)
+        compatible = np.isin(descriptors, (embedder.descriptor_version, DESCRIPTOR_UNKNOWN))
+        if await asyncio.to_thread(
+            gallery.load_matrix,
+            embedding_ids[compatible], user_ids[compatible], matrix[compatible], fingerprint
+        ):
+            return
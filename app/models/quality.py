@@ -0,0 +1,101 @@
+import os
+
+import cv2
+import numpy as np
+
+# Gerbang kualitas sebelum embedding: crop yang buram, kecil, gelap/silau atau
+# terpotong ditolak tanpa menghabiskan embedding dan pencocokan
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "1") == "1"
+# Sisi terpendek kotak wajah (piksel frame asli)
+QUALITY_MIN_FACE_SIZE = int(os.environ.get("QUALITY_MIN_FACE_SIZE", 48))
+# Varians Laplacian crop 160x160 grayscale; di bawah ini dianggap buram
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", 20.0))
+# Rata-rata kecerahan crop (0-255) dan porsi piksel yang terpotong hitam/putih
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("QUALITY_MIN_BRIGHTNESS", 40.0))
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("QUALITY_MAX_BRIGHTNESS", 220.0))
+QUALITY_MAX_CLIPPED = float(os.environ.get("QUALITY_MAX_CLIPPED", 0.4))
+# Asimetri gradien kiri-kanan crop (0 = simetris, 1 = tidak ada kemiripan). Wajah yang
+# menoleh memindahkan mata, hidung dan mulut ke satu sisi; 0 menonaktifkan cek ini.
+# Kotak detektor cascade selalu persegi, jadi rasio sisi kotak tidak bisa dipakai.
+QUALITY_MAX_ASYMMETRY = float(os.environ.get("QUALITY_MAX_ASYMMETRY", 0.3))
+# Crop diperkecil ke ukuran ini (setelah membuang tepi latar belakang) sebelum dibandingkan
+_ASYMMETRY_SIZE = 32
+_ASYMMETRY_MARGIN = 0.1
+
+QUALITY_MESSAGES = {
+    "small": "Wajah terlalu kecil, silakan mendekat ke kamera",
+    "blur": "Gambar buram, tahan posisi sebentar",
+    "dark": "Pencahayaan terlalu gelap",
+    "bright": "Pencahayaan terlalu terang",
+    "pose": "Hadapkan wajah lurus ke kamera",
+    "cut_off": "Wajah terpotong di tepi kamera",
+}
+
+
+# Fungsi untuk mengukur asimetri kiri-kanan wajah dari magnitudo gradien: pencahayaan
+# dari samping hanya menggeser kecerahan, sedangkan fitur wajah yang bergeser mengubah tepi
+def face_asymmetry(gray):
+    height, width = gray.shape[:2]
+    margin_y, margin_x = int(height * _ASYMMETRY_MARGIN), int(width * _ASYMMETRY_MARGIN)
+    small = cv2.resize(
+        gray[margin_y:height - margin_y, margin_x:width - margin_x],
+        (_ASYMMETRY_SIZE, _ASYMMETRY_SIZE), interpolation=cv2.INTER_AREA
+    ).astype(np.float32)
+    magnitude = np.hypot(cv2.Sobel(small, cv2.CV_32F, 1, 0), cv2.Sobel(small, cv2.CV_32F, 0, 1))
+    half = _ASYMMETRY_SIZE // 2
+    left, right = magnitude[:, :half], magnitude[:, half:][:, ::-1]
+    total = float((left + right).sum())
+    return float(np.abs(left - right).sum()) / total if total else 0.0
+
+
+# Fungsi untuk menilai satu crop wajah; mengembalikan alasan penolakan atau None.
+# box None berarti ukuran wajah asli tidak diketahui (crop dari klien): cek "small" dilewati.
+# frame_shape diberikan jika kotak berasal dari detektor server (cek wajah terpotong).
+def assess_face(face_img, box=None, frame_shape=None):
+    if box is not None:
+        x1, y1, x2, y2 = box
+        if min(x2 - x1, y2 - y1) < QUALITY_MIN_FACE_SIZE:
+            return "small"
+        if frame_shape is not None:
+            frame_height, frame_width = frame_shape[:2]
+            if x1 <= 0 or y1 <= 0 or x2 >= frame_width or y2 >= frame_height:
+                return "cut_off"
+
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if face_img.ndim == 3 else face_img
+    brightness = float(gray.mean())
+    if brightness < QUALITY_MIN_BRIGHTNESS:
+        return "dark"
+    if brightness > QUALITY_MAX_BRIGHTNESS:
+        return "bright"
+    clipped = np.count_nonzero((gray <= 10) | (gray >= 245)) / gray.size
+    if clipped > QUALITY_MAX_CLIPPED:
+        return "dark" if brightness < 128 else "bright"
+
+    if cv2.Laplacian(gray, cv2.CV_32F).var() < QUALITY_MIN_SHARPNESS:
+        return "blur"
+    if QUALITY_MAX_ASYMMETRY and face_asymmetry(gray) > QUALITY_MAX_ASYMMETRY:
+        return "pose"
+    return None
+
+
+class QualityStats:
+    """Penghitung hasil gerbang kualitas per alasan (dicatat di proses server)"""
+
+    def __init__(self):
+        self.checked = 0
+        self.rejected = {reason: 0 for reason in QUALITY_MESSAGES}
+
+    def record(self, reason):
+        self.checked += 1
+        if reason is not None:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def stats(self):
+        rejected = sum(self.rejected.values())
+        return {
+            "enabled": QUALITY_GATE,
+            "checked": self.checked,
+            "passed": self.checked - rejected,
+            "rejected": self.rejected,
+            "reject_ratio": rejected / self.checked if self.checked else 0.0,
+        }
@@ -0,0 +1,117 @@
+import os
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Identitas dari frame sebelumnya dipakai ulang selama wajah tetap di posisi yang
+# sama (IoU kotak) dan tampilannya mirip (jarak Hamming dHash 64 bit)
+TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", 0.5))
+TRACK_HASH_MAX_DISTANCE = int(os.environ.get("TRACK_HASH_MAX_DISTANCE", 10))
+# Setelah sekian frame dipakai ulang, wajah diverifikasi lagi dengan embedding
+# (0 = tracking nonaktif, setiap frame di-embed)
+TRACK_REVERIFY_EVERY = int(os.environ.get("TRACK_REVERIFY_EVERY", 10))
+TRACK_TTL_SECONDS = float(os.environ.get("TRACK_TTL_SECONDS", 2.0))
+TRACK_MAX_SESSIONS = 1024
+
+
+# Fungsi untuk menghitung dHash crop wajah: gradien horizontal grayscale 9x8 -> 64 bit
+def face_hash(face_img):
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY) if face_img.ndim == 3 else face_img
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+def hash_distance(a, b):
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+def box_iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+class FaceTrack:
+    """Track wajah satu sesi: kotak terakhir, hash saat verifikasi dan identitasnya"""
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.signature = None
+        self.match = None
+        self.reused = 0
+        self.seen_at = 0.0
+
+    def reuse(self, box, face_img):
+        """Identitas sebelumnya (Match) jika track masih stabil, selain itu None"""
+        if self.match is None or time.monotonic() - self.seen_at > TRACK_TTL_SECONDS:
+            return None
+        if self.reused >= TRACK_REVERIFY_EVERY:
+            return None
+        if box_iou(box, self.box) < TRACK_IOU_THRESHOLD:
+            return None
+        # Hash dibandingkan dengan frame terakhir yang diverifikasi agar perubahan tidak menumpuk
+        if hash_distance(face_hash(face_img), self.signature) > TRACK_HASH_MAX_DISTANCE:
+            return None
+
+        self.box = box
+        self.reused += 1
+        self.seen_at = time.monotonic()
+        if self.tracker is not None:
+            self.tracker.reused += 1
+        return self.match
+
+    def update(self, box, face_img, match):
+        """Mencatat hasil embedding + pencocokan; wajah tak dikenal tidak di-track"""
+        if self.tracker is not None:
+            self.tracker.verified += 1
+        if match is None:
+            self.reset()
+            return
+        self.box = box
+        self.signature = face_hash(face_img)
+        self.match = match
+        self.reused = 0
+        self.seen_at = time.monotonic()
+
+
+class IdentityTracker:
+    """FaceTrack per session_id klien (yang paling lama dibuang setelah TRACK_MAX_SESSIONS)"""
+
+    def __init__(self, max_sessions=TRACK_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._tracks = OrderedDict()
+        self.reused = 0
+        self.verified = 0
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        track = self._tracks.get(session_id)
+        if track is None:
+            track = self._tracks[session_id] = FaceTrack(self)
+            while len(self._tracks) > self.max_sessions:
+                self._tracks.popitem(last=False)
+        self._tracks.move_to_end(session_id)
+        return track
+
+    def create(self):
+        """Track tanpa session_id (mis. satu koneksi WebSocket) yang ikut dihitung di metrik"""
+        return FaceTrack(self)
+
+    def stats(self):
+        total = self.reused + self.verified
+        return {
+            "sessions": len(self._tracks),
+            "reverify_every": TRACK_REVERIFY_EVERY,
+            "reused": self.reused,
+            "verified": self.verified,
+            "reuse_ratio": self.reused / total if total else 0.0,
+        }
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+import app.database.db as db
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Path database SQLite sementara yang dipakai app.database.db"""
+    path = tmp_path / "face_attendance.db"
+    monkeypatch.setattr(db, "DATABASE_PATH", path)
+    return path
+
+
+@pytest.fixture
+def run_db(database):
+    """Menjalankan coroutine dengan pool koneksi terbuka pada database yang sudah diinisialisasi"""
+
+    def run(scenario):
+        async def main():
+            await db.init_pool()
+            try:
+                await db.init_db()
+                return await scenario()
+            finally:
+                await db.close_pool()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,187 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.models import ann_index
+from app.models.ann_index import CentroidIndex, IVFIndex, synthetic_gallery
+from app.models.gallery import GalleryCache, GalleryMatcher, normalize_rows
+
+
+@pytest.fixture
+def synthetic():
+    centers, matrix, user_ids = synthetic_gallery(3000, 32, noise=0.5)
+    rng = np.random.default_rng(1)
+    query_users = rng.integers(0, len(centers), 100)
+    probes = normalize_rows(centers[query_users] + 0.5 * rng.standard_normal((100, 32)).astype(np.float32) / np.sqrt(32))
+    return matrix, user_ids, probes
+
+
+def _trained(matrix, user_ids, nlist=32):
+    snapshot = GalleryMatcher(matrix, user_ids, np.arange(len(matrix)))
+    index = IVFIndex(nlist=nlist, nprobe=8, path=None)
+    index.train(matrix)
+    index.sync(snapshot)
+    return snapshot, index
+
+
+def test_ivf_recall_against_exact_search(synthetic):
+    matrix, user_ids, probes = synthetic
+    exact, index = _trained(matrix, user_ids)
+    truth = [exact.search(probe)[0][0] for probe in probes]
+
+    found = [index.search(probe)[0][0] for probe in probes]
+    assert np.mean(np.equal(found, truth)) >= 0.9
+
+    # Memeriksa semua list = scan penuh
+    found = [index.search_batch([probe], nprobe=32)[0][0][0] for probe in probes]
+    assert found == truth
+
+
+def test_sync_applies_gallery_changes(synthetic):
+    matrix, user_ids, probes = synthetic
+    cache = GalleryCache()
+    cache.load_matrix(np.arange(len(matrix)), user_ids, matrix)
+    index = IVFIndex(nlist=32, nprobe=32, path=None)
+    index.train(matrix)
+    assert index.for_snapshot(cache.snapshot()) is index
+    assert len(index) == len(matrix)
+
+    target = int(index.search(probes[0])[0][0])
+    cache.remove_user(target)
+    cache.add_many([10_000], 999, [probes[0]])
+    index.for_snapshot(cache.snapshot())
+
+    assert len(index) == len(cache.snapshot())
+    best = index.search(probes[0], k=3)
+    assert best[0] == (999, pytest.approx(0.0, abs=1e-5))
+    assert target not in [user_id for user_id, _ in best]
+
+
+def test_older_snapshot_does_not_roll_back_index(synthetic):
+    matrix, user_ids, _ = synthetic
+    cache = GalleryCache()
+    cache.load_matrix(np.arange(len(matrix)), user_ids, matrix)
+    index = IVFIndex(nlist=32, path=None)
+    index.train(matrix)
+
+    old = cache.snapshot()
+    cache.remove_embedding(0)
+    index.sync(cache.snapshot())
+    index.sync(old)
+    assert len(index) == len(matrix) - 1
+
+
+def test_saved_assignments_skip_reassignment(synthetic, tmp_path, monkeypatch):
+    matrix, user_ids, probes = synthetic
+    path = tmp_path / "ann_index.npz"
+    snapshot, index = _trained(matrix, user_ids)
+    index.save(path)
+
+    assigned_rows = []
+    original = ann_index.assign_to_centroids
+
+    def counting(rows, centroids):
+        assigned_rows.append(len(rows))
+        return original(rows, centroids)
+
+    monkeypatch.setattr(ann_index, "assign_to_centroids", counting)
+    grown = GalleryMatcher(
+        np.vstack([matrix, probes[:5]]),
+        np.concatenate([user_ids, np.full(5, 999)]),
+        np.arange(len(matrix) + 5),
+        version=1,
+    )
+    loaded = IVFIndex(nlist=32, nprobe=8, path=path)
+    loaded.prepare(grown)
+
+    # Hanya lima embedding baru yang dihitung list-nya
+    assert assigned_rows == [5]
+    assert len(loaded) == len(grown)
+    for probe in probes[5:20]:
+        assert loaded.search(probe) == index.search(probe)
+
+
+def test_concurrent_sync_and_search(synthetic):
+    matrix, user_ids, probes = synthetic
+    cache = GalleryCache()
+    cache.load_matrix(np.arange(len(matrix)), user_ids, matrix)
+    index = IVFIndex(nlist=32, nprobe=32, path=None)
+    index.train(matrix)
+    index.sync(cache.snapshot())
+    errors = []
+
+    def writer():
+        for embedding_id in range(0, 600, 3):
+            cache.remove_embedding(embedding_id)
+            index.sync(cache.snapshot())
+
+    def reader():
+        try:
+            for probe in probes:
+                for user_id, distance in index.search(probe, k=5):
+                    assert 0 <= user_id < len(matrix) and -1e-5 <= distance <= 2.0
+        except AssertionError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(index) == len(cache.snapshot())
+
+
+def test_centroid_recall_and_margin(synthetic):
+    matrix, user_ids, probes = synthetic
+    exact = GalleryMatcher(matrix, user_ids, np.arange(len(matrix)))
+    index = CentroidIndex(rerank_k=5)
+    index.sync(exact)
+    assert index.stats()["users"] == len(np.unique(user_ids))
+
+    truth = [exact.search(probe)[0][0] for probe in probes]
+    found = [index.search(probe)[0][0] for probe in probes]
+    assert np.mean(np.equal(found, truth)) >= 0.95
+
+    # Jarak per user sama dengan embedding terdekat user tersebut
+    user_id, distance = index.search(probes[0])[0]
+    rows = normalize_rows(matrix[user_ids == user_id])
+    assert distance == pytest.approx(1.0 - float(np.max(rows @ probes[0])), abs=1e-5)
+
+    match = index.match(probes[0], threshold=2.0)
+    second = index.search(probes[0], k=2)[1][1]
+    assert match.margin == pytest.approx(second - match.distance, abs=1e-6)
+    index.min_margin = match.margin + 1e-3
+    assert index.match(probes[0], threshold=2.0) is None
+
+
+def test_centroid_sync_updates_only_changed_users(synthetic):
+    matrix, user_ids, probes = synthetic
+    cache = GalleryCache()
+    cache.load_matrix(np.arange(len(matrix)), user_ids, matrix)
+    index = CentroidIndex()
+    assert index.for_snapshot(cache.snapshot()) is index
+    before = {user_id: index._centroids[slot].copy() for user_id, slot in index._slots.items()}
+
+    target = int(user_ids[0])
+    cache.remove_user(target)
+    cache.add_many([10_000, 10_001], 999, probes[:2])
+    index.for_snapshot(cache.snapshot())
+
+    assert target not in index._slots
+    assert len(index) == len(cache.snapshot())
+    assert index.search(probes[0])[0][0] == 999
+    expected = normalize_rows(normalize_rows(probes[:2]).mean(axis=0))
+    np.testing.assert_allclose(index._centroids[index._slots[999]], expected, rtol=1e-5)
+
+    # Centroid user lain tidak berubah, meskipun slotnya dipindah agar matriks tetap rapat
+    for user_id, centroid in before.items():
+        if user_id != target:
+            np.testing.assert_array_equal(index._centroids[index._slots[user_id]], centroid)
+
+    cache.remove_user(999)
+    index.for_snapshot(cache.snapshot())
+    assert 999 not in index._slots
+    assert len(index) == len(cache.snapshot())
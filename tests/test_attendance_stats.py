@@ -0,0 +1,47 @@
+import sqlite3
+
+import numpy as np
+
+import app.database.db as db
+
+
+# Statistik acuan dihitung langsung dari tabel attendance
+def _recount(database, since_day):
+    conn = sqlite3.connect(database)
+    total = conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+    by_day = dict(conn.execute(
+        "SELECT date(timestamp), COUNT(*) FROM attendance WHERE date(timestamp) >= ? "
+        "GROUP BY date(timestamp)", (since_day,)
+    ).fetchall())
+    conn.close()
+    return total, {day: count for day, count in by_day.items()}
+
+
+def test_rollup_follows_inserts_ignores_and_deletes(database, run_db):
+    async def scenario():
+        ani = await db.add_user("Ani", "X TKJ A")
+        budi = await db.add_user("Budi", "X TKJ B")
+        await db.add_face_embeddings(ani, [np.ones(8, dtype=np.float32)])
+        await db.record_attendance_batch([
+            (ani, "2024-01-01 07:00:00", 1),
+            (budi, "2024-01-01 07:05:00", 1),
+            (ani, "2024-01-02 07:00:00", 2),
+            # Duplikat per sesi diabaikan oleh INSERT OR IGNORE dan tidak ikut dihitung
+            (ani, "2024-01-02 07:01:00", 2),
+            (budi, "2024-01-03 07:00:00", 3),
+        ])
+        before_delete = await db.get_attendance_stats("2024-01-02")
+        await db.delete_user(budi)
+        return before_delete, await db.get_attendance_stats("2024-01-01")
+
+    before_delete, after_delete = run_db(scenario)
+
+    assert before_delete["total_users"] == 2
+    assert before_delete["users_with_face"] == 1
+    assert before_delete["total_attendance"] == 4
+    assert before_delete["attendance_by_day"] == {"2024-01-02": 1, "2024-01-03": 1}
+
+    # Menghapus user ikut mengurangi rollup lewat trigger delete
+    total, by_day = _recount(database, "2024-01-01")
+    assert after_delete["total_attendance"] == total == 2
+    assert {day: count for day, count in after_delete["attendance_by_day"].items() if count} == by_day
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import app.database.attendance_writer as attendance_writer
+import app.database.db as db
+from app.api.routes import attendance_message
+from app.database.attendance_writer import AttendanceWriter
+
+
+@pytest.fixture
+def written(monkeypatch):
+    rows = []
+
+    async def record_attendance_batch(batch):
+        rows.extend(batch)
+
+    monkeypatch.setattr(attendance_writer, "record_attendance_batch", record_attendance_batch)
+    return rows
+
+
+@pytest.fixture
+def failing(monkeypatch):
+    async def record_attendance_batch(batch):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(attendance_writer, "record_attendance_batch", record_attendance_batch)
+
+
+def test_flushes_in_batches(written):
+    async def scenario():
+        writer = AttendanceWriter(interval_ms=10, max_rows=100, cooldown_seconds=0)
+        writer.start()
+        for user_id in range(3):
+            writer.submit(user_id)
+        await asyncio.sleep(0.05)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert [row[0] for row in written] == [0, 1, 2]
+    assert writer.stats()["flushes"] == 1
+    assert writer.stats()["avg_rows_per_flush"] == 3
+
+
+def test_stop_waits_for_running_flush(monkeypatch):
+    written = []
+    started = None
+
+    async def slow_record_attendance_batch(batch):
+        started.set()
+        await asyncio.sleep(0.05)
+        written.extend(batch)
+
+    monkeypatch.setattr(attendance_writer, "record_attendance_batch", slow_record_attendance_batch)
+
+    async def scenario():
+        nonlocal started
+        started = asyncio.Event()
+        writer = AttendanceWriter(interval_ms=1, cooldown_seconds=0)
+        writer.start()
+        writer.submit(1)
+        await started.wait()
+        # Shutdown saat flush pertama masih menulis ke database
+        writer.submit(2)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+
+    assert [row[0] for row in written] == [1, 2]
+    assert writer.stats()["queue_depth"] == 0
+    assert writer.stats()["dropped_rows"] == 0
+
+
+def test_failed_flush_is_bounded(failing):
+    writer = AttendanceWriter(cooldown_seconds=300, max_retries=3, max_buffer=5)
+    for user_id in range(8):
+        writer.submit(user_id)
+
+    asyncio.run(writer.flush())
+    # Buffer dibatasi: baris tertua dibuang
+    assert writer.stats()["queue_depth"] == 5
+    assert writer.dropped_rows == 3
+
+    asyncio.run(writer.flush())
+    asyncio.run(writer.flush())
+    # Setelah max_retries flush gagal berturut-turut batch dibuang
+    assert writer.stats()["queue_depth"] == 0
+    assert writer.stats()["dropped_rows"] == 8
+    assert writer.stats()["failed_flushes"] == 3
+
+
+def test_dropped_check_in_is_not_debounced(failing):
+    writer = AttendanceWriter(cooldown_seconds=300, max_retries=1)
+    assert writer.submit(7) is True
+    asyncio.run(writer.flush())
+    assert writer.dropped_rows == 1
+
+    # Tidak ada baris kehadiran yang tersimpan, jadi user boleh check-in lagi
+    assert writer.submit(7) is True
+
+
+def test_cooldown_debounces_repeated_check_in(written):
+    writer = AttendanceWriter(cooldown_seconds=300)
+    assert writer.submit(1) is True
+    assert writer.submit(1) is False
+    assert writer.submit(2) is True
+    asyncio.run(writer.flush())
+
+    assert [row[0] for row in written] == [1, 2]
+    assert writer.stats()["debounced"] == 1
+    assert written[0][2] == written[1][2]
+
+
+def test_session_key_deduplicates_across_workers(run_db):
+    # Dua worker mencatat user yang sama dalam jendela cooldown yang sama
+    rows = [(1, "2024-01-02 07:00:00", 100), (1, "2024-01-02 07:00:03", 100), (1, "2024-01-02 07:06:00", 101)]
+
+    async def scenario():
+        await db.add_user("Ani", "X TKJ A")
+        await db.record_attendance_batch(rows[:2])
+        await db.record_attendance_batch(rows[1:])
+        return await db.get_attendance_history()
+
+    assert len(run_db(scenario)) == 2
+
+
+def test_debounced_check_in_message():
+    assert attendance_message("Ani", True) == "Halo, Ani! Kehadiran tercatat."
+    assert attendance_message("Ani", False) == "Halo, Ani! Kehadiran sudah tercatat sebelumnya."
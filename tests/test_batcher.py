@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.api.batcher import MicroBatcher
+
+
+def _recording_batcher(**kwargs):
+    batches = []
+
+    async def process_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    return MicroBatcher(process_batch, **kwargs), batches
+
+
+def test_concurrent_items_share_one_batch():
+    batcher, batches = _recording_batcher(max_batch=8, max_wait_ms=20)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(scenario()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["batch_size_counts"] == {5: 1}
+
+
+def test_full_batch_runs_without_waiting():
+    batcher, batches = _recording_batcher(max_batch=2, max_wait_ms=10000)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(5))), timeout=0.2)
+
+    # Dua batch penuh langsung dijalankan; sisa satu item menunggu timer
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
+    assert batches == [[0, 1], [2, 3]]
+
+
+def test_lone_item_runs_after_max_wait():
+    batcher, batches = _recording_batcher(max_batch=8, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.wait_for(batcher.submit(7), timeout=1)
+
+    assert asyncio.run(scenario()) == 70
+    assert batches == [[7]]
+    assert batcher.stats()["queued"] == 0
+
+
+def test_batch_error_reaches_every_caller():
+    async def process_batch(items):
+        raise RuntimeError("embedding gagal")
+
+    batcher = MicroBatcher(process_batch, max_batch=4, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.stats()["batches"] == 1
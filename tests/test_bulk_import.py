@@ -0,0 +1,73 @@
+import numpy as np
+
+import app.database.db as db
+from app.database.bulk_import import Checkpoint, _write_batch, iter_directory, iter_manifest
+
+
+def _vectors(n, dim=16, seed=0):
+    return list(np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32))
+
+
+def test_iter_directory_uses_relative_path_as_class(tmp_path):
+    for name in ("Budi", "Ani"):
+        (tmp_path / "XII TKJ A" / name).mkdir(parents=True)
+        (tmp_path / "XII TKJ A" / name / "1.jpg").write_bytes(b"")
+    (tmp_path / "XII TKJ A" / "catatan.txt").write_text("")
+    (tmp_path / "lepas.jpg").write_bytes(b"")
+
+    users = [(key, name, email, len(photos)) for key, name, email, photos in iter_directory(tmp_path)]
+    assert users == [
+        ("XII TKJ A/Ani", "Ani", "XII TKJ A/Ani", 1),
+        ("XII TKJ A/Budi", "Budi", "XII TKJ A/Budi", 1),
+    ]
+
+
+def test_iter_manifest_groups_photos_by_email(tmp_path):
+    (tmp_path / "manifest.csv").write_text(
+        "name,email,photo\nBudi,X TKJ A,a.jpg\nBudi,X TKJ A,b.jpg\nAni,X TKJ B,c.jpg\n,,d.jpg\n"
+    )
+    users = list(iter_manifest(tmp_path / "manifest.csv"))
+    assert [(key, name, [p.rsplit("/", 1)[-1] for p in photos]) for key, name, _, photos in users] == [
+        ("X TKJ A", "Budi", ["a.jpg", "b.jpg"]),
+        ("X TKJ B", "Ani", ["c.jpg"]),
+    ]
+
+
+def test_reimport_does_not_duplicate_users_or_embeddings(run_db):
+    budi, ani = _vectors(2, seed=1), _vectors(1, seed=2)
+
+    async def scenario():
+        first = await db.add_users_with_embeddings([("Budi", "X TKJ A", budi), ("Ani", "X TKJ B", ani)])
+        # Impor ulang foto yang sama, ditambah satu foto baru untuk Budi
+        second = await db.add_users_with_embeddings([("Budi", "X TKJ A", budi + _vectors(1, seed=3))])
+        async with db.connect() as conn:
+            cursor = await conn.execute("SELECT user_id, COUNT(*) FROM face_embeddings GROUP BY user_id ORDER BY user_id")
+            counts = [tuple(row) for row in await cursor.fetchall()]
+            cursor = await conn.execute("SELECT COUNT(*) FROM users")
+            users = (await cursor.fetchone())[0]
+        return first, second, counts, users
+
+    first, second, counts, users = run_db(scenario)
+    assert second == first[:1]
+    assert counts == [(first[0], 3), (first[1], 1)]
+    assert users == 2
+
+
+def test_checkpoint_retries_users_without_faces(run_db, tmp_path):
+    path = tmp_path / "impor.json"
+
+    async def scenario():
+        checkpoint = Checkpoint(path)
+        await _write_batch([
+            ("a/Budi", "Budi", "a/Budi", 2, _vectors(2)),
+            ("a/Ani", "Ani", "a/Ani", 1, []),
+        ], checkpoint, db.DESCRIPTOR_UNKNOWN)
+
+        resumed = Checkpoint(path)
+        await _write_batch([("a/Ani", "Ani", "a/Ani", 1, _vectors(1, seed=4))], resumed, db.DESCRIPTOR_UNKNOWN)
+        return Checkpoint(path)
+
+    checkpoint = run_db(scenario)
+    assert checkpoint.done == {"a/Budi", "a/Ani"}
+    assert checkpoint.no_face == set()
+    assert checkpoint.stats == {"users": 2, "photos": 3, "embeddings": 3, "no_face": 0}
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import app.database.db as db
+
+
+def test_pool_connections_use_wal(run_db):
+    async def scenario():
+        async with db.connect() as conn:
+            cursor = await conn.execute("PRAGMA journal_mode")
+            journal_mode = (await cursor.fetchone())[0]
+            cursor = await conn.execute("PRAGMA busy_timeout")
+            return journal_mode, (await cursor.fetchone())[0]
+
+    assert run_db(scenario) == ("wal", 5000)
+
+
+def _with_pool(size, scenario):
+    async def main():
+        await db.init_db()
+        pool = db.ConnectionPool(db.DATABASE_PATH, size=size)
+        await pool.open()
+        try:
+            return await scenario(pool)
+        finally:
+            await pool.close()
+
+    return asyncio.run(main())
+
+
+def test_failed_transaction_is_rolled_back_before_reuse(database):
+    async def scenario(pool):
+        with pytest.raises(RuntimeError):
+            async with pool.acquire() as conn:
+                await conn.execute("INSERT INTO users (name, email) VALUES ('Ani', 'X TKJ A')")
+                raise RuntimeError("request gagal di tengah transaksi")
+
+        # Satu-satunya koneksi dipakai lagi tanpa sisa transaksi sebelumnya
+        async with pool.acquire() as conn:
+            await conn.execute("INSERT INTO users (name, email) VALUES ('Budi', 'X TKJ B')")
+            await conn.commit()
+            cursor = await conn.execute("SELECT name FROM users")
+            return [row[0] for row in await cursor.fetchall()]
+
+    assert _with_pool(1, scenario) == ["Budi"]
+
+
+def test_pool_limits_concurrent_connections(database):
+    active = 0
+    peak = 0
+
+    async def query(pool):
+        nonlocal active, peak
+        async with pool.acquire() as conn:
+            active += 1
+            peak = max(peak, active)
+            await conn.execute("SELECT COUNT(*) FROM users")
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def scenario(pool):
+        await asyncio.gather(*(query(pool) for _ in range(6)))
+
+    _with_pool(2, scenario)
+    assert peak == 2
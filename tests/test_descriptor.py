@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.models import descriptor
+from app.models.descriptor import LEGACY_HOG_DIM, Projection, create_hog, hog_dim, legacy_to_compact
+
+
+@pytest.fixture
+def crop():
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 256, size=(128, 128), dtype=np.uint8), (5, 5), 0)
+    return image
+
+
+def test_compact_dimension():
+    assert create_hog().getDescriptorSize() == hog_dim() == 2304
+
+
+def test_legacy_vector_converts_to_compact_descriptor(crop):
+    # Descriptor lama: cv2.HOGDescriptor() default pada crop 128x128
+    legacy = cv2.HOGDescriptor().compute(crop).ravel()
+    assert legacy.shape[0] == LEGACY_HOG_DIM
+
+    np.testing.assert_allclose(legacy_to_compact(legacy), create_hog().compute(crop).ravel(), atol=1e-6)
+
+
+def test_legacy_conversion_rejects_other_shapes_and_geometry(crop, monkeypatch):
+    assert legacy_to_compact(np.zeros(100, dtype=np.float32)) is None
+
+    monkeypatch.setattr(descriptor, "HOG_CELL_SIZE", 4)
+    assert legacy_to_compact(cv2.HOGDescriptor().compute(crop).ravel()) is None
+
+
+def test_convert_stored_embedding(crop, monkeypatch):
+    monkeypatch.setattr(descriptor, "get_projection", lambda: None)
+    compact = create_hog().compute(crop).ravel()
+    legacy = cv2.HOGDescriptor().compute(crop).ravel()
+
+    assert descriptor.convert_stored_embedding(compact) is not None
+    np.testing.assert_allclose(descriptor.convert_stored_embedding(legacy), compact, atol=1e-6)
+    assert descriptor.convert_stored_embedding(np.zeros(10, dtype=np.float32)) is None
+
+
+def test_projection_fit_and_reload(tmp_path):
+    matrix = np.random.default_rng(1).normal(size=(40, 32)).astype(np.float32)
+    projection = Projection.fit(matrix, 8, whiten=True)
+    assert (projection.input_dim, projection.output_dim) == (32, 8)
+
+    projected = projection.apply(matrix)
+    # Whitening: setiap komponen bervarians satu
+    np.testing.assert_allclose(projected.std(axis=0, ddof=1), 1.0, rtol=1e-3)
+
+    path = tmp_path / "projection.npz"
+    projection.save(path)
+    np.testing.assert_allclose(Projection.load(path).apply(matrix), projected, atol=1e-5)
+    assert Projection.load(tmp_path / "missing.npz") is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.models import detectors
+from app.models.detectors import detection_recall, downscale_images, get_detector
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(detectors, "_detectors", {})
+    monkeypatch.setattr(detectors, "DETECTORS", dict(detectors.DETECTORS))
+    return detectors.DETECTORS
+
+
+def test_detector_is_loaded_lazily_and_shared(registry):
+    created = []
+
+    class Recording(detectors.CascadeDetector):
+        def __init__(self):
+            created.append(self)
+            super().__init__()
+
+    registry["haar"] = Recording
+    assert not created
+    assert get_detector("haar") is get_detector("haar")
+    assert len(created) == 1
+
+
+def test_unavailable_backend_falls_back_to_haar(registry, capsys):
+    class Missing:
+        def __init__(self):
+            raise RuntimeError("model tidak ada")
+
+    registry["onnx"] = Missing
+    detector = get_detector("onnx")
+
+    assert detector is get_detector("haar")
+    assert "kembali ke Haar" in capsys.readouterr().out
+    # Kegagalan tidak dicoba ulang di setiap request
+    assert get_detector("onnx") is detector
+
+
+def test_haar_failure_is_not_hidden(registry):
+    def broken():
+        raise RuntimeError("cascade rusak")
+
+    registry["haar"] = broken
+    with pytest.raises(RuntimeError):
+        get_detector("haar")
+
+
+def test_downscaled_benchmark_scales_label_boxes():
+    images = [("wide.jpg", np.zeros((600, 1200, 3), np.uint8)), ("small.jpg", np.zeros((100, 200, 3), np.uint8))]
+    labels = {"wide.jpg": [(400, 100, 800, 500)], "small.jpg": [(10, 10, 90, 90)]}
+
+    resized, scaled = downscale_images(images, labels, max_width=300)
+
+    assert [img.shape[:2] for _, img in resized] == [(150, 300), (100, 200)]
+    assert scaled == {"wide.jpg": [(100, 25, 200, 125)], "small.jpg": [(10, 10, 90, 90)]}
+    assert labels["wide.jpg"] == [(400, 100, 800, 500)]
+
+    # Deteksi di gambar kecil cocok dengan label yang sudah diskalakan
+    detections = {"wide.jpg": [(102, 27, 98, 98)], "small.jpg": []}
+    assert detection_recall(detections, scaled) == 0.5
+    assert detection_recall(detections, labels) == 0.0
+    assert detection_recall(detections) == 0.5
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from app.models import embedders
+from app.models.embedders import HOGEmbedder
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+
+WEIGHTS = np.arange(24, dtype=np.float32).reshape(3, 8) / 24.0
+
+
+# Model pengganti kecil: rata-rata per kanal (GlobalAveragePool) lalu proyeksi linear 3 -> 8
+def _stand_in_model(path, batch="N"):
+    graph = helper.make_graph(
+        [
+            helper.make_node("GlobalAveragePool", ["input"], ["pooled"]),
+            helper.make_node("Flatten", ["pooled"], ["flat"]),
+            helper.make_node("MatMul", ["flat", "weights"], ["embedding"]),
+        ],
+        "stand_in",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [batch, 3, 112, 112])],
+        [helper.make_tensor_value_info("embedding", TensorProto.FLOAT, [batch, 8])],
+        [numpy_helper.from_array(WEIGHTS, "weights")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+    return path
+
+
+def _faces(n):
+    return list(np.random.default_rng(0).integers(0, 256, size=(n, 150, 150, 3), dtype=np.uint8))
+
+
+def _expected(embedder, faces):
+    return embedder.preprocess(faces).mean(axis=(2, 3)) @ WEIGHTS
+
+
+@pytest.mark.parametrize("batch", ["N", 1])
+def test_onnx_embedder_batches_in_one_session(tmp_path, batch):
+    embedder = embedders.ONNXEmbedder(_stand_in_model(tmp_path / "model.onnx", batch))
+    faces = _faces(3)
+
+    assert embedder.dim == 8
+    assert embedder.fixed_batch == (None if batch == "N" else 1)
+    output = embedder.embed_batch(faces)
+    assert output.shape == (3, 8) and output.dtype == np.float32
+    np.testing.assert_allclose(output, _expected(embedder, faces), rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(embedder.embed(faces[1]), output[1], rtol=1e-5, atol=1e-6)
+    assert embedder.embed_batch([]).shape == (0, 8)
+
+
+def test_onnx_preprocess_converts_bgr_to_normalized_rgb(tmp_path):
+    embedder = embedders.ONNXEmbedder(_stand_in_model(tmp_path / "model.onnx"))
+    face = np.zeros((112, 112, 3), dtype=np.uint8)
+    face[..., 0] = 255  # biru pada BGR
+
+    batch = embedder.preprocess([face, face[..., 0]])
+    assert batch.shape == (2, 3, 112, 112)
+    assert batch[0, 2].max() == pytest.approx((255 - 127.5) / 128.0)
+    assert batch[0, 0].max() == pytest.approx(-127.5 / 128.0)
+    # Crop grayscale diperluas ke tiga kanal
+    assert np.all(batch[1, 0] == batch[1, 2])
+
+
+def test_get_embedder_falls_back_to_hog(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedders, "_embedder", None)
+    monkeypatch.setattr(embedders, "EMBEDDER_BACKEND", "onnx")
+    monkeypatch.setitem(
+        embedders.EMBEDDERS, "onnx", lambda: embedders.ONNXEmbedder(tmp_path / "missing.onnx")
+    )
+
+    assert isinstance(embedders.get_embedder(), HOGEmbedder)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.database.embedding_format import (
+    DESCRIPTOR_HOG, DESCRIPTOR_ONNX, HEADER_SIZE, decode_embedding, decode_matrix,
+    embedding_info, encode_embedding,
+)
+
+
+@pytest.fixture
+def vector():
+    return np.random.default_rng(0).normal(size=128).astype(np.float32) * 3.0
+
+
+def test_header_layout(vector):
+    blob = encode_embedding(vector, dtype="float16", descriptor=DESCRIPTOR_ONNX)
+    assert blob[:4] == b"FEMB"
+    assert len(blob) == HEADER_SIZE + 128 * 2
+    assert embedding_info(blob) == ("float16", DESCRIPTOR_ONNX, 128)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-5), ("float16", 1e-2), ("int8", 5e-2)])
+def test_round_trip(vector, dtype, tolerance):
+    blob = encode_embedding(vector, dtype=dtype, descriptor=DESCRIPTOR_HOG)
+    np.testing.assert_allclose(decode_embedding(blob), vector, atol=tolerance * np.abs(vector).max())
+
+    unit = decode_embedding(blob, normalized=True)
+    assert np.linalg.norm(unit) == pytest.approx(1.0, abs=tolerance)
+
+
+def test_unknown_dtype_rejected(vector):
+    with pytest.raises(ValueError):
+        encode_embedding(vector, dtype="float64")
+
+
+def test_legacy_blob_without_header(vector):
+    blob = vector.tobytes()
+    assert embedding_info(blob) is None
+    np.testing.assert_array_equal(decode_embedding(blob), vector)
+
+
+def test_decode_matrix_mixed_formats(vector):
+    other = vector[::-1].copy()
+    blobs = [
+        encode_embedding(vector, dtype="float32", descriptor=DESCRIPTOR_HOG),
+        other.tobytes(),
+        encode_embedding(other, dtype="int8", descriptor=DESCRIPTOR_ONNX),
+        encode_embedding(vector[:64], dtype="float32"),
+    ]
+    matrix, rows, descriptors = decode_matrix(blobs, dim=128)
+
+    # Baris dengan dimensi lain dilewati; urutan mengikuti indeks BLOB asli
+    order = np.argsort(rows)
+    assert rows[order].tolist() == [0, 1, 2]
+    assert descriptors[order].tolist() == [DESCRIPTOR_HOG, 0, DESCRIPTOR_ONNX]
+    for row, expected in zip(matrix[order], [vector, other, other]):
+        np.testing.assert_allclose(row, expected, atol=5e-2 * np.abs(expected).max())
+
+
+def test_decode_matrix_empty():
+    matrix, rows, descriptors = decode_matrix([], dim=8)
+    assert matrix.shape == (0, 8)
+    assert len(rows) == len(descriptors) == 0
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import routes
+from app.api.executor import ExecutorSaturated, InferenceExecutor
+
+
+def test_run_offloads_to_worker_thread():
+    executor = InferenceExecutor(kind="thread", workers=2, max_pending=4)
+    try:
+        thread_name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+    finally:
+        executor.shutdown()
+
+    assert thread_name.startswith("inference")
+    assert executor.stats()["completed"] == 1
+    assert executor.stats()["pending"] == 0
+
+
+def test_saturated_executor_rejects_new_work():
+    executor = InferenceExecutor(kind="thread", workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["completed"] == 2
+
+
+def test_saturation_becomes_429(monkeypatch):
+    executor = InferenceExecutor(kind="thread", workers=1, max_pending=0)
+    monkeypatch.setattr(routes, "inference_executor", executor)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(routes.run_inference(len, b"frame"))
+
+    assert error.value.status_code == 429
+    assert error.value.headers["Retry-After"] == "1"
+
+
+def test_each_executor_thread_gets_its_own_cascade():
+    from app.models.detectors import CascadeDetector
+
+    detector = CascadeDetector()
+    executor = InferenceExecutor(kind="thread", workers=3, max_pending=6)
+    barrier = threading.Barrier(3)
+
+    # Barrier memastikan ketiga pekerjaan berjalan di tiga thread berbeda
+    def cascade_id():
+        barrier.wait(timeout=5)
+        return id(detector.cascade)
+
+    async def scenario():
+        return await asyncio.gather(*(executor.run(cascade_id) for _ in range(3)))
+
+    try:
+        ids = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    assert len(set(ids)) == 3
+    assert id(detector.cascade) not in ids
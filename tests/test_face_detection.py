@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from app.models import face_recognition
+from app.models.face_recognition import FaceRoiTracker, detect_faces_fast, expand_roi
+
+
+class FakeDetector:
+    """Mengembalikan kotak tetap (koordinat area yang diberikan) dan mencatat setiap panggilan"""
+
+    def __init__(self, boxes_per_call):
+        self.boxes_per_call = list(boxes_per_call)
+        self.calls = []
+
+    def detect(self, img, min_size=30, max_size=None):
+        self.calls.append((img.shape[:2], min_size, max_size))
+        return self.boxes_per_call.pop(0) if self.boxes_per_call else []
+
+
+@pytest.fixture
+def fake_detector(monkeypatch):
+    def install(*boxes_per_call):
+        detector = FakeDetector(boxes_per_call)
+        monkeypatch.setattr(face_recognition, "get_detector", lambda: detector)
+        return detector
+    return install
+
+
+def test_expand_roi_is_clamped_to_frame():
+    assert expand_roi((100, 100, 200, 200), (720, 1280, 3), margin=0.5) == (50, 50, 250, 250)
+    assert expand_roi((10, 20, 110, 120), (130, 150, 3), margin=0.5) == (0, 0, 150, 130)
+
+
+def test_fast_mode_detects_on_downscaled_frame(fake_detector, monkeypatch):
+    monkeypatch.setattr(face_recognition, "DETECTION_MAX_WIDTH", 320)
+    detector = fake_detector([(100, 40, 60, 60)])
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    faces, boxes, used_roi = detect_faces_fast(frame)
+
+    (shape, min_size, max_size), = detector.calls
+    assert shape == (180, 320)
+    # Batas ukuran wajah dari sisi terpendek frame asli, dalam skala frame kecil
+    assert min_size == int(720 * face_recognition.DETECTION_MIN_FACE_FRACTION * 0.25)
+    assert max_size == int(720 * face_recognition.DETECTION_MAX_FACE_FRACTION * 0.25)
+    # Kotak dipetakan kembali ke resolusi asli dan crop diambil dari frame asli
+    assert boxes == [(400, 160, 640, 400)]
+    assert faces[0].shape == (160, 160, 3)
+    assert used_roi is False
+
+
+def test_fast_mode_searches_roi_first(fake_detector, monkeypatch):
+    monkeypatch.setattr(face_recognition, "DETECTION_MAX_WIDTH", 1280)
+    detector = fake_detector([(20, 30, 100, 100)])
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    _, boxes, used_roi = detect_faces_fast(frame, roi=(500, 200, 700, 400))
+
+    (shape, _, _), = detector.calls
+    assert shape == (400, 400)  # ROI = kotak sebelumnya + margin 0.5 per sisi
+    assert boxes == [(420, 130, 520, 230)]
+    assert used_roi is True
+
+
+def test_fast_mode_falls_back_to_full_frame_when_roi_is_empty(fake_detector, monkeypatch):
+    monkeypatch.setattr(face_recognition, "DETECTION_MAX_WIDTH", 320)
+    detector = fake_detector([], [(10, 10, 60, 60)])
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    _, boxes, used_roi = detect_faces_fast(frame, roi=(500, 200, 700, 400))
+
+    assert [shape for shape, _, _ in detector.calls] == [(100, 100), (180, 320)]
+    assert boxes == [(40, 40, 280, 280)]
+    assert used_roi is False
+
+
+def test_roi_tracker_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(face_recognition.time, "monotonic", lambda: now[0])
+    tracker = FaceRoiTracker(ttl=2.0, max_sessions=2)
+
+    tracker.update("a", (0, 0, 10, 10))
+    tracker.update("b", (1, 1, 11, 11))
+    assert tracker.get("a") == (0, 0, 10, 10)
+    assert tracker.get(None) is None
+
+    now[0] += 3.0
+    assert tracker.get("a") is None
+
+    tracker.update("a", (0, 0, 10, 10))
+    tracker.update("b", (1, 1, 11, 11))
+    tracker.update("c", (2, 2, 12, 12))
+    # Sesi yang paling lama diperbarui dibuang lebih dulu
+    assert tracker.get("a") is None
+    assert tracker.get("c") == (2, 2, 12, 12)
+
+    # Frame tanpa wajah menghapus ROI sesi
+    tracker.update("c", None)
+    assert tracker.get("c") is None
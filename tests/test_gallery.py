@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from app.models.gallery import GalleryCache, GalleryMatcher, Match, normalize_rows
+
+
+def _vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+# Pencocokan acuan: satu probe dibandingkan dengan setiap baris (seperti find_match lama)
+def _reference_search(matrix, user_ids, probe):
+    probe = probe / np.linalg.norm(probe)
+    distances = [1.0 - float(row @ probe / np.linalg.norm(row)) for row in matrix]
+    best = int(np.argmin(distances))
+    return user_ids[best], distances[best]
+
+
+@pytest.fixture
+def gallery():
+    matrix = _vectors(50)
+    user_ids = np.arange(50) // 5
+    return matrix, user_ids, GalleryMatcher(normalize_rows(matrix), user_ids)
+
+
+def test_match_equals_per_row_loop(gallery):
+    matrix, user_ids, matcher = gallery
+    for probe in _vectors(10, seed=1):
+        user_id, distance = _reference_search(matrix, user_ids, probe)
+        result = matcher.search(probe, k=1)[0]
+        assert result[0] == user_id
+        assert result[1] == pytest.approx(distance, abs=1e-5)
+
+
+def test_search_returns_sorted_top_k(gallery):
+    _, _, matcher = gallery
+    results = matcher.search(_vectors(1, seed=2)[0], k=5)
+    distances = [distance for _, distance in results]
+    assert len(results) == 5
+    assert distances == sorted(distances)
+
+
+def test_search_batch_matches_single_search(gallery):
+    _, _, matcher = gallery
+    probes = _vectors(7, seed=3)
+    for batch_result, probe in zip(matcher.search_batch(probes, k=3), probes):
+        single = matcher.search(probe, k=3)
+        assert [user_id for user_id, _ in batch_result] == [user_id for user_id, _ in single]
+        assert [d for _, d in batch_result] == pytest.approx([d for _, d in single], abs=1e-5)
+
+
+def test_match_threshold(gallery):
+    matrix, user_ids, matcher = gallery
+    assert matcher.match(matrix[12] * 4.0) == Match(int(user_ids[12]), pytest.approx(0.0, abs=1e-5))
+    assert matcher.match(_vectors(1, seed=4)[0], threshold=0.01) is None
+    assert matcher.match_batch([matrix[0], _vectors(1, seed=4)[0]], threshold=0.01) == [
+        Match(0, pytest.approx(0.0, abs=1e-5)), None
+    ]
+
+
+def test_empty_gallery():
+    matcher = GalleryMatcher(np.empty((0, 0), dtype=np.float32), [])
+    assert matcher.search(_vectors(1)[0]) == []
+    assert matcher.match(_vectors(1)[0]) is None
+    assert matcher.search_batch(_vectors(2)) == [[], []]
+
+
+def test_cache_snapshots_are_immutable():
+    cache = GalleryCache(initial_capacity=2)
+    vectors = _vectors(6)
+    cache.load_matrix([1, 2], [10, 10], vectors[:2])
+    before = cache.snapshot()
+
+    cache.add_many([3, 4, 5], 20, vectors[2:5])
+    cache.remove_user(10)
+    after = cache.snapshot()
+
+    # Snapshot lama tidak ikut berubah walaupun buffer tumbuh dan dipadatkan
+    assert before.embedding_ids.tolist() == [1, 2]
+    np.testing.assert_allclose(before.matrix, normalize_rows(vectors[:2]))
+    assert after.embedding_ids.tolist() == [3, 4, 5]
+    assert after.user_ids.tolist() == [20, 20, 20]
+    assert after.version > before.version
+
+
+def test_cache_replays_changes_made_while_loading():
+    cache = GalleryCache()
+    vectors = _vectors(4)
+
+    # Perubahan yang tiba sebelum load selesai diputar ulang setelah isi awal dimuat
+    cache.add(3, 30, vectors[2])
+    cache.add(2, 20, vectors[1])
+    cache.remove_embedding(1)
+    assert not cache.loaded
+    assert len(cache.snapshot()) == 0
+
+    cache.load_matrix([1, 2], [10, 20], vectors[:2])
+    snapshot = cache.snapshot()
+    # id 2 sudah ada dari database sehingga tidak digandakan; id 1 dihapus
+    assert sorted(snapshot.embedding_ids.tolist()) == [2, 3]
+    assert cache.loaded
+
+
+def test_cache_rejects_mismatched_dimension():
+    cache = GalleryCache()
+    cache.load_matrix([1], [10], _vectors(1, dim=16))
+    with pytest.raises(ValueError):
+        cache.add(2, 10, _vectors(1, dim=8)[0])
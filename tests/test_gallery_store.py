@@ -0,0 +1,117 @@
+import asyncio
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.models import gallery_store
+from app.models.gallery import normalize_rows
+from app.models.gallery_store import SharedGallery
+
+fcntl = pytest.importorskip("fcntl")
+
+
+def _vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+# Dijalankan di proses lain (worker uvicorn kedua): menambah lalu menghapus embedding
+def _other_worker(directory):
+    gallery = SharedGallery(directory)
+    gallery.add_many([10, 11], 7, _vectors(2, seed=1))
+    gallery.remove_user(1)
+
+
+def test_publish_is_visible_to_other_processes(tmp_path):
+    gallery = SharedGallery(tmp_path)
+    gallery.attach((3, 3, 8))
+    assert gallery.load_matrix([1, 2, 3], [1, 1, 2], _vectors(3), fingerprint=(3, 3, 8))
+    assert len(gallery.snapshot()) == 3
+
+    process = multiprocessing.get_context("spawn").Process(target=_other_worker, args=(str(tmp_path),))
+    process.start()
+    process.join(timeout=60)
+    assert process.exitcode == 0
+
+    snapshot = gallery.snapshot()
+    assert snapshot.embedding_ids.tolist() == [3, 10, 11]
+    assert snapshot.user_ids.tolist() == [2, 7, 7]
+    np.testing.assert_allclose(snapshot.matrix[1:], normalize_rows(_vectors(2, seed=1)), rtol=1e-6)
+
+    # Worker baru memakai snapshot yang sama tanpa membaca database
+    fresh = SharedGallery(tmp_path)
+    assert fresh.attach((3, 11, 8))
+    assert fresh.snapshot().embedding_ids.tolist() == [3, 10, 11]
+
+
+def test_snapshot_does_not_wait_for_writer_lock(tmp_path):
+    reader = SharedGallery(tmp_path)
+    writer = SharedGallery(tmp_path)
+    writer.add_many([1], 1, _vectors(1))
+    assert len(reader.snapshot()) == 1
+
+    writer.add_many([2], 2, _vectors(1, seed=2))
+    with open(tmp_path / "LOCK", "a+") as lock_file:
+        # Worker lain sedang menulis (memegang lock eksklusif)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        start = time.perf_counter()
+        stale = reader.snapshot()
+        elapsed = time.perf_counter() - start
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    assert elapsed < 0.5
+    assert stale.embedding_ids.tolist() == [1]
+    # Setelah lock dilepas generation baru langsung dipetakan
+    assert reader.snapshot().embedding_ids.tolist() == [1, 2]
+
+
+def test_old_generations_are_removed_but_mapped_snapshots_stay_valid(tmp_path):
+    gallery = SharedGallery(tmp_path)
+    gallery.add_many(list(range(100)), 1, _vectors(100))
+    first = gallery.snapshot()
+    expected = np.array(first.matrix)
+
+    for user_id in range(2, 7):
+        gallery.add_many([1000 + user_id], user_id, _vectors(1, seed=user_id))
+        gallery.remove_user(user_id)
+
+    data_files = sorted(name for name in os.listdir(tmp_path) if name.startswith("matrix-"))
+    assert len(data_files) == 2
+    assert gallery.snapshot().embedding_ids.tolist() == list(range(100))
+    # File generation pertama sudah di-unlink, tetapi snapshot lama tetap terbaca
+    np.testing.assert_array_equal(first.matrix, expected)
+
+
+def test_load_gallery_runs_file_work_in_a_thread(tmp_path, monkeypatch):
+    import threading
+
+    import app.database.db as db
+
+    threads = []
+    gallery = SharedGallery(tmp_path)
+    original_attach = gallery.attach
+
+    def attach(fingerprint):
+        threads.append(threading.current_thread())
+        return original_attach(fingerprint)
+
+    async def fingerprint():
+        return 0, None
+
+    async def embedding_matrix(dim):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty((0, dim), dtype=np.float32), empty
+
+    class Embedder:
+        dim = 8
+        descriptor_version = 0
+
+    monkeypatch.setattr(gallery, "attach", attach)
+    monkeypatch.setattr(db, "get_embeddings_fingerprint", fingerprint)
+    monkeypatch.setattr(db, "get_embedding_matrix", embedding_matrix)
+    asyncio.run(gallery_store.load_gallery(gallery, Embedder()))
+
+    assert gallery.loaded
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import app.database.db as db
+
+
+@pytest.fixture
+def users(run_db):
+    def lookup(*queries):
+        async def scenario():
+            # Kolom email menyimpan kelas dan unik; kelas yang sama setelah normalisasi
+            # (huruf besar/kecil, spasi) tetap bisa berisi beberapa user
+            await db.add_user("Budi Santoso", "X TKJ A")
+            await db.add_user("Budi", "x tkj a")
+            await db.add_user("Budi Santoso Putra", "X TKJ B")
+            await db.add_user("Ani", "x tkj b")
+            results = []
+            for name, kelas in queries:
+                user = await db.find_user_by_login(name, kelas)
+                results.append(user and (user["name"], user["email"]))
+            return results
+
+        return run_db(scenario)
+
+    return lookup
+
+
+def test_exact_match_ignores_case_and_spacing(users):
+    assert users(("  budi   SANTOSO ", "x  tkj a")) == [("Budi Santoso", "X TKJ A")]
+
+
+def test_stored_name_starting_with_input(users):
+    assert users(("budi santoso", "X TKJ B"), ("an", "X TKJ B")) == [
+        ("Budi Santoso Putra", "X TKJ B"), ("Ani", "x tkj b")
+    ]
+
+
+def test_input_starting_with_stored_name_prefers_longest(users):
+    assert users(("Budi Santoso Wijaya", "X TKJ A"), ("Budiman", "X TKJ A")) == [
+        ("Budi Santoso", "X TKJ A"), ("Budi", "x tkj a")
+    ]
+
+
+def test_no_match_in_other_class(users):
+    assert users(("Ani", "X TKJ A"), ("Citra", "X TKJ B")) == [None, None]
+
+
+def test_prefix_lookup_uses_login_key_index(database, run_db):
+    statements = []
+
+    async def scenario():
+        await db.add_user("Budi", "X TKJ A")
+        for conn in db._pool._connections:
+            await conn.set_trace_callback(statements.append)
+        return await db.find_user_by_login("Budi Santoso", "X TKJ A")
+
+    assert run_db(scenario)["name"] == "Budi"
+    prefix_query = next(sql for sql in statements if "login_key IN" in sql)
+    conn = sqlite3.connect(database)
+    plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {prefix_query}"))
+    conn.close()
+    assert "USING INDEX idx_users_login_key" in plan
+    assert "SCAN users" not in plan
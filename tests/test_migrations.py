@@ -0,0 +1,97 @@
+import asyncio
+import sqlite3
+
+import aiosqlite
+import numpy as np
+import pytest
+
+import app.database.db as db
+import app.database.migrations as migrations
+from app.database.embedding_format import DESCRIPTOR_HOG_LEGACY, embedding_info
+from app.database.migrations import MIGRATIONS
+from app.models.descriptor import LEGACY_HOG_DIM
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# Database versi 0 (skema dasar tanpa migrasi) berisi data lama
+async def _create_v0_database(path):
+    async with aiosqlite.connect(path) as conn:
+        await db.create_tables(conn)
+        await conn.execute("INSERT INTO users (name, email) VALUES ('Ani', 'X TKJ A')")
+        await conn.execute("INSERT INTO users (name, email) VALUES ('ani', 'x tkj a ')")
+        await conn.execute(
+            "INSERT INTO face_embeddings (user_id, embedding) VALUES (1, ?)",
+            (np.ones(LEGACY_HOG_DIM, dtype=np.float32).tobytes(),)
+        )
+        await conn.execute(
+            "INSERT INTO attendance (user_id, timestamp) VALUES (1, '2024-01-02 07:00:00')"
+        )
+        await conn.commit()
+
+
+def test_migrates_existing_database(database):
+    asyncio.run(_create_v0_database(database))
+
+    applied = asyncio.run(db.init_db())
+    assert applied == [version for version, _, _ in MIGRATIONS]
+
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == LATEST_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+    assert conn.execute("SELECT day, count FROM attendance_daily").fetchall() == [("2024-01-02", 1)]
+    # Hanya user pertama yang mendapat kunci login jika bertabrakan setelah normalisasi
+    login_keys = [row[0] for row in conn.execute("SELECT login_key FROM users ORDER BY id")]
+    assert login_keys[0] is not None and login_keys[1] is None
+    blob = conn.execute("SELECT embedding FROM face_embeddings").fetchone()[0]
+    assert embedding_info(blob) == ("float32", DESCRIPTOR_HOG_LEGACY, LEGACY_HOG_DIM)
+    conn.close()
+
+    # Startup berikutnya tidak menerapkan apa pun
+    assert asyncio.run(db.init_db()) == []
+
+
+def test_concurrent_startup_applies_each_migration_once(database, monkeypatch):
+    workers = 4
+    barrier = asyncio.Barrier(workers)
+    read_version = migrations.get_schema_version
+
+    # Semua worker membaca versi skema sebelum ada yang mulai bermigrasi
+    async def racing_schema_version(conn):
+        version = await read_version(conn)
+        await conn.commit()
+        await barrier.wait()
+        return version
+
+    async def start_worker():
+        async with aiosqlite.connect(database) as conn:
+            return await migrations.run_migrations(conn)
+
+    async def start_workers():
+        async with aiosqlite.connect(database) as conn:
+            await db.create_tables(conn)
+            await conn.commit()
+        return await asyncio.gather(*(start_worker() for _ in range(workers)))
+
+    monkeypatch.setattr(migrations, "get_schema_version", racing_schema_version)
+    results = asyncio.run(start_workers())
+
+    applied = sorted(version for result in results for version in result)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    conn = sqlite3.connect(database)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(MIGRATIONS)
+    conn.close()
+
+
+@pytest.mark.parametrize("query, index", [
+    ("SELECT id FROM face_embeddings WHERE user_id = 1", "idx_face_embeddings_user_id"),
+    ("SELECT * FROM attendance ORDER BY timestamp DESC LIMIT 50", "idx_attendance_timestamp"),
+    ("SELECT COUNT(*) FROM attendance WHERE user_id = 1 AND timestamp >= '2024-01-01'",
+     "idx_attendance_user_timestamp"),
+])
+def test_lookup_queries_use_indexes(database, query, index):
+    asyncio.run(db.init_db())
+    conn = sqlite3.connect(database)
+    plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+    conn.close()
+    assert index in plan
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.models import quality
+from app.models.quality import QUALITY_MESSAGES, QualityStats, assess_face, face_asymmetry
+
+BOX = (100, 100, 260, 260)
+FRAME_SHAPE = (480, 640, 3)
+
+
+# Wajah sintetis 160x160; yaw > 0 menggeser mata, hidung dan mulut ke satu sisi seperti
+# kepala yang menoleh, light > 0 memberi pencahayaan dari samping
+def _face(yaw=0.0, light=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.clip(90 + rng.integers(-20, 20, (320, 320, 3)), 0, 255).astype(np.uint8)
+    r, cx, cy, shift = 100, 160, 160, yaw * 60
+    cv2.ellipse(img, (cx, cy), (int(r * (1 - 0.3 * yaw)), 130), 0, 0, 360, (170, 190, 220), -1)
+    for side in (-1, 1):
+        eye_x = int(cx + shift + side * 40 * (1 - 0.5 * yaw))
+        cv2.ellipse(img, (eye_x, 130), (max(2, int(22 * (1 - 0.5 * yaw * side))), 10), 0, 0, 360, (40, 40, 40), -1)
+    cv2.line(img, (int(cx + shift * 1.3), 140), (int(cx + shift * 1.5), 185), (120, 140, 170), 5)
+    cv2.ellipse(img, (int(cx + shift), 215), (int(40 * (1 - 0.3 * yaw)), 12), 0, 0, 360, (60, 60, 120), -1)
+    if light:
+        img = np.clip(img * np.linspace(1 - light, 1 + light, 320)[None, :, None], 0, 255).astype(np.uint8)
+    return cv2.resize(img[30:290, 50:270], (160, 160))
+
+
+def _flat(value):
+    return np.full((160, 160, 3), value, dtype=np.uint8)
+
+
+def test_good_face_passes():
+    assert assess_face(_face(), BOX, FRAME_SHAPE) is None
+    assert assess_face(cv2.cvtColor(_face(), cv2.COLOR_BGR2GRAY), BOX) is None
+
+
+@pytest.mark.parametrize("face, box, frame_shape, reason", [
+    (_face(), (100, 100, 130, 130), FRAME_SHAPE, "small"),
+    (_face(yaw=0.5), BOX, FRAME_SHAPE, "pose"),
+    (_face(), (0, 100, 160, 260), FRAME_SHAPE, "cut_off"),
+    (_face(), (480, 100, 640, 260), FRAME_SHAPE, "cut_off"),
+    (_flat(10), BOX, FRAME_SHAPE, "dark"),
+    (_flat(250), BOX, FRAME_SHAPE, "bright"),
+    (_flat(128), BOX, FRAME_SHAPE, "blur"),
+])
+def test_rejections(face, box, frame_shape, reason):
+    assert assess_face(face, box, frame_shape) == reason
+    assert reason in QUALITY_MESSAGES
+
+
+def test_pose_uses_face_content_not_box_shape():
+    # Kotak cascade selalu persegi: wajah menoleh tetap terdeteksi dari isi crop
+    frontal = [face_asymmetry(cv2.cvtColor(_face(seed=seed), cv2.COLOR_BGR2GRAY)) for seed in range(5)]
+    turned = [face_asymmetry(cv2.cvtColor(_face(yaw=0.3, seed=seed), cv2.COLOR_BGR2GRAY)) for seed in range(5)]
+    assert max(frontal) < quality.QUALITY_MAX_ASYMMETRY < min(turned)
+    # Cahaya dari samping tidak dianggap menoleh
+    assert assess_face(_face(light=0.4), BOX, FRAME_SHAPE) is None
+
+
+def test_pose_check_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(quality, "QUALITY_MAX_ASYMMETRY", 0.0)
+    assert assess_face(_face(yaw=0.5), BOX, FRAME_SHAPE) is None
+
+
+def test_clipped_pixels_rejected():
+    face = _face()
+    face[:100] = 0
+    assert assess_face(face, BOX, FRAME_SHAPE) == "dark"
+
+
+def test_client_box_skips_cut_off_check():
+    # Tanpa frame_shape (kotak dari klien) wajah di tepi tidak dianggap terpotong
+    assert assess_face(_face(), (0, 0, 160, 160)) is None
+
+
+def test_client_crop_skips_size_check():
+    # Crop dari klien (box None) selalu 160x160 setelah resize: ukuran asli tidak diketahui
+    assert assess_face(_face()) is None
+
+
+def test_quality_stats():
+    stats = QualityStats()
+    for reason in (None, "blur", None, "blur"):
+        stats.record(reason)
+
+    result = stats.stats()
+    assert result["checked"] == 4
+    assert result["passed"] == 2
+    assert result["rejected"]["blur"] == 2
+    assert result["reject_ratio"] == 0.5
+
+
+def test_detect_passes_original_box_only_for_server_frames(monkeypatch):
+    from app.models import face_recognition
+
+    checked = []
+    monkeypatch.setattr(face_recognition, "QUALITY_GATE", True)
+    monkeypatch.setattr(face_recognition, "assess_face", lambda face, box, shape: checked.append((box, shape)))
+    crop = cv2.imencode(".png", cv2.resize(_face(), (40, 40)))[1].tobytes()
+
+    face_recognition.detect_first_face_timed(crop, cropped=True)
+    face_recognition.detect_first_face_timed(crop, client_box=(5, 5, 20, 20))
+
+    assert checked == [(None, None), ((3, 3, 27, 27), None)]
@@ -0,0 +1,100 @@
+import sqlite3
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import app.database.db as db
+from app.api import routes
+from app.models.gallery import GalleryCache
+
+
+def _vectors(n, dim=16, seed=0):
+    return list(np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32))
+
+
+async def _count(table):
+    async with db.connect() as conn:
+        cursor = await conn.execute(f"SELECT COUNT(*) FROM {table}")
+        return (await cursor.fetchone())[0]
+
+
+@pytest.fixture
+def register(run_db, monkeypatch):
+    gallery = GalleryCache()
+    gallery.load_matrix([], [], None)
+    monkeypatch.setattr(routes, "gallery_cache", gallery)
+
+    def run(scenario, embeddings):
+        async def extract(photos):
+            return embeddings
+
+        monkeypatch.setattr(routes, "extract_photo_embeddings", extract)
+        return run_db(scenario), gallery
+
+    return run
+
+
+def test_register_stores_user_embeddings_and_gallery(register):
+    embeddings = _vectors(3)
+
+    async def scenario():
+        user_id, count = await routes.register_with_photos("Budi", "X TKJ A", [])
+        return user_id, count, await _count("face_embeddings")
+
+    (user_id, count, stored), gallery = register(scenario, embeddings)
+    assert count == stored == 3
+    snapshot = gallery.snapshot()
+    assert snapshot.user_ids.tolist() == [user_id] * 3
+    assert snapshot.search(embeddings[1])[0][0] == user_id
+
+
+def test_register_without_faces_creates_nothing(register):
+    async def scenario():
+        return await routes.register_with_photos("Budi", "X TKJ A", []), await _count("users")
+
+    (result, users), gallery = register(scenario, [])
+    assert result == (None, 0)
+    assert users == 0
+    assert len(gallery.snapshot()) == 0
+
+
+def test_duplicate_email_is_rejected_without_partial_rows(register):
+    async def scenario():
+        await routes.register_with_photos("Budi", "X TKJ A", [])
+        with pytest.raises(HTTPException) as error:
+            await routes.register_with_photos("Ani", "X TKJ A", [])
+        return error.value.status_code, await _count("users"), await _count("face_embeddings")
+
+    (status, users, embeddings), gallery = register(scenario, _vectors(2))
+    assert (status, users, embeddings) == (400, 1, 2)
+    assert len(gallery.snapshot()) == 2
+
+
+def test_failed_embedding_insert_rolls_back_user(run_db):
+    async def scenario():
+        async with db.connect() as conn:
+            await conn.execute(
+                "CREATE TRIGGER fail_embeddings BEFORE INSERT ON face_embeddings "
+                "BEGIN SELECT RAISE(ABORT, 'gagal'); END"
+            )
+            await conn.commit()
+        with pytest.raises(sqlite3.IntegrityError):
+            await db.add_user_with_embeddings("Budi", "X TKJ A", _vectors(2))
+        # Koneksi yang dikembalikan ke pool tidak membawa transaksi setengah jalan
+        return [await _count("users") for _ in range(db.DB_POOL_SIZE + 1)]
+
+    assert set(run_db(scenario)) == {0}
+
+
+def test_login_key_collision_is_logged(run_db, capsys):
+    async def scenario():
+        first = await db.add_user("Budi", "X TKJ A")
+        second = await db.add_user("budi", "x tkj a")
+        async with db.connect() as conn:
+            cursor = await conn.execute("SELECT id, login_key FROM users ORDER BY id")
+            return first, second, [tuple(row) for row in await cursor.fetchall()]
+
+    first, second, rows = run_db(scenario)
+    assert rows == [(first, db.make_login_key("Budi", "X TKJ A")), (second, None)]
+    assert "sudah dipakai" in capsys.readouterr().out
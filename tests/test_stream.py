@@ -0,0 +1,153 @@
+import asyncio
+
+from fastapi import WebSocketDisconnect
+
+from app.api import routes
+from app.api.stream import LatestFrame, StreamMetrics, StreamSession
+
+
+def test_latest_frame_drops_stale_frames():
+    async def scenario():
+        frames = LatestFrame()
+        frames.put(b"a")
+        frames.put(b"b")
+        frames.put(b"c", cropped=True)
+        return frames, await frames.get()
+
+    frames, frame = asyncio.run(scenario())
+    assert frame == (3, b"c", True, None)
+    assert frames.received == 3
+    assert frames.dropped == 2
+
+
+def test_latest_frame_keeps_cropped_flag_of_each_frame():
+    async def scenario():
+        frames = LatestFrame()
+        frames.put(b"a", cropped=True)
+        first = await frames.get()
+        frames.put(b"b")
+        return first, await frames.get()
+
+    assert asyncio.run(scenario()) == ((1, b"a", True, None), (2, b"b", False, None))
+
+
+def test_latest_frame_waits_for_next_frame():
+    async def scenario():
+        frames = LatestFrame()
+        waiter = asyncio.create_task(frames.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        frames.put(b"a")
+        return await asyncio.wait_for(waiter, timeout=1)
+
+    assert asyncio.run(scenario()) == (1, b"a", False, None)
+
+
+def test_latest_frame_close():
+    async def scenario():
+        frames = LatestFrame()
+        frames.put(b"a")
+        frames.close()
+        # Frame yang sudah diterima tetap diproses sebelum get() mengembalikan None
+        return await frames.get(), await frames.get()
+
+    assert asyncio.run(scenario()) == ((1, b"a", False, None), None)
+
+
+def test_stream_metrics_accumulate_sessions():
+    metrics = StreamMetrics()
+    session = StreamSession()
+    metrics.open()
+    session.frames.put(b"a")
+    session.frames.put(b"b")
+    session.processed = 1
+    metrics.close(session)
+
+    assert metrics.stats() == {"active": 0, "connections": 1, "frames": 2, "processed": 1, "dropped": 1}
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.messages = list(messages) + [{"type": "websocket.disconnect"}]
+
+    async def receive(self):
+        return self.messages.pop(0)
+
+
+def _receive(messages):
+    session = StreamSession()
+    frames = []
+
+    async def collect():
+        # Setiap frame diambil sebelum frame berikutnya tiba (tidak ada yang ditimpa)
+        original_put = session.frames.put
+
+        def put(*args):
+            original_put(*args)
+            frames.append(session.frames._frame)
+            session.frames._frame = None
+
+        session.frames.put = put
+        await routes._receive_frames(FakeWebSocket(messages), session)
+
+    asyncio.run(collect())
+    return frames
+
+
+def test_client_box_applies_to_next_frame_only():
+    frames = _receive([
+        {"type": "websocket.receive", "text": '{"box": "10,20,30,40"}'},
+        {"type": "websocket.receive", "bytes": b"a"},
+        {"type": "websocket.receive", "bytes": b"b"},
+        {"type": "websocket.receive", "text": '{"box": "nan,0,1,1"}'},
+        {"type": "websocket.receive", "bytes": b"c"},
+    ])
+
+    assert frames == [
+        (1, b"a", False, (10.0, 20.0, 30.0, 40.0)),
+        (2, b"b", False, None),
+        (3, b"c", False, None),
+    ]
+
+
+def test_cropped_mode_persists_across_frames():
+    frames = _receive([
+        {"type": "websocket.receive", "text": '{"cropped": true}'},
+        {"type": "websocket.receive", "bytes": b"a"},
+        {"type": "websocket.receive", "bytes": b"b"},
+        {"type": "websocket.receive", "text": "bukan json"},
+        {"type": "websocket.receive", "text": '{"cropped": false}'},
+        {"type": "websocket.receive", "bytes": b"c"},
+    ])
+
+    assert [(frame[1], frame[2]) for frame in frames] == [(b"a", True), (b"b", True), (b"c", False)]
+
+
+def test_stream_waits_for_receiver_task_on_disconnect(monkeypatch):
+    class DisconnectingWebSocket:
+        def __init__(self):
+            self.sent = 0
+
+        async def accept(self):
+            pass
+
+        async def receive(self):
+            if self.sent == 0:
+                self.sent = 1
+                return {"type": "websocket.receive", "bytes": b"a"}
+            # Klien tidak mengirim apa-apa lagi; penerima menunggu sampai dibatalkan
+            await asyncio.Event().wait()
+
+        async def send_json(self, data):
+            raise WebSocketDisconnect(1006)
+
+    async def recognize(session, contents, cropped, box=None):
+        return {"status": "no_face"}
+
+    monkeypatch.setattr(routes, "_recognize_stream_frame", recognize)
+
+    async def scenario():
+        await routes.recognize_stream(DisconnectingWebSocket())
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
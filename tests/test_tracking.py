@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models import tracking
+from app.models.tracking import FaceTrack, IdentityTracker, box_iou, face_hash, hash_distance
+
+
+def _face(seed):
+    return np.random.default_rng(seed).integers(0, 256, size=(160, 160, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ((0, 0, 10, 10), (0, 0, 10, 10), 1.0),
+    ((0, 0, 10, 10), (20, 20, 30, 30), 0.0),
+    ((0, 0, 10, 10), (10, 0, 20, 10), 0.0),
+    ((0, 0, 10, 10), (5, 0, 15, 10), 1 / 3),
+    ((0, 0, 10, 10), (0, 0, 5, 5), 0.25),
+    ((0, 0, 0, 0), (0, 0, 0, 0), 0.0),
+])
+def test_box_iou(a, b, expected):
+    assert box_iou(a, b) == pytest.approx(expected)
+    assert box_iou(b, a) == pytest.approx(expected)
+
+
+def test_face_hash_is_64_bits():
+    face = _face(0)
+    assert face_hash(face).shape == (8,)
+    assert hash_distance(face_hash(face), face_hash(face)) == 0
+    assert hash_distance(face_hash(face), face_hash(_face(1))) > tracking.TRACK_HASH_MAX_DISTANCE
+
+
+def test_track_reuses_stable_face(monkeypatch):
+    monkeypatch.setattr(tracking, "TRACK_REVERIFY_EVERY", 2)
+    tracker = IdentityTracker()
+    track = tracker.get("kiosk-1")
+    face, match = _face(0), object()
+
+    assert track.reuse((0, 0, 100, 100), face) is None
+    track.update((0, 0, 100, 100), face, match)
+    assert track.reuse((2, 2, 102, 102), face) is match
+    # Wajah lain di posisi yang sama tidak mewarisi identitas
+    assert track.reuse((2, 2, 102, 102), _face(1)) is None
+    # Kotak yang berpindah jauh juga diverifikasi ulang
+    assert track.reuse((200, 200, 300, 300), face) is None
+    assert track.reuse((2, 2, 102, 102), face) is match
+    # Setelah TRACK_REVERIFY_EVERY frame dipakai ulang, wajib diverifikasi dengan embedding
+    assert track.reuse((2, 2, 102, 102), face) is None
+
+    assert tracker.stats()["reused"] == 2
+    assert tracker.stats()["verified"] == 1
+
+
+def test_track_forgets_unknown_face():
+    track = FaceTrack()
+    face = _face(0)
+    track.update((0, 0, 100, 100), face, object())
+    track.update((0, 0, 100, 100), face, None)
+    assert track.reuse((0, 0, 100, 100), face) is None
+
+
+def test_identity_tracker_evicts_oldest_session():
+    tracker = IdentityTracker(max_sessions=2)
+    first = tracker.get("a")
+    tracker.get("b")
+    tracker.get("a")
+    tracker.get("c")
+
+    assert tracker.get(None) is None
+    assert tracker.stats()["sessions"] == 2
+    assert tracker.get("a") is first
+
+
+def test_recognize_frame_verifies_only_when_track_is_unstable(monkeypatch):
+    from app.api import routes
+
+    face, box = _face(0), (10, 10, 110, 110)
+    embedded = []
+
+    async def detect(fn, contents, roi, client_box, cropped):
+        return face, box, {}
+
+    async def recognize(face_img):
+        embedded.append(face_img)
+        return "budi"
+
+    monkeypatch.setattr(routes, "run_inference", detect)
+    monkeypatch.setattr(routes, "recognize_batched", recognize)
+    track = IdentityTracker().get("kiosk-1")
+
+    async def scenario():
+        results = [await routes.recognize_frame(b"", track=track) for _ in range(3)]
+        # Crop dari klien tidak punya posisi wajah: selalu diverifikasi dan track dibuang
+        results.append(await routes.recognize_frame(b"", cropped=True, track=track))
+        return results
+
+    results = asyncio.run(scenario())
+    assert [match for _, match, _ in results] == ["budi"] * 4
+    assert [timing["tracked"] for _, _, timing in results] == [False, True, True, False]
+    assert len(embedded) == 2
+    assert track.match is None
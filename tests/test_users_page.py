@@ -0,0 +1,59 @@
+import sqlite3
+
+import numpy as np
+
+import app.database.db as db
+
+
+async def _add_users(count):
+    for i in range(count):
+        user_id = await db.add_user(f"Siswa {i}", f"X TKJ {i}")
+        await db.add_face_embeddings(user_id, [np.ones(8, dtype=np.float32)] * (i % 3))
+
+
+def test_pages_cover_every_user_once(run_db):
+    async def scenario():
+        await _add_users(7)
+        pages, after = [], None
+        while True:
+            page = await db.get_users_page(after=after, limit=3)
+            pages.append(page)
+            if len(page) < 3:
+                return pages
+            after = page[-1]["id"]
+
+    pages = run_db(scenario)
+    ids = [user["id"] for page in pages for user in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert ids == sorted(ids, reverse=True) == list(range(7, 0, -1))
+
+
+def test_page_includes_face_counts_and_embeddings(run_db):
+    async def scenario():
+        await _add_users(3)
+        return await db.get_users_page(limit=10), await db.get_all_users()
+
+    page, all_users = run_db(scenario)
+    for user in page:
+        assert user["face_count"] == len(user["embeddings"]) == (user["id"] - 1) % 3
+        assert "class" in user and "email" not in user
+    assert sorted(user["id"] for user in all_users) == [1, 2, 3]
+    assert {user["id"]: user["face_count"] for user in all_users} == {user["id"]: user["face_count"] for user in page}
+
+
+def test_page_seek_uses_primary_key(database, run_db):
+    statements = []
+
+    async def scenario():
+        await _add_users(3)
+        for conn in db._pool._connections:
+            await conn.set_trace_callback(statements.append)
+        await db.get_users_page(after=3, limit=2)
+
+    run_db(scenario)
+    # Query halaman yang benar-benar dijalankan (dengan nilai parameter) diperiksa rencananya
+    page_query = next(sql for sql in statements if "FROM users u" in sql)
+    conn = sqlite3.connect(database)
+    plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {page_query}"))
+    conn.close()
+    assert "SEARCH u USING INTEGER PRIMARY KEY" in plan